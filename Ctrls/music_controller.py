@@ -16,8 +16,8 @@ import Models.music_model as music
 from Models.track_model import Track
 # import fluidsynth as m_fluidsynth
 from Utils import m_fluidsynth
-from Utils.IterableSemaphore import ISemaphore, IBoundedSemaphore
 from Utils.constants import MAX_NOTE_GRAPH
+from Utils.lookahead_controller import LookaheadController
 from Views.music_view import MusicView
 from ViewsPyQT5.ViewsUtils.views_utils import playButtonReadyStyle, buttonStyle
 
@@ -35,20 +35,18 @@ class MusicCtrl:
         self.playing = False  # True if the music has started, regardless of wheter its paused. False when the music is stopped or ended.
         self.paused = False
         self.finished = False
-        self.skipNextNote = False
-        self.queueSemaphore = ISemaphore(name="queue")  # Could be seomething else ig
-        self.graphSemaphore = ISemaphore(name="graph")  # Could be seomething else ig
+        self.startTfactor = 0.0  # temporal position the music starts from, moved by seek
+        self.graphSemaphore = threading.Lock()  # Protect notes displayed by the graphical view
         self.trackSemaphore = threading.Lock()  # Could be seomething else ig
-        self.emptySemaphore = IBoundedSemaphore(model.queue_capacity, "empty")
-        self.fullSemaphore = IBoundedSemaphore(model.queue_capacity, "full")
-        self.fullSemaphore.acquire(n=model.queue_capacity)  # Set semaphore to 0
         self.playingEvent = threading.Event()
         self.stoppedEvent = threading.Event()
         self.pausedEvent = threading.Event()
+        self.exportCancelled = threading.Event()  # set to stop the music being exported
         # Model
         self.model = model  # Music model
-        self.view = MusicView(model, self)
+        self.view = None if model.headless else MusicView(model, self)
         self.data = data_model.Data.getInstance()
+        self.lookahead = LookaheadController(model)  # used if settings.adaptive
 
         # Threads
         self.producer_thread = threading.Thread(target=self.model.generate, daemon=True, name="Notes_producer_thread")
@@ -59,11 +57,11 @@ class MusicCtrl:
         :return: time position between 0 and musicDuration
         """
         if (not self.playing):
-            return 0
+            return self.startTfactor * self.model.settings.get_music_duration() if self.startTfactor > 0 else 0
         elif (self.paused):
             logging.log(logging.DEBUG,
                         "returned the pause time in music_ctrl.get_music_time() at {}".format(datetime.datetime.now()))
-            return self._pausedTimed
+            return self._pausedTimed - self._musicTiming
         else:
             return time.perf_counter() - self._musicTiming
 
@@ -94,8 +92,10 @@ class MusicCtrl:
         if (track.id in self.model.tracks.keys()):
             track.id = self.model.generate_track_id()
         self.model.add_track(track, generate_view)
-        if prev_track_nbr == 0 and len(self.model.tracks) == 1:
+        if prev_track_nbr == 0 and len(self.model.tracks) == 1 and self.model.sonification_view is not None:
             self.model.sonification_view.topBarView.PPButton.setEnabled(True)
+            self.model.sonification_view.topBarView.FbwButton.setEnabled(True)
+            self.model.sonification_view.topBarView.FfwButton.setEnabled(True)
             self.model.sonification_view.parent.playAction.setEnabled(True)
             self.model.sonification_view.topBarView.PPButton.setStyleSheet(playButtonReadyStyle)
         # threading.Thread(target=self.model.add_track, args=[track, generate_view], daemon=True).start()
@@ -109,6 +109,8 @@ class MusicCtrl:
         # threading.Thread(target=self.model.remove_track, args=[track], daemon=True).start()
         if len(self.model.tracks) == 0:
             self.model.sonification_view.topBarView.PPButton.setEnabled(False)
+            self.model.sonification_view.topBarView.FbwButton.setEnabled(False)
+            self.model.sonification_view.topBarView.FfwButton.setEnabled(False)
             self.model.sonification_view.parent.playAction.setEnabled(False)
             self.model.sonification_view.topBarView.PPButton.setStyleSheet(buttonStyle)
             self.model.sonification_view.visualisationView.GraphFrame.hide()
@@ -117,6 +119,8 @@ class MusicCtrl:
             self.model.sonification_view.advancedTrackView.detailsScrollArea.hide()
             self.model.sonification_view.parent.saveAction.setEnabled(False)
             self.model.sonification_view.parent.exportAction.setEnabled(False)
+            self.model.sonification_view.parent.exportStemsAction.setEnabled(False)
+            self.model.sonification_view.parent.exportMidiAction.setEnabled(False)
 
     def purge_tracks(self) -> None:
         """
@@ -129,90 +133,6 @@ class MusicCtrl:
             self.model.tracks[key].remove()
         music.Music.track_newid = itertools.count()  # reset the itertools
 
-    # def set_timing(self, tfactor):
-    #     delta = 1.0
-    #     datas = self.data.df
-
-    # def fast_backward(self):
-    #     self.view.starting_time += 2000
-    #     self._musicTiming += 2
-    #     tfactors = 0
-
-    # def fast_forward(self):
-    #     #raise NotImplementedError()
-    #     self.view.starting_time -= 2000
-    #     self._musicTiming -= 2
-    #     return
-    #     time_skip = 5000 # ms
-    #     skipped = self.model.data.get_next()
-    #     tfactors = []
-    #     for idx, row in skipped.iterrows():
-    #         tfactors.append(self.model.get_absolute_note_timing(self.model.timeSettings.get_temporal_position(row)))
-    #     print("tfactors for next batches are")
-
-    # def fast_forward_leg(self):
-    #     nonempty = True
-    #     self.view.starting_time -= 5000
-    #     while(nonempty):
-    #         self.fullSemaphore.acquire()
-    #         self.queueSemaphore.acquire()
-    #         note = self.model.notes.get_nowait()
-    #         now = self.view.sequencer.get_tick()
-    #         note_timing_abs = self.model.get_absolute_note_timing(note)
-    #         note_timing = self.view.get_relative_note_timing(note_timing_abs)
-    #         nonempty = note_timing < 5000
-    #         if(not nonempty):
-    #             self.model.notes.put_nowait(note)
-    #         log_line = "REMOVE Note [track={}, value={}, vel={}, dur={}, timing abs={}] at t={}, data row #{} planned scheduled in {}ms. {} notes remaining".format(
-    #             note.channel, note.value, note.velocity, note.duration, note_timing_abs, now,
-    #             note.id, note_timing, self.model.notes.qsize())
-    #         self.sonification_view.add_log_line(log_line)
-    #         self.queueSemaphore.release()
-    #         self.emptySemaphore.release()
-    #
-    #     print(now)
-    #     #Get current timepoint
-    #     #Compute next timepoint
-    #     #Acquire semaphores
-    #     #Remove all notes with time value<next time point
-    #     #Release semaphores
-    #     pass
-
-    # def fast_backward(self):
-    #     raise NotImplementedError()
-    #     #TODO REDO
-    #     #Empty queue
-    #     #change current batch idx by -X
-    #     #Get absolute position of first note of current batch
-    #     #Set absolute position of current time to absolute position of first note of current batch
-    #     #-> Developp wrappers for absolute/relative time conversion
-    #
-    #     self.pause()
-    #     lastNote = None
-    #     while (not self.model.notes.empty()):
-    #         self.queueSemaphore.acquire()
-    #         self.emptySemaphore.release()
-    #         self.fullSemaphore.acquire()
-    #         lastNote = self.model.notes.get_nowait()
-    #         self.queueSemaphore.release()
-    #     self.model.data.index-=5
-    #     lastrow = None
-    #     for idx, row in self.model.data.get_next(False).iterrows():
-    #         lastrow = row
-    #     diff = self.model.get_absolute_note_timing(lastNote.tfactor) - self.model.get_absolute_note_timing(self.model.timeSettings.get_temporal_position(lastrow))
-    #     print(diff)
-    #     self.view.starting_time-=diff
-    #     #self.skipNextNote = True
-    #     self.play()
-    #     #Get current timepoint
-    #     #Compute previous timepoint
-    #     #Acquire semaphore
-    #     #Purge queue
-    #     #Compute idx for batches so that note[idx].timestamp < previous timepoint
-    #     #Add notes to queue
-    #     #Release semaphores
-    #     pass
-
     def setup_general_attribute(self) -> None:
         self.model.settings.set_attribute(self.model.data.first_date, self.model.data.last_date,
                                           self.model.data.get_size())
@@ -239,39 +159,36 @@ class MusicCtrl:
             self.change_local_gain(self.model.tracks[track].id, self.model.tracks[track].gain)
         self.change_global_gain(self.model.gain)
 
-        self.skipNextNote = False
         self.view.save_play_time()
         if (self.paused):
             self._musicTiming += (time.perf_counter() - self._pausedTimed)
         else:
-            self._musicTiming = time.perf_counter()
-        # self.model.generate_dataframe()
-        # self.view.play_dataframe()
+            self._musicTiming = time.perf_counter() - self.startTfactor * self.model.settings.get_music_duration()
         self.playing = True
         self.paused = False
         self.finished = False
         self.playingEvent.set()  # Release threads
         self.pausedEvent.set()  # Release threads
         self.stoppedEvent.clear()  # Send signal that we started
+        self.view.start_scheduling()
 
     def pause(self) -> None:
         self.view.save_pause_time()
+        self.view.suspend_scheduling()  # notes already sent are sent again on play
         self._pausedTimed = time.perf_counter()
         self.paused = True
         self.playingEvent.clear()  # Block threads
         self.pausedEvent.clear()  # Block threads
 
     def stop(self) -> None:
-        logging.log(logging.INFO, "Stopping at {} with {} notes in queue . empty:{}/{}, full:{}/{}, mutex:{}".format(
-            self.view.sequencer.get_tick(), self.model.notes.qsize(),
-            self.emptySemaphore._value,
-            self.emptySemaphore._initial_value,
-            self.fullSemaphore._value,
-            self.fullSemaphore._initial_value,
-            self.queueSemaphore._value))
+        logging.log(logging.INFO, "Stopping at {} with {} notes in queue".format(self.view.sequencer.get_tick(),
+                                                                                 len(self.model.notes)))
         self.playingEvent.clear()  # Send stop event
         self.stoppedEvent.set()
-        self.skipNextNote = True  # if a note is ripping, make it stale
+        self.view.suspend_scheduling(flush=True)  # remove notes sent but not played yet
+        self.view.stats.log_summary()
+        self.lookahead.restore()
+        self.startTfactor = 0.0
         m_fluidsynth.fluid_settings_setnum(self.view.synth.settings, b'synth.gain', float(0) / 100)
         # self.view.synth.system_reset()  # Reset synth to prevent future note from being played
         # self.view.synth.program_reset()
@@ -281,35 +198,57 @@ class MusicCtrl:
 
         # Update data
         self.data.reset_playing_index()
+        self.model.sonification_view.uiScheduler.cancel(self.load_rows)
         self.model.sonification_view.tableView.currentDataModel.reset(self.data.sample_size, self.data.get_first(),
                                                                       self.data.get_second())
         self.model.sonification_view.visualisationView.reset()
 
-        # Reset queue
-        try:
-            while not self.model.notes.empty():
-                self.emptySemaphore.release()
-                self.fullSemaphore.acquire()
-                self.model.notes.get_nowait()
-        except ValueError:
-            self.queueSemaphore = ISemaphore(name="queue")  # Could be seomething else ig
-            self.trackSemaphore = threading.Lock()  # Could be seomething else ig
-            self.fullSemaphore = IBoundedSemaphore(self.model.queue_capacity, "full")
-            self.fullSemaphore.acquire(n=self.model.queue_capacity)  # Set semaphore to 0
-            logging.log(logging.WARNING, "ValueError while releasing semaphores, resetting now")
-        self.emptySemaphore = IBoundedSemaphore(self.model.queue_capacity,
-                                                "empty")  # reset it anyway because it tends to not reset correctly at the end of song
-
-        time.sleep(0.1)  # needed for semaphore values display
-        logging.log(logging.INFO, "semaphore: {}/{}, {}/{}, {}".format(self.emptySemaphore._value,
-                                                                       self.emptySemaphore._initial_value,
-                                                                       self.fullSemaphore._value,
-                                                                       self.fullSemaphore._initial_value,
-                                                                       self.queueSemaphore._value))
+        # Reset queue, notes being produced or consumed are dropped
+        self.model.notes.reset()
+
+    def seek(self, tfactor: float) -> float:
+        """
+        Move the music to a temporal position, whether it is playing, paused or stopped. Production restarts from the
+        first row whose notes can be played at this position, found by binary search in the temporal positions of the
+        rows, so that seeking anywhere in a long music is immediate.
+        :param tfactor: float,
+            the new temporal position, between 0 and 1
+        :return: the new temporal position, bounded
+        """
+        self.setup_general_attribute()
+        tfactor = min(max(tfactor, 0.0), 1.0)
+        duration = self.model.settings.get_music_duration()
+        # Notes of a row are played later on tracks with an offset, start early enough for the most offset one
+        max_offset = max([t.offset for t in self.model.tracks.values()], default=0)
+        offset = max_offset * self.model.settings.get_timing_plan().offset_unit
+        with self.data.lock:  # wait for the batch being produced, if any
+            self.view.suspend_scheduling(flush=True)
+            self.model.notes.reset()
+            self.data.seek(self.data.find_row_from_time(tfactor - offset))
+            self.startTfactor = tfactor
+            self.finished = False
+        if self.playing:
+            reference = self.view.pause_start_time if self.paused else self.view.sequencer.get_tick()
+            self.view.starting_time = reference - tfactor * duration * 1000
+            self._musicTiming = (self._pausedTimed if self.paused else time.perf_counter()) - tfactor * duration
+        self.model.sonification_view.uiScheduler.cancel(self.load_rows)
+        self.model.sonification_view.tableView.currentDataModel.reset(self.data.sample_size)
+        self.model.sonification_view.visualisationView.reset()
+        if self.playing and not self.paused:
+            self.view.start_scheduling()
+        logging.log(logging.INFO, "Seek to {:.3f} s, row {}".format(tfactor * duration, self.data.index))
+        return tfactor
+
+    def skip(self, seconds: float) -> float:
+        """
+        Move the music forward, or backward if seconds is negative.
+        :return: the new temporal position, between 0 and 1
+        """
+        return self.seek((self.get_music_time() + seconds) / self.model.settings.get_music_duration())
 
     def change_queue_size(self, size: int) -> None:
-        self.emptySemaphore.update_size(size, True)
-        self.fullSemaphore.update_size(size)
+        self.model.queue_capacity = size
+        self.model.notes.resize(size)
 
     def change_global_gain(self, gain: int,
                            from_muted: bool = False) -> None:  # dark magic as we interact with fluidsynth
@@ -342,38 +281,82 @@ class MusicCtrl:
         with open(path, 'rb') as f:
             m = pickle.load(f)
             s_view = self.model.sonification_view
+            notes = self.model.notes
             self.purge_tracks()
             self.model.__dict__.update(m.__dict__)
+            self.model.notes = notes  # Keep the buffer shared with producer and consumer
             self.model.tracks = {}  # Needed as updating the model dict populates tracks but does not update ui
             self.model.sonification_view = s_view
             self.model.ctrl = self
             self.model.settings.music = self.model
             for k in m.tracks:
-                self.add_track(m.tracks[k], True)
+                self.add_track(m.tracks[k], s_view is not None)
                 # next(self.model.track_newid)
-            self.model.sonification_view.set_status_text("Project {} open!".format(path), 5000)
+            if s_view is not None:
+                s_view.set_status_text("Project {} open!".format(path), 5000)
+            logging.log(logging.INFO, "Project {} open with {} tracks".format(path, len(self.model.tracks)))
 
     def export_all_tracks(self, path: str) -> None:
         with open(path, 'wb') as f:
             pickle.dump(self.model, f)
             self.model.sonification_view.set_status_text("exported model to {}".format(path))
 
-    def export_music(self, filename: str) -> None:
+    def export_music(self, filename: str, stems: bool = False) -> None:
+        """
+        Threaded.
+        Render the music to a wav file, reporting progress in the status bar until done or cancelled by cancel_export.
+        :param stems: bool, if True also write the music of each track to its own wav file
+        """
+        name = Path(filename)
+        view = self.model.sonification_view
+        self.exportCancelled.clear()
+        view.exportRunning.emit(True)
+        try:
+            progress = lambda p: view.set_status_text("Writing {}: {:.0f}%".format(name, 100 * p))
+            t = time.perf_counter()
+            done = self.model.generate_audio(filename, stems, progress, self.exportCancelled.is_set)
+            if done:
+                logging.log(logging.INFO, "Music {} rendered in {:.1f} s".format(name, time.perf_counter() - t))
+                view.set_status_text("Music {} saved!".format(name), 4000)
+            else:
+                name.unlink(missing_ok=True)
+                view.set_status_text("Export of {} cancelled.".format(name), 4000)
+        except:
+            logging.log(logging.ERROR, "Error while saving {}!".format(name))
+            view.set_status_text("Error while saving {}!".format(name), 10000)
+        finally:
+            self.data.reset_playing_index()
+            view.exportRunning.emit(False)
+
+    def export_midi(self, filename: str) -> None:
+        """
+        Threaded.
+        Write the music to a midi file.
+        """
         name = Path(filename)
+        view = self.model.sonification_view
+        view.exportRunning.emit(True)
         try:
-            self.model.write_fluidsynth_config(name.stem)
-            self.model.generate_midi(name.stem)
-            self.view.synth.midi_to_audio(name.stem + ".mid", filename, name.stem + "-fluidsynth_midi_to_wav.config")
-            self.model.sonification_view.set_status_text("Music {} saved!".format(name), 4000)
+            self.model.generate_midi(str(name.with_suffix("")))
+            view.set_status_text("Midi file {} saved!".format(name.with_suffix(".mid")), 4000)
         except:
-            logging.log(logging.ERROR, "Error while saving {}!".format(name), 10000)
-            self.model.sonification_view.set_status_text("Error while saving {}!".format(name), 10000)
+            logging.log(logging.ERROR, "Error while saving {}!".format(name))
+            view.set_status_text("Error while saving {}!".format(name), 10000)
+        finally:
+            self.data.reset_playing_index()
+            view.exportRunning.emit(False)
+
+    def cancel_export(self) -> None:
+        self.exportCancelled.set()
 
     def push_data_to_table(self, datas: DataFrame) -> None:
-        """Push rows to the table view"""
+        """Push rows to the table view, from the GUI thread"""
+        self.model.sonification_view.uiScheduler.call_soon(self.load_rows, datas)
+
+    def load_rows(self, datas: DataFrame) -> None:
+        shown = set(self.data.get_first().internal_id) | set(self.data.get_second().internal_id)
         for data in datas.itertuples():
-            if not ((data.internal_id == self.data.get_first().internal_id).any() or
-                    (data.internal_id == self.data.get_second().internal_id).any()):
+            if data.internal_id not in shown:
                 self.model.sonification_view.tableView.currentDataModel.load_row(data)
 
     def mute_click(self) -> None:
@@ -18,6 +18,12 @@ class ParameterEncodingCtrl:
     def assign_main_var(self, main_var: str) -> None:
         self.model.filter.assign_column(main_var)
         self.model.initialized = True
+        self.model.invalidate_lookup_table()
+        Models.note_model.NoteData.getInstance().invalidate()
+
+    def assign_quali_value(self, value: str, add: bool) -> None:
+        self.model.filter.assign_quali_value(value, add)
+        Models.note_model.NoteData.getInstance().invalidate()
 
     def set_default_value(self, value: str) -> None:
         if value == "":
@@ -37,9 +43,13 @@ class ParameterEncodingCtrl:
                     logging.log(logging.ERROR, "Issue with value in setDefault-value-nonnum {}".format(value))
         elif value.isnumeric():
             self.model.defaultValue = int(value)
+        self.model.invalidate_lookup_table()
+        Models.note_model.NoteData.getInstance().invalidate()
 
     def reset_value(self, variable: str) -> None:
         self.model.handpickEncoding.pop(variable, None)
+        self.model.invalidate_lookup_table()
+        Models.note_model.NoteData.getInstance().invalidate()
 
     def set_value(self, value: str, variable: str) -> None:
         if value == "":
@@ -65,6 +75,8 @@ class ParameterEncodingCtrl:
         elif value.isnumeric():
             self.model.handpickEncoding[variable] = int(value) if self.model.maxValue > int(
                 value) > 0 else self.model.defaultValue
+        self.model.invalidate_lookup_table()
+        Models.note_model.NoteData.getInstance().invalidate()
 
     def change_octave(self, octave: str) -> None:
         self.model.octave = octave
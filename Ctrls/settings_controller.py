@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-import threading
+from typing import TYPE_CHECKING
 
+import Models.note_model as note_model
 import Models.settings_model as ts
-import ViewsPyQT5.settings_view as sv
 from Utils.utils import is_int, is_float
 
+if TYPE_CHECKING:  # PyQt5 is not imported when running headless
+    import ViewsPyQT5.settings_view as sv
+
 
 class SettingsCtrl():
     """
@@ -16,8 +19,9 @@ class SettingsCtrl():
         self.model = model  # TimeSettings Model
 
     def change_batch_size(self, batch_size: int, batch_planned: int) -> None:
-        if self.model.music.ctrl.playing:
-            self.model.music.ctrl.stoppedEvent.wait()
+        """
+        Applied immediately, also during playback: notes already queued are kept.
+        """
         self.model.batchSize = batch_size
         self.model.batchPlanned = batch_planned
         self.model.data.batch_size = batch_size
@@ -26,7 +30,8 @@ class SettingsCtrl():
     def validate(self, batch_size: int, batch_planned: int, song_length: int, note_timing: int, sample_size: int,
                  tempo_idx: int,
                  tempo_N: int, tempo_dur: int, tempo_offset: int,
-                 autoload: bool, graphical_length: int, graphical_precentage: int) -> None:
+                 autoload: bool, graphical_length: int, graphical_precentage: int, streaming: bool,
+                 adaptive: bool) -> None:
         """
         Validate time settings entered by user and update models accordingly
         """
@@ -41,8 +46,8 @@ class SettingsCtrl():
                 is_int(tempo_offset) and 0 <= int(tempo_offset) < int(tempo_N) and
                 is_int(graphical_precentage) and 100 >= int(graphical_precentage) >= 0):
             return
-        threading.Thread(target=self.change_batch_size, args=[int(batch_size), int(batch_planned)], daemon=True,
-                         name="change_batch_size").start()
+        self.model.music.ctrl.lookahead.restore()  # values entered by the user become the base of adaptation
+        self.change_batch_size(int(batch_size), int(batch_planned))
         self.model.musicDuration = float(song_length)
         self.model.timeBuffer = int(note_timing)
         self.model.sampleSize = int(sample_size)
@@ -52,8 +57,11 @@ class SettingsCtrl():
         self.model.tempoOffsetValue = int(tempo_offset)
         self.model.autoload = autoload
         self.model.autoloadDataPath = self.model.data.primary_data_path
+        self.model.streaming = streaming
+        self.model.adaptive = adaptive
         self.model.graphicalLength = int(graphical_length) * 1000
         self.model.graphicalBarPercentage = float(graphical_precentage) / 100
+        note_model.NoteData.getInstance().invalidate()
 
         self.write_to_ini()
 
@@ -67,6 +75,10 @@ class SettingsCtrl():
             settingsFile.write(line)
             line = "debugverbose=" + str(self.model.debugVerbose) + "\n"
             settingsFile.write(line)
+            line = "streaming=" + str(self.model.streaming) + "\n"
+            settingsFile.write(line)
+            line = "adaptive=" + str(self.model.adaptive) + "\n"
+            settingsFile.write(line)
             line = "graphicalLength=" + str(self.model.graphicalLength) + "\n"
             settingsFile.write(line)
             line = "graphicalBarPercentage=" + str(self.model.graphicalBarPercentage) + "\n"
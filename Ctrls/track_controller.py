@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import Models.note_model as note
 import Models.track_model as track
 from Utils.soundfont_loader import SoundfontLoader
 from ViewsPyQT5.ViewsUtils.views_utils import selectedTrackStyle, selectTrackButtonStyle
@@ -17,6 +18,7 @@ class TrackCtrl:
 
     def update_filter(self, filter: str) -> None:
         self.model.filter.assign(filter)
+        note.NoteData.getInstance().invalidate()
 
     def set_soundfont(self, soundfont: str) -> None:
         self.model.soundfont = self.soundfontUtils.get(soundfont)
@@ -24,9 +26,11 @@ class TrackCtrl:
 
     def set_main_var(self, column: str) -> None:
         self.model.set_main_var(column)
+        note.NoteData.getInstance().invalidate()
 
     def change_offset(self, offset: float) -> None:
         self.model.offset = float(offset)
+        note.NoteData.getInstance().invalidate()
 
     def change_gain(self, gain: int) -> None:
         self.model.gain = int(gain)
@@ -1,15 +1,22 @@
 import logging
 import os.path
-from datetime import datetime
+import threading
 
-import dateutil
 import numpy as np
 import pandas as pd
-from dateutil.parser import parse, ParserError
 from pandas import DataFrame
 
 import Models.music_model as music_model
+import Models.note_model as note_model
+from Utils.column_profiler import ColumnProfile, ColumnProfiler, is_date
+from Utils.column_stats import ColumnStats, compute_stats
+from Utils.constants import TIME_SETTINGS_OPTIONS
+from Utils.data_stream import DataStream
+from Utils.dataset_cache import DatasetCache
 from Utils.error_manager import ErrorManager
+from Utils.timestamp_parser import TimestampParser
+
+INTERNAL_COLUMNS = ['internal_timestamp', 'internal_id', 'internal_filter']
 
 
 class Data:
@@ -30,12 +37,41 @@ class Data:
                         column of the dataframe
             df          : Pandas.Dataframe,
                         Our dataset
+            streams     : list,
+                        DataStream of each dataset, None if the dataset is loaded in memory. When streamed, df only
+                        holds the first chunk of the file as a preview.
+            paths       : list,
+                        file of each dataset
+            cache       : DatasetCache,
+                        on-disk cache of datasets whose timestamps have already been assigned
+            stats       : dict,
+                        (data index, column) -> ColumnStats, computed on demand and dropped when data change
+            profiler    : ColumnProfiler,
+                        profiles of the columns of the primary dataset, computed in background after loading
+            codes       : dict,
+                        (data index, column) -> (codes, categories) of the column, see get_column_codes
+            generation  : int,
+                        incremented each time data change, allows other models to invalidate what they derived from it
+            tfactorIndex: tuple,
+                        (key, temporal positions) of the rows of the current dataset, see get_tfactor_index
+            lock        : RLock,
+                        held while the playing index is read or moved, so that a seek does not interleave with the
+                        production of a batch
             batch_size  : int,
                         the buffer size
         """
         if Data._instance is None:
             self.current_dataset = None
             self.df = []
+            self.streams = []
+            self.paths = []
+            self.cache = DatasetCache()
+            self.stats = {}
+            self.codes = {}
+            self.profiler = None
+            self.generation = 0
+            self.tfactorIndex = None
+            self.lock = threading.RLock()
             self.data_index = 0
             self.header = None
             self.timing_span = None
@@ -60,6 +96,15 @@ class Data:
         :param path: str,
                 The file path
         """
+        self.paths.append(path)
+        if '.csv' in path and self.music.settings.streaming:
+            stream = DataStream(path)
+            self.df.append(stream.head(stream.chunk_size))
+            self.streams.append(stream)
+            logging.log(logging.INFO, "Streaming {} (~{} rows) by chunks of {} rows".format(path, stream.size,
+                                                                                           stream.chunk_size))
+            return
+        self.streams.append(None)
         if '.csv' in path:
             try:
                 self.df.append(pd.read_csv(path, sep=";"))
@@ -72,30 +117,81 @@ class Data:
         else:
             raise FileNotFoundError("Specified data file has not been found at location: {}".format(path))
 
-    def read_primary_data(self, path: str):
+    def read_primary_data(self, path: str, dataset: DataFrame = None):
         """
         :param path: str
+        :param dataset: DataFrame,
+                the content of the file if it has already been read, e.g. from the cache
         """
         if len(self.df) > 0:
             self.df = []
+        for stream in self.streams:
+            if stream is not None:
+                stream.stop()
+        self.streams = []
+        self.paths = []
+        self.data_index = 0
+        self.music = music_model.Music.getInstance()
         self.primary_data_path = path
-        self.retrieve_data(path)
+        if dataset is None:
+            self.retrieve_data(path)
+        else:
+            self.df.append(dataset)
+            self.streams.append(None)
+            self.paths.append(path)
         self.current_dataset = self.df[0]
-        self.header = list(self.df[0].columns)
+        self.header = [c for c in self.df[0].columns if c not in INTERNAL_COLUMNS]
         self.timing_span = None
         self.set_data_timespan = None
         self.index = 0
         self.first_date = None
         self.last_date = None
-        self.music = music_model.Music.getInstance()
         self.batch_size = self.music.settings.batchSize
         self.sample_size = self.music.settings.sampleSize
-        self.size = self.df[0].shape[0] + 1
+        self.size = self.get_size()
+        self.invalidate_stats()
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.profiler = ColumnProfiler(self.df[0])
+        self.profiler.start()
         self.music.settings.reset_music_duration()
 
+    def load_primary_data(self, path: str, date_column: str, additional_format: str = "") -> None:
+        """
+        Read primary data and assign its timestamps. If the file did not change since its timestamps were last assigned,
+        the parsed dataset is loaded from the cache instead.
+        """
+        self.music = music_model.Music.getInstance()
+        cached = None
+        if not self.music.settings.streaming:
+            cached = self.cache.load(path, date_column, self.get_timestamp_formats(additional_format))
+        if cached is None:
+            self.read_primary_data(path)
+            self.date_column = date_column
+            self.assign_timestamps(additional_format)
+            return
+        dataset, meta = cached
+        self.read_primary_data(path, dataset)
+        self.date_column = date_column
+        self.first_date = meta["first_date"]
+        self.last_date = meta["last_date"]
+        self.timing_span = pd.Timedelta(seconds=self.first_date - self.last_date)
+        note_model.NoteData.getInstance().invalidate()
+
+    def invalidate_cache(self) -> int:
+        """
+        Remove the cached versions of the loaded data files.
+        :return: the number of cache entries removed
+        """
+        paths = set(self.paths)
+        if self.primary_data_path is not None:
+            paths.add(self.primary_data_path)
+        return sum(self.cache.invalidate(path) for path in paths if path)
+
     def read_additional_data(self, path: str):
         self.data_index = len(self.df)
         self.retrieve_data(path)
+        self.invalidate_stats()
         self.set_data_index(self.data_index)
 
     @staticmethod
@@ -105,30 +201,25 @@ class Data:
         :param string: str, string to check for date
         :param fuzzy: bool, ignore unknown tokens in string if True
         """
-        try:
-            parse(string, fuzzy=fuzzy)
-            return True
-        except ValueError:
-            return False
-        except TypeError:
-            return False
+        return is_date(string, fuzzy)
+
+    def get_profile(self, column: str) -> ColumnProfile:
+        """
+        Profile of a column of the primary dataset, see ColumnProfiler.
+        """
+        return self.profiler.get(column)
 
     def get_candidates_timestamp_columns(self) -> [str]:
         """
         find and return all columns that looks like a timestamp
         """
-        candidates = []
-        for c in self.header:
-            if (self.current_dataset[c].first_valid_index() is not None and
-                    self.is_date(self.current_dataset[c].loc[self.current_dataset[c].first_valid_index()])):
-                candidates.append(c)
-        return candidates
+        return [c for c in self.header if self.get_profile(c).timestamp_like]
 
     def get_best_guess_variable(self) -> str:
         lower = self.header[0]
         for header in self.header:
-            varins = [str(x) for x in self.get_variables_instances(header)]
-            if (len(self.get_variables_instances(lower)) > len(varins) > 5 and "nan" not in varins):
+            profile = self.get_profile(header)
+            if (self.get_profile(lower).cardinality > profile.cardinality > 5 and profile.null_ratio == 0):
                 lower = header
         return lower
 
@@ -150,15 +241,67 @@ class Data:
         :return: list,
                 unique value from the target column
         """
-        return pd.unique(self.df[0][column])
+        return self.get_profile(column).instances
+
+    def get_stats(self, column: str) -> ColumnStats:
+        """
+        Statistics of a column of the current dataset, computed once. For a streamed dataset, statistics are computed
+        on the preview.
+        """
+        key = (self.data_index, column)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = compute_stats(self.current_dataset[column])
+            self.stats[key] = stats
+        return stats
+
+    def get_column_codes(self, column: str) -> (np.ndarray, np.ndarray):
+        """
+        Factorize a column of the current dataset once: categories are its distinct values and codes give, for each row,
+        the index of its value in categories. Row internal_id has code codes[internal_id - 1].
+        :return: (codes, categories), None if the dataset is streamed or if the column mixes types, as such values can
+            not be distinguished by a factorization (1 and 1.0 for instance)
+        """
+        key = (self.data_index, column)
+        if key not in self.codes:
+            values = self.current_dataset[column]
+            if self.get_stream() is not None or (
+                    values.dtype == object and
+                    pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty", "boolean")):
+                self.codes[key] = None
+            else:
+                codes, categories = pd.factorize(values, use_na_sentinel=False)
+                self.codes[key] = (codes, np.asarray(categories, dtype=object))
+        return self.codes[key]
+
+    def invalidate_stats(self) -> None:
+        self.stats = {}
+        self.codes = {}
+        self.tfactorIndex = None
+        self.generation += 1
 
     def get_max(self, column: str) -> float:
-        return max([float(x) for x in self.current_dataset[column]])
+        stats = self.get_stats(column)
+        if not stats.numeric:
+            raise ValueError("Column {} is not numeric".format(column))
+        return stats.max
 
     def get_min(self, column: str) -> float:
-        return min([float(x) for x in self.current_dataset[column]])
+        stats = self.get_stats(column)
+        if not stats.numeric:
+            raise ValueError("Column {} is not numeric".format(column))
+        return stats.min
+
+    def get_stream(self) -> DataStream:
+        """
+        :return: the DataStream of the current dataset, None if it is loaded in memory
+        """
+        return self.streams[self.data_index] if self.data_index < len(self.streams) else None
 
     def get_size(self) -> int:
+        stream = self.get_stream()
+        if stream is not None:
+            return stream.size + 1
         return self.current_dataset.shape[0] + 1
 
     def get_first(self):
@@ -174,10 +317,59 @@ class Data:
             data: pd.Dataframe,
                 data buffered
         """
-        data = self.current_dataset[self.index: self.index + self.batch_size]
-        if (iterate):
-            self.index += self.batch_size
-        return data
+        with self.lock:
+            stream = self.get_stream()
+            if stream is not None:
+                data = stream.get_next(self.batch_size, iterate)
+                self.index = stream.position
+                return data
+            data = self.current_dataset[self.index: self.index + self.batch_size]
+            if (iterate):
+                self.index += self.batch_size
+            return data
+
+    def get_tfactor_index(self) -> np.ndarray:
+        """
+        Temporal position of each row of the current dataset, without track offset. Computed once per dataset and
+        timing settings.
+        :return: numpy array, increasing, None if the dataset is streamed and positions depend on timestamps
+        """
+        plan = self.music.settings.get_timing_plan()
+        key = (self.generation, self.data_index, plan.key)
+        if self.tfactorIndex is None or self.tfactorIndex[0] != key:
+            stream = self.get_stream()
+            if stream is None:
+                tfactors = plan.tfactors(self.current_dataset['internal_timestamp'].to_numpy(dtype=np.float64),
+                                         self.current_dataset['internal_id'].to_numpy(dtype=np.float64))
+            elif plan.type != TIME_SETTINGS_OPTIONS[2]:  # tempo modes only depend on row ids
+                ids = np.arange(1, stream.size + 1, dtype=np.float64)
+                tfactors = plan.tfactors(ids, ids)
+            else:
+                return None
+            self.tfactorIndex = (key, tfactors)
+        return self.tfactorIndex[1]
+
+    def find_row_from_time(self, tfactor: float) -> int:
+        """
+        :param tfactor: float,
+            temporal position, between 0 and 1
+        :return: index of the first row of the current dataset played at or after tfactor. For a streamed dataset in
+            linear mode, the row is estimated as if rows were evenly spread in time.
+        """
+        tfactors = self.get_tfactor_index()
+        if tfactors is None:
+            return int(min(max(tfactor, 0.0), 1.0) * self.get_stream().size)
+        return int(np.searchsorted(tfactors, tfactor, side='left'))
+
+    def seek(self, row: int) -> None:
+        """
+        Move the playing index, the next batch starts at row.
+        """
+        with self.lock:
+            self.index = row
+            stream = self.get_stream()
+            if stream is not None:
+                stream.start(row)
 
     def get_timestamp_formats(self, additional_format: str = "") -> [str]:
         """
@@ -206,74 +398,105 @@ class Data:
         self.formats = formats
         return self.formats
 
-    @staticmethod
-    def get_datetime(d, formats) -> datetime:
+    def assign_timestamps(self, additional_format="") -> None:
         """
-        :param
-            d: str,
-                date to convert
-            additional_format: str,
-                format to try
-        :return:
-            date: str,
-                converted date
+        Method to assign timestamp to a new column. The timestamp column is parsed in a single vectorized pass, see
+        TimestampParser.
         """
-
-        for f in formats:
-            try:
-                date = datetime.strptime(d, f)
-                if (
-                        date.year <= 1970):  # years before 1970-01-02 02:00:00 or beyond 3001-01-19 07:59:59 will raise oserror
-                    date = date.replace(year=1971)
-                    ErrorManager.getInstance().datetime_replacement_warning()
-                return date
-            except ValueError:
-                pass
-            except TypeError:
-                logging.log(logging.FATAL, "No format found for this timestamp: {}".format(d))
-                ErrorManager.getInstance().timeformat_error()
-                raise ValueError("No format found for this timestamp: {}".format(d))
+        parser = TimestampParser(self.get_timestamp_formats(additional_format))
+        self.invalidate_stats()
+        if self.get_stream() is not None:
+            self.assign_streamed_timestamps(parser)
+            return
         try:
-            yourdate = dateutil.parser.parse(d)
-            return yourdate
-        except ParserError:
-            logging.log(logging.FATAL, "No format found for this timestamp: {}".format(d))
+            timestamps = parser.parse(self.df[self.data_index][self.date_column])
+        except ValueError as e:
+            logging.log(logging.FATAL, str(e))
             ErrorManager.getInstance().timeformat_error()
-            raise ValueError("No format found for this timestamp: {}".format(d))
-
-    def assign_timestamps(self, additional_format="") -> None:
-        """
-        Method to assign timestamp to a new column
-        """
-        self.df[self.data_index]['internal_timestamp'] = self.df[self.data_index][self.date_column].apply(
-            lambda x: self.get_datetime(x, self.get_timestamp_formats(additional_format)).timestamp())
+            raise
+        logging.log(logging.INFO, "Timestamps of column {} parsed as {} with format {} ({} rows parsed one by one)"
+                    .format(self.date_column, parser.kind, parser.format, parser.fallback_count))
+        self.df[self.data_index]['internal_timestamp'] = timestamps / 1e9  # epoch nanoseconds into seconds
         if not self.df[self.data_index]['internal_timestamp'].is_monotonic_increasing:
             sort_data = ErrorManager.getInstance().sorted_data_warning()
             if (sort_data):
-                self.df[self.data_index] = self.df[self.data_index].sort_values(by='internal_timestamp', axis=0)
+                self.df[self.data_index] = self.df[self.data_index].sort_values(by='internal_timestamp', axis=0,
+                                                                                kind='stable')
             else:
                 exit()
         self.df[self.data_index]['internal_id'] = np.arange(1, self.df[self.data_index].shape[0] + 1)
         self.df[self.data_index]['internal_filter'] = True
-        # set first and last date here
-        first_date = self.get_datetime(self.df[self.data_index].iloc[0][self.date_column],
-                                       self.get_timestamp_formats(additional_format))
-        last_date = self.get_datetime(
-            self.df[self.data_index].iloc[len(self.df[self.data_index]) - 1][self.date_column],
-            self.get_timestamp_formats(additional_format))
-        self.timing_span = first_date - last_date
-        # first and last date into seconds
-        self.first_date = first_date.timestamp()
-        self.last_date = last_date.timestamp()
+        self.current_dataset = self.df[self.data_index]
+        # set first and last date here, in seconds
+        self.first_date = float(self.df[self.data_index]['internal_timestamp'].iloc[0])
+        self.last_date = float(self.df[self.data_index]['internal_timestamp'].iloc[-1])
+        self.timing_span = pd.Timedelta(seconds=self.first_date - self.last_date)
+        note_model.NoteData.getInstance().invalidate()
+        # not a daemon, so that exiting waits for the entry to be complete
+        threading.Thread(target=self.cache.store, daemon=False, name="Data_cache_thread",
+                         args=[self.paths[self.data_index], self.date_column, parser.formats,
+                               self.df[self.data_index], self.first_date, self.last_date]).start()
+
+    def assign_streamed_timestamps(self, parser: TimestampParser) -> None:
+        """
+        Same as assign_timestamps, for a streamed dataset. The timestamp column is scanned once, chunk by chunk, to find
+        the first and last dates and the exact size. Other internal columns are then computed on the fly for each chunk
+        read. Streamed data cannot be sorted and must already be sequential.
+        """
+        stream = self.get_stream()
+        date_column = self.date_column
+        size = 0
+        first_date = None
+        last_date = None
+        sequential = True
+        try:
+            for chunk in stream.read_chunks(columns=[date_column]):
+                timestamps = parser.parse(chunk[date_column]) / 1e9
+                if parser.format is not None and parser.formats[0] != parser.format:
+                    parser.formats = [parser.format] + [f for f in parser.formats if f != parser.format]
+                if len(timestamps) == 0:
+                    continue
+                if first_date is None:
+                    first_date = timestamps[0]
+                sequential = sequential and (last_date is None or timestamps[0] >= last_date) and bool(
+                    (np.diff(timestamps) >= 0).all())
+                last_date = timestamps[-1]
+                size += len(timestamps)
+        except ValueError as e:
+            logging.log(logging.FATAL, str(e))
+            ErrorManager.getInstance().timeformat_error()
+            raise
+        if not sequential:
+            ErrorManager.getInstance().unsorted_stream_error()
+            raise ValueError("Streamed data {} are not sorted by {}".format(stream.path, date_column))
+
+        def transform(chunk: DataFrame, first_row: int) -> DataFrame:
+            chunk['internal_timestamp'] = parser.parse(chunk[date_column]) / 1e9
+            chunk['internal_id'] = np.arange(first_row + 1, first_row + chunk.shape[0] + 1)
+            chunk['internal_filter'] = True
+            return chunk
+
+        stream.size = size
+        stream.transform = transform
+        stream.stop()
+        self.df[self.data_index] = stream.head(stream.chunk_size)
+        self.current_dataset = self.df[self.data_index]
+        self.first_date = float(first_date)
+        self.last_date = float(last_date)
+        self.timing_span = pd.Timedelta(seconds=self.first_date - self.last_date)
+        logging.log(logging.INFO, "Streamed data {} scanned: {} rows from {} to {}".format(
+            stream.path, size, self.first_date, self.last_date))
+        note_model.NoteData.getInstance().invalidate()
 
     def set_data_index(self, index) -> None:
         bpm = self.music.settings.get_bpm()
         self.data_index = index
         self.current_dataset = self.df[self.data_index]
         self.music.settings.set_bpm(bpm)
+        note_model.NoteData.getInstance().invalidate()
 
     def reset_playing_index(self) -> None:
-        self.index = 0
+        self.seek(0)
 
     def get_insight(self, col):
         """
@@ -281,12 +504,11 @@ class Data:
         :param col:
         :return: dict
         """
-        insight = {}
-
+        stats = self.get_stats(col)
         if col in self.df[self.data_index].select_dtypes(exclude='object'):  # if col is continious
-            return {'mode': self.df[self.data_index][col].mode(), 'mean': self.df[self.data_index][col].mean(),
-                    'min': self.df[self.data_index][col].min(),
-                    'max': self.df[self.data_index][col].max(), 'median': self.df[self.data_index][col].median()}
+            counts = stats.counts.dropna()
+            return {'mode': pd.Series(counts.index[counts == counts.max()]).sort_values(ignore_index=True),
+                    'mean': stats.mean, 'min': stats.min, 'max': stats.max, 'median': stats.quantiles.get(0.5)}
 
         else:  # col is an object/categorical
-            return self.df[self.data_index][col].value_counts().to_dict()
+            return stats.counts.dropna().to_dict()
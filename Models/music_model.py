@@ -1,14 +1,19 @@
 import itertools
+import logging
+import os
 import time
-from queue import PriorityQueue
 
-from midiutil.MidiFile import MIDIFile
+import numpy as np
 
 import Models.data_model as data_model
 from Ctrls.music_controller import MusicCtrl
 from Models import note_model
 from Models.settings_model import GeneralSettings
 from Models.track_model import Track
+from Utils.constants import STEM_MIN_TRACKS
+from Utils.midi_writer import MidiWriter
+from Utils.ring_buffer import RingBuffer
+from Views.audio_renderer import AudioRenderer, StemRenderer
 
 
 class Music:
@@ -31,12 +36,15 @@ class Music:
             Music()
         return Music._instance
 
-    def __init__(self):
+    def __init__(self, headless: bool = False):
         """
         instantiation, unique
+        :param headless: bool,
+            if True, music can only be exported: no audio driver, sequencer nor producer thread are started
         """
         if Music._instance is None:
             Music._instance = self
+            self.headless = headless
             # Data
             self.gain = 100
             self.timescale = 1000  # ticks per seconds
@@ -44,128 +52,172 @@ class Music:
 
             # Other models
             self.tracks = {}  # List of track model created by user
-            self.tracks_note = {}
+            self.tracks_note = {}  # Precomputed notes of each track, see NoteData
+            self.note_data = note_model.NoteData.getInstance()
 
             self.settings = GeneralSettings(self)
             self.data = data_model.Data.getInstance()
             self.queue_capacity = self.settings.batchPlanned * self.settings.batchSize
-            self.notes = PriorityQueue()  # Priority queue ordered by tfactor
+            self.notes = RingBuffer(self.queue_capacity, note_model.NOTE_DTYPE)  # Notes ordered by tfactor in batches
 
             # Ctrl
             self.ctrl = MusicCtrl(self)
 
             # Views
             self.sonification_view = None
-            self.ctrl.producer_thread.start()
+            if not headless:
+                self.ctrl.producer_thread.start()
 
     def __getstate__(self):
         state = self.__dict__.copy()
         del state["data"]
         del state["ctrl"]
+        del state["headless"]
         del state["sonification_view"]
         del state["notes"]
+        del state["note_data"]
+        state["tracks_note"] = {}
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
-        self.notes = PriorityQueue()
+        self.notes = RingBuffer(self.queue_capacity, note_model.NOTE_DTYPE)
+        self.note_data = note_model.NoteData.getInstance()
         self.sonification_view = None
         self.data = data_model.Data.getInstance()
 
     def generate_midi(self, filename="output"):
 
         """
-        Generate and populate a midi file based on current parameters and data.
+        Generate and populate a midi file based on current parameters and data. Tracks are written whole from their
+        precomputed notes when all are up to date, batch by batch otherwise.
         :param filename:
         :return:
         """
-        # setup
         bpm = self.settings.get_bpm()
+        self.ctrl.setup_general_attribute()
+        tables = {t.id: self.note_data.get_table(t) for t in self.tracks.values()}
+        with MidiWriter(filename + ".mid", {t.id: str(t.id) for t in self.tracks.values()}, bpm) as mf:
+            if all(notes is not None for notes in tables.values()):
+                for t in self.tracks.values():
+                    notes = tables[t.id]
+                    self.add_midi_notes(mf, t, notes[~notes["void"]], bpm)
+                return
+            for notes in self.iterate_notes():
+                notes = notes[~notes["void"]]
+                for t in self.tracks.values():
+                    self.add_midi_notes(mf, t, notes[notes["channel"] == t.id], bpm)
+
+    def generate_audio(self, filename: str, stems: bool = False, progress=None, cancelled=None) -> bool:
+        """
+        Render the music to a wav file. Tracks are rendered in parallel processes when stems are requested, or when
+        there are at least STEM_MIN_TRACKS tracks and several cores. Both renderers apply the same gains.
+        :param stems: bool, if True also write the music of each track to its own wav file
+        :param progress: function called with the fraction of the music rendered
+        :param cancelled: function returning True when the rendering should stop
+        :return: False if the rendering was cancelled
+        """
+        progress = progress or (lambda p: None)
+        cancelled = cancelled or (lambda: False)
+        if stems or (len(self.tracks) >= STEM_MIN_TRACKS and (os.cpu_count() or 1) > 1):
+            return StemRenderer(gain=float(self.gain) / 100).render(
+                self.iterate_notes(), self.get_absolute_note_timings, self.tracks, filename,
+                self.settings.get_music_duration(), stems, progress, cancelled)
+        renderer = AudioRenderer(gain=float(self.gain) / 100)
+        try:
+            renderer.load_tracks(self.tracks)
+            return renderer.render(self.iterate_notes(), self.get_absolute_note_timings, filename,
+                                   self.settings.get_music_duration(), progress, cancelled)
+        finally:
+            renderer.delete()
+
+    def add_midi_notes(self, mf: MidiWriter, track: Track, notes: np.ndarray, bpm: float) -> None:
+        times = note_model.convert_seconds_to_quarter(
+            self.get_absolute_note_timings(notes['tfactor']) / self.timescale, bpm)
+        durations = note_model.convert_seconds_to_quarter(notes['duration'] / self.timescale, bpm)
+        mf.add_notes(track.id, times, durations, notes['value'], notes['velocity'])
+
+    def iterate_notes(self):
+        """
+        Generator of the notes of the whole song from the start, batch by batch, as played.
+        :return: numpy arrays of NOTE_DTYPE, each sorted by tfactor
+        """
         self.data.reset_playing_index()
         self.ctrl.setup_general_attribute()
-        self.ctrl.load_soundfonts()
-        mf = MIDIFile(len(self.tracks), eventtime_is_ticks=False)  # declare midi file
-        for key in self.tracks:
-            mf.addTrackName(int(key), 0, str(self.tracks[key].id))
-            mf.addTempo(int(key), 0, bpm)
-        # iterate over data
-        while not self.data.get_next().empty:
-            current_data = self.data.get_next(iterate=True)
-            for t in self.tracks.values():
-                for note in t.generate_notes(current_data):
-                    mf.addNote(track=t.id, channel=t.id, pitch=note.value,
-                               time=note_model.convert_seconds_to_quarter(
-                                   float(self.get_absolute_note_timing(note.tfactor)) / self.timescale, bpm),
-                               duration=note_model.convert_seconds_to_quarter(float(note.duration) / self.timescale,
-                                                                              bpm),
-                               volume=note.velocity)
-        with open(filename + ".mid", "wb") as outf:
-            mf.writeFile(outf)
-
-    def write_fluidsynth_config(self, filename):
-        """
-        Automatically write a config file for fluidsynth, containg info about soundfonts, gain, etc.
-        """
-        with open(filename + "-fluidsynth_midi_to_wav.config", "w") as f:
-            lines = ["set player.reset-synth 0\n"]  # prevent fluidsynth to override settings
-            for t in self.tracks.values():
-                lines.append("load \"{}\"\n".format(t.soundfont))  # load soundfonts
-            for key in self.tracks:
-                lines.append("select {} {} 0 0\n".format(int(key), int(key) + 1))  # assign soundfonts to tracks
-            for key in self.tracks:
-                lines.append("cc {} 7 {}\n".format(key, self.tracks[key].gain * 1.27))  # update gain
-            f.writelines(lines)
+        while True:
+            batch = self.data.get_next(iterate=True)
+            if batch.empty:
+                return
+            yield self.generate_batch(batch)
 
     def generate_dataframe(self):
-        """Pre compute all notes into a dataframe"""
-        raise NotImplementedError()
+        """Pre compute all notes, see NoteData"""
         t1 = time.perf_counter()
-        for track in self.tracks.values():
-            evaluated_data = track.filter_batch(self.data.current_dataset, False)
-            notes = evaluated_data.apply(lambda x: track.build_note2(x), axis=1)
-            self.tracks_note[str(track.id)] = notes
-        # print("done in {} for {} lines".format(time.perf_counter() - t1, len(self.tracks_note["0"])))
+        self.tracks_note = self.note_data.generate()
+        logging.log(logging.INFO, "Notes precomputed in {} s for {} tracks".format(time.perf_counter() - t1,
+                                                                                  len(self.tracks_note)))
 
     def generate(self):
         """
         Threaded.
-        Produce at regular intervals a note, based on data and tracks configuration and put it into self.notes
-        Uses notes as a PriorityQueue, which is concurently used by music_view (consumer) and various semaphores to
-        get access. In theory, each row in the dataset can be converted into multiples notes (1 note/track).
+        Produce at regular intervals the notes of a batch of data, based on data and tracks configuration, and put them
+        into self.notes in a single operation. Uses notes as a RingBuffer, which is concurrently used by music_view
+        (consumer). In theory, each row in the dataset can be converted into multiples notes (1 note/track).
         """
         while True:  # This thread never stops
             self.ctrl.playingEvent.wait()  # wait if we are stopped
             self.ctrl.pausedEvent.wait()  # wait if we are paused
-            # with self.ctrl.trackSemaphore:
-            max_note_nbr = len(self.tracks) * self.data.batch_size  # Acquire queue as if each row will become a note
-            note_nbr = 0  # track how many row actually become notes
-            self.ctrl.emptySemaphore.acquire(n=max_note_nbr)  # Check if the queue is not full
-            # Usually hang on this ^^^
-            if not self.ctrl.playing:  # Check if semaphore was acquired while stop was pressed
-                self.ctrl.emptySemaphore.release(n=max_note_nbr)  # Release if so, and return to start of loop to wait
-            elif (not self.data.get_next().empty):
-                current_data = self.data.get_next(iterate=True)  # get the next batch
-                self.ctrl.push_data_to_table(current_data)  # display
-                self.ctrl.queueSemaphore.acquire()  # Check if the queue is unused - can hang here
-                if not self.ctrl.playing:  # if music stopped during acquirement of queueSemaphore, release everything
-                    self.ctrl.queueSemaphore.release()
-                    self.ctrl.emptySemaphore.release(n=max_note_nbr)
-                else:
-                    for t in self.tracks.values():
-                        for note in t.generate_notes(current_data):
-                            self.notes.put_nowait(note)
-                            self.ctrl.graphSemaphore.acquire()
-                            self.sonification_view.visualisationView.futureNotes.append(note)
-                            self.ctrl.graphSemaphore.release()
-                            note_nbr += 1  # keep track of how many note are actually generated
-                    self.ctrl.queueSemaphore.release()  # Release queue
-                    self.ctrl.emptySemaphore.release(
-                        n=max_note_nbr - note_nbr)  # If not all rows become note, release empty accordingly
-                    self.ctrl.fullSemaphore.release(n=note_nbr)  # Inform consumer that queue is not empty
-            else:  # If we have no more data, we are at the end of the music
-                self.ctrl.finished = True
+            epoch = self.notes.epoch  # the buffer is reset, and its epoch incremented, when music is stopped
+            max_note_nbr = len(self.tracks) * self.data.batch_size  # Wait for room as if each row will become a note
+            if not self.notes.wait_for_space(max_note_nbr, epoch):  # Usually hang on this
+                continue  # music stopped while waiting, return to start of loop to wait
+            notes = None
+            measure = None  # notes generated, rows and generation time of the batch, for the look-ahead controller
+            with self.data.lock:  # a seek can not move the playing index while a batch is produced
+                if not self.ctrl.playing or self.notes.epoch != epoch:  # Check if stop or seek happened meanwhile
+                    continue
+                elif (not self.data.get_next().empty):
+                    current_data = self.data.get_next(iterate=True)  # get the next batch
+                    self.ctrl.push_data_to_table(current_data)  # display
+                    t = time.perf_counter()
+                    notes = self.generate_batch(current_data)
+                    measure = (notes, current_data.shape[0], time.perf_counter() - t)
+                    notes = notes[notes["tfactor"] >= self.ctrl.startTfactor]  # rows started early by a seek
+                    self.ctrl.graphSemaphore.acquire()
+                    self.sonification_view.visualisationView.futureNotes.append(notes)
+                    self.ctrl.graphSemaphore.release()
+                else:  # If we have no more data, we are at the end of the music
+                    self.ctrl.finished = True
+            # adapting the look-ahead may resize the buffer, and put blocks while the buffer is full, e.g. when paused, so
+            # both are done without the lock seek needs. If a seek or stop resets the buffer meanwhile, epoch is outdated
+            # and the notes are dropped.
+            if measure is not None and self.settings.adaptive:
+                self.ctrl.lookahead.on_batch(*measure)
+            if notes is not None:
+                self.notes.put(notes, epoch)
+            if self.ctrl.finished:
                 time.sleep(2.0)
 
+    def generate_batch(self, batch) -> np.ndarray:
+        """
+        Merge the notes of every track for a batch of data.
+        :param batch: DataFrame,
+            rows of data
+        :return: numpy array of NOTE_DTYPE, sorted by tfactor, notes of the same tfactor in order of tracks
+        """
+        first_id = batch['internal_id'].iloc[0]
+        last_id = batch['internal_id'].iloc[-1]
+        arrays = []
+        for t in self.tracks.values():
+            notes = self.note_data.get_notes(t, first_id, last_id)
+            if notes is None:  # precomputed notes not ready
+                notes = t.generate_note_array(batch)
+            arrays.append(notes)
+        if len(arrays) == 0:
+            return np.empty(0, dtype=note_model.NOTE_DTYPE)
+        notes = np.concatenate(arrays)
+        return notes[np.argsort(notes["tfactor"], kind="stable")]
+
     def get_absolute_note_timing(self, tfactor):
         """
         Compute and return the absolute timing in sec of a tfactor, depending on music duration.
@@ -173,9 +225,17 @@ class Music:
         """
         return int(tfactor * self.settings.get_music_duration() * 1000)
 
+    def get_absolute_note_timings(self, tfactors: np.ndarray) -> np.ndarray:
+        """
+        Vectorized get_absolute_note_timing.
+        :param tfactors: numpy array of values between 0 and 1
+        """
+        return np.trunc(tfactors * self.settings.get_music_duration() * 1000).astype(np.int64)
+
     def add_track(self, track, generate_view=False):
         # with self.ctrl.trackSemaphore:
         self.tracks[str(track.id)] = track
+        self.note_data.invalidate()
         if generate_view:
             self.sonification_view.trackView.add_track(track)
 
@@ -183,3 +243,4 @@ class Music:
 
         # with self.ctrl.trackSemaphore:
         del self.tracks[str(track.id)]
+        self.note_data.invalidate()
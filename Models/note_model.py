@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import math
+import threading
+import time
 from collections import namedtuple
 
+import numpy as np
+
 import Models.data_model as data_model
+import Models.music_model as music_model
 import Models.track_model as track
-from Models.parameter_encoding_model import ParameterEncoding
+from Utils.constants import NOTE_DATA_CHUNK, NOTE_DATA_DELAY
 
 # from typing import TYPE_CHECKING
 # if TYPE_CHECKING:
@@ -17,9 +24,26 @@ NNote = namedtuple('NNote', 'tfactor channel value velocity duration void id')
 TNote = namedtuple('TNote', ['tfactor', 'channel', 'value', 'velocity', 'duration', 'void', 'id'])
 ANote = namedtuple('TNote', ['timing', 'tfactor', 'channel', 'value', 'velocity', 'duration', 'void', 'id'])
 CNote = namedtuple('CNote', ['channel', 'value', 'velocity', 'duration'])
+# Columnar equivalent of TNote, used to generate the notes of a whole batch at once
+NOTE_DTYPE = np.dtype([('tfactor', np.float64), ('channel', np.int16), ('value', np.int16), ('velocity', np.int16),
+                       ('duration', np.int32), ('void', np.bool_), ('id', np.int64)])
+
+
+def to_tnotes(notes: np.ndarray) -> [TNote]:
+    """
+    Convert an array of NOTE_DTYPE into a list of TNote.
+    """
+    return [TNote._make(n) for n in notes.tolist()]
 
 
 class NoteData:
+    """
+    Precomputed notes of the whole song. For each track, every row of the current dataset is turned into a note once and
+    stored in a structured numpy array (NOTE_DTYPE) sorted by tfactor. Tables are rebuilt in background when encodings,
+    filters, settings or data change, as signaled by invalidate. Playback, midi export and visualisation read from them
+    when they are up to date and fall back to batch by batch generation otherwise. When headless, tables are built when
+    first read instead.
+    """
     _instance = None
 
     @staticmethod
@@ -29,37 +53,184 @@ class NoteData:
         return NoteData._instance
 
     def __init__(self):
+        """
+            tables      : dict,
+                        track id -> (fingerprint, version, notes), notes being sorted by tfactor. A table is up to date
+                        if built or checked at the current version, its fingerprint tells whether a rebuild can reuse it
+            version     : int,
+                        incremented by invalidate, a build started with an older version is abandoned
+            buildLock   : Lock,
+                        held while tables are built, so that a build requested meanwhile reuses them
+        """
         if NoteData._instance is None:
-            self.df = None
             self.data: data_model.Data = None
-            self.tracks = None
-            self.tracks_note = None
+            self.music = None
+            self.tables = {}
+            self.version = 0
+            self.timer = None
+            self.lock = threading.Lock()
+            self.buildLock = threading.Lock()
             NoteData._instance = self
 
-    def setup(self, tracks: [track.Track]):
+    def setup(self):
         self.data = data_model.Data.getInstance()
-        self.tracks = tracks
-        self.tracks_note = []
+        self.music = music_model.Music.getInstance()
+
+    def fingerprint(self, track: track.Track) -> str:
+        """
+        Summary of everything the notes of a track depend on: its filters, encodings and offset, time settings and data.
+        """
+        settings = self.music.settings
+        state = [track.id, track.offset, track.filter.column, track.filter.mode, track.filter.filter,
+                 settings.type, settings.tempoNValue, settings.tempoDurValue, settings.tempoOffsetValue,
+                 settings.musicDuration, settings.minVal, settings.maxVal, settings.idMax,
+                 self.data.generation, self.data.data_index]
+        for pe in track.pencodings.values():
+            state += [pe.encoded_var, pe.filter.column, pe.filter.mode, pe.filter.filter, pe.handpicked,
+                      pe.handpickEncoding, pe.functionEncoding, pe.defaultValue, pe.octave]
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+    def invalidate(self, delay: float = NOTE_DATA_DELAY) -> None:
+        """
+        Mark the tables as out of date, to be called whenever something the notes depend on changes (see fingerprint),
+        and schedule a rebuild. Successive calls within delay seconds only trigger one rebuild. Nothing is scheduled when
+        headless, tables are then built by get_table.
+        """
+        music = music_model.Music._instance
+        with self.lock:
+            self.version += 1
+            if self.timer is not None:
+                self.timer.cancel()
+            if music is None or music.headless:
+                return
+            self.timer = threading.Timer(delay, self.rebuild, args=[self.version])
+            self.timer.daemon = True
+            self.timer.name = "Note_data_thread"
+            self.timer.start()
+
+    def rebuild(self, version: int) -> None:
+        """
+        Threaded.
+        Build the table of every track whose fingerprint changed.
+        """
+        try:
+            self.generate(version)
+        except Exception as e:
+            logging.log(logging.ERROR, "Error while precomputing notes: {}".format(e))
+
+    def generate(self, version: int = None) -> dict:
+        """Pre compute all notes into tables
+        :param version: int,
+            if given, the build is abandoned as soon as invalidate is called again
+        :return: dict, track id -> notes of the track, only for completed tables
+        """
+        self.setup()
+        if self.data.current_dataset is None or self.music.settings.idMax is None:
+            return {}
+        tracks = list(self.music.tracks.values())
+        with self.buildLock:
+            current = self.version  # read before the fingerprints, so that a later change leaves tables out of date
+            for key in list(self.tables):
+                if key not in self.music.tracks:
+                    del self.tables[key]
+            for t in tracks:
+                fingerprint = self.fingerprint(t)
+                table = self.tables.get(str(t.id))
+                if table is not None and table[0] == fingerprint:
+                    self.tables[str(t.id)] = (fingerprint, current, table[2])
+                    continue
+                notes = self.build_table(t, version)
+                if notes is None:
+                    return {}
+                self.tables[str(t.id)] = (fingerprint, current, notes)
+        self.set_status_text("Notes precomputed for {} tracks".format(len(tracks)))
+        return {key: table[2] for key, table in self.tables.items()}
+
+    def build_table(self, track: track.Track, version: int = None) -> np.ndarray:
+        """
+        Generate the notes of a track for the whole dataset, chunk by chunk.
+        :return: numpy array of NOTE_DTYPE sorted by tfactor, None if the build was abandoned
+        """
+        tables = []
+        size = max(1, self.data.get_size() - 1)
+        done = 0
+        last_report = time.perf_counter()
+        for chunk in self.get_chunks():
+            if version is not None and version != self.version:
+                return None
+            tables.append(track.generate_note_array(chunk))
+            done += chunk.shape[0]
+            if time.perf_counter() - last_report > 0.5:
+                last_report = time.perf_counter()
+                self.set_status_text("Precomputing notes of {}: {}%".format(track.name, int(100 * done / size)))
+        notes = np.concatenate(tables) if len(tables) > 0 else np.empty(0, dtype=NOTE_DTYPE)
+        return notes[np.argsort(notes['tfactor'], kind='stable')]
+
+    def get_chunks(self):
+        """
+        Generator over the current dataset, by chunks of NOTE_DATA_CHUNK rows.
+        """
+        stream = self.data.get_stream()
+        if stream is not None:
+            for chunk in stream.read_chunks():
+                yield chunk
+            return
+        dataset = self.data.current_dataset
+        for start in range(0, dataset.shape[0], NOTE_DATA_CHUNK):
+            yield dataset.iloc[start:start + NOTE_DATA_CHUNK]
 
-    def create_note(self, row):
-        return TNote(tfactor=0, channel=0, value=0, velocity=100, duration=100, void=False, id=-1)
+    def get_table(self, track: track.Track) -> np.ndarray:
+        """
+        :return: the notes of a track, None if its table is missing or out of date. In that case a rebuild is scheduled,
+            or done right away when headless.
+        """
+        if self.music is None:
+            self.setup()
+        table = self.tables.get(str(track.id))
+        if table is not None and table[1] == self.version:
+            return table[2]
+        if self.music.headless:
+            self.generate()
+            table = self.tables.get(str(track.id))
+            return table[2] if table is not None and table[1] == self.version else None
+        if self.timer is None or not self.timer.is_alive():
+            self.invalidate()
+        return None
 
-    def generate(self):
-        """Pre compute all notes into a dataframe"""
-        raise NotImplementedError()
-        notes = self.data.current_dataset.apply(lambda x: self.create_note(x), axis=1)
-        for track in self.tracks:
-            notes = self.data.current_dataset.apply(lambda x: self.create_note(x), axis=1)
-            self.tracks_note.append(notes)
+    def get_notes(self, track: track.Track, first_id: int, last_id: int) -> np.ndarray:
+        """
+        :return: notes of a track generated from rows first_id to last_id (internal_id, included), None if the table
+            of the track is not up to date
+        """
+        notes = self.get_table(track)
+        if notes is None:
+            return None
+        ids = notes['id']  # increasing, as tfactor does not decrease along the dataset
+        return notes[np.searchsorted(ids, first_id, side='left'):np.searchsorted(ids, last_id, side='right')]
 
-    def update(self, track_id: int, parmeter_encoding: ParameterEncoding):
-        pass
+    def get_window(self, start: float, end: float) -> np.ndarray:
+        """
+        :return: notes of every track whose tfactor is in [start, end[, sorted by tfactor. Tracks without an up to date
+            table are ignored.
+        """
+        windows = []
+        for t in list(self.music.tracks.values()):
+            notes = self.get_table(t)
+            if notes is not None:
+                windows.append(notes[self.find_index_from_time(start, t):self.find_index_from_time(end, t)])
+        notes = np.concatenate(windows) if len(windows) > 0 else np.empty(0, dtype=NOTE_DTYPE)
+        return notes[np.argsort(notes['tfactor'], kind='stable')]
 
-    def reset(self):
-        pass
+    def find_index_from_time(self, tfactor: float, track: track.Track) -> int:
+        """
+        :return: index of the first note of a track whose tfactor is greater or equal to tfactor
+        """
+        notes = self.get_table(track)
+        return 0 if notes is None else int(np.searchsorted(notes['tfactor'], tfactor, side='left'))
 
-    def find_index_from_time(self, tfactor: float) -> int:
-        return self.df.indexof(tfactor)
+    def set_status_text(self, text: str) -> None:
+        if self.music.sonification_view is not None:
+            self.music.sonification_view.set_status_text(text)
 
 
 def is_valid_note(note):
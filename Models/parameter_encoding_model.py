@@ -2,6 +2,7 @@ import logging
 import random
 
 import numpy as np
+import pandas as pd
 from pandas import DataFrame
 
 import Models.data_model as data_model
@@ -39,6 +40,7 @@ class ParameterEncoding:
             self.maxValue = 100
         self.octave = "4" if self.encoded_var == "value" else "0"
         self.initialized = False
+        self.lookupTable = None  # (key, table) compiled from handpickEncoding, see get_lookup_table
 
         # Others Models
         self.data = data_model.Data.getInstance()
@@ -53,12 +55,14 @@ class ParameterEncoding:
         state = self.__dict__.copy()
         del state["ctrl"]
         del state["data"]
+        state["lookupTable"] = None
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
         self.ctrl = ParameterEncodingCtrl(self)
         self.peView = None
+        self.lookupTable = None
         self.data = data_model.Data.getInstance()
 
     def get_parameter(self, row: DataFrame) -> int:
@@ -83,6 +87,49 @@ class ParameterEncoding:
             logging.log(logging.ERROR, "Error while getting a value with {}".format(self.encoded_var))
             return self.defaultValue
 
+    def get_parameters(self, batch: DataFrame) -> np.ndarray:
+        """
+        Vectorized get_parameter, for a whole batch. Handpicked values are taken from the lookup table with the codes of
+        the rows, or looked up once per distinct value of the batch if the column can not be coded.
+        :param batch: Pandas Dataframe,
+            rows containing data to transform into parameters
+        :return: numpy array,
+            int values between 0 and 128 used as parameters for notes
+        """
+        if self.filter.column not in batch.columns:
+            logging.log(logging.ERROR, "Error while getting a value with {}".format(self.encoded_var))
+            return np.full(batch.shape[0], self.defaultValue, dtype=np.int64)
+        column = batch[self.filter.column]
+        if self.handpicked:
+            table = self.get_lookup_table()
+            if table is not None and 'internal_id' in batch.columns:
+                codes = self.data.get_column_codes(self.filter.column)[0]
+                return np.take(table, codes[batch['internal_id'].to_numpy() - 1])
+            codes, uniques = pd.factorize(column, use_na_sentinel=False)
+            lookup = np.array([self.get_parameter_from_variable(str(u)) for u in uniques], dtype=np.int64)
+            return lookup[codes] if len(lookup) > 0 else np.empty(0, dtype=np.int64)
+        return self.evaluate_with_fonctions(column.to_numpy())
+
+    def get_lookup_table(self) -> np.ndarray:
+        """
+        Compile handpickEncoding into a table giving the parameter of each category of the column (see
+        Data.get_column_codes). The table is compiled again only when the mapping, the column or the data change.
+        :return: numpy array, None if the column can not be coded
+        """
+        key = (self.data.generation, self.data.data_index, self.filter.column)
+        lookup_table = self.lookupTable
+        if lookup_table is not None and lookup_table[0] == key:
+            return lookup_table[1]
+        coded = self.data.get_column_codes(self.filter.column)
+        table = None
+        if coded is not None:
+            table = np.array([self.get_parameter_from_variable(str(c)) for c in coded[1]], dtype=np.int64)
+        self.lookupTable = (key, table)
+        return table
+
+    def invalidate_lookup_table(self) -> None:
+        self.lookupTable = None
+
     def get_parameter_from_variable(self, variable: str) -> int:
         if (variable not in self.handpickEncoding):
             return self.defaultValue
@@ -97,6 +144,18 @@ class ParameterEncoding:
             raise NotImplementedError()
         return return_value if self.encoded_var != "value" else return_value + 12 * int(self.octave)
 
+    def evaluate_with_fonctions(self, values: np.ndarray) -> np.ndarray:
+        """
+        Vectorized evaluate_with_fonction, null values are given the default value.
+        """
+        if (self.functionEncoding["function"] == "linear"):
+            ratio = float((self.data.get_min(self.filter.column)) / self.data.get_max(self.filter.column))
+            values = np.asarray(values, dtype=np.float64) * ratio
+            return_values = np.where(np.isnan(values), self.defaultValue, np.trunc(values)).astype(np.int64)
+        else:
+            raise NotImplementedError()
+        return return_values if self.encoded_var != "value" else return_values + 12 * int(self.octave)
+
     def assign_function_encoding(self, function: str, min_val: int, max_val: int) -> None:
         """
         Assign a function with parameter as encoding, according to user preference
@@ -123,6 +182,7 @@ class ParameterEncoding:
             self.handpickEncoding[var] = note.note_to_int(val, int(octave)) if self.encoded_var == "value" else val
         self.defaultValue = note.note_to_int(values[0], int(octave)) if self.encoded_var == "value" else values[0]
         self.octave = octave
+        self.invalidate_lookup_table()
 
     def get_variables_instances(self) -> [str]:
         return self.data.get_variables_instances(self.filter.column)
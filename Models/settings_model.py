@@ -1,16 +1,49 @@
 from __future__ import annotations
 
 import os.path
+from collections import namedtuple
 
 import numpy
 
 # TODO add other time settings
 import Models.data_model as data_model
 import Models.music_model as music
+import Models.note_model as note_model
 from Ctrls.settings_controller import SettingsCtrl
 from Utils.constants import TIME_SETTINGS_OPTIONS, BATCH_SIZE, TIME_BUFFER, BATCH_NBR_PLANNED, SAMPLE_SIZE
 
 
+class TimingPlan(namedtuple("TimingPlan", ["type", "key", "bpm", "music_duration", "min_val", "distance", "id_max",
+                                           "tempo_n", "tempo_offset", "offset_unit", "cluster_duration"])):
+    """
+    Immutable snapshot of everything needed to compute temporal positions, built by GeneralSettings.get_timing_plan when
+    settings or data change.
+        key             : tuple, settings and data size the plan was built from
+        offset_unit     : tfactor of an offset of 1% of a beat
+        cluster_duration: tfactor of the silence added after each cluster of tempo_n notes, in tempo-N mode
+    """
+    __slots__ = ()
+
+    def tfactors(self, timestamps: numpy.ndarray, ids: numpy.ndarray, offset=0) -> numpy.ndarray:
+        """
+        Temporal positions of a batch of data points, see GeneralSettings.get_temporal_position.
+        :param timestamps: numpy array, internal_timestamp of the data points
+        :param ids: numpy array, internal_id of the data points
+        :param offset: between 0-100, in %, change the temporal position relative to bpm
+        :return: numpy array of temporal positions between 0 and 1.
+        """
+        offset = float(offset) * self.offset_unit
+        if self.type == TIME_SETTINGS_OPTIONS[2]:
+            return offset + (timestamps - self.min_val) / self.distance
+        elif self.type == TIME_SETTINGS_OPTIONS[1]:
+            return (numpy.trunc((ids + (self.tempo_n - 1 + self.tempo_offset)) / self.tempo_n) * self.cluster_duration
+                    + offset + ids / self.id_max)
+        elif self.type == TIME_SETTINGS_OPTIONS[0]:
+            return offset + ids / self.id_max
+        else:
+            raise NotImplementedError()
+
+
 class GeneralSettings:
     """
     Model class for time settings. It informs track/music models about the way to compute temporal distance between 2 notes based on their
@@ -39,9 +72,12 @@ class GeneralSettings:
         self.autoloadDataPath = ""
         self.autoloadTimestampcol = ""
         self.debugVerbose = False
+        self.streaming = False  # if True, csv files are streamed from disk by chunks instead of loaded in memory
+        self.adaptive = False  # if True, batchSize, batchPlanned and timeBuffer follow data density during playback
         self.type = self.possible_types[0]
         self.graphicalBarPercentage = 0.2
         self.graphicalLength = 10000
+        self.timingPlan = None  # TimingPlan, cached until its key changes
 
         # Ctrl
         self.ctrl = SettingsCtrl(self)
@@ -61,6 +97,10 @@ class GeneralSettings:
                         self.autoloadTimestampcol = eval(value)
                     elif (identifier == "debugverbose"):
                         self.debugVerbose = eval(value)
+                    elif (identifier == "streaming"):
+                        self.streaming = eval(value)
+                    elif (identifier == "adaptive"):
+                        self.adaptive = eval(value)
                     elif (identifier == "graphicalLength"):
                         self.graphicalLength = eval(value)
                     elif (identifier == "graphicalBarPercentage"):
@@ -82,9 +122,13 @@ class GeneralSettings:
         del state["music"]
         del state["ctrl"]
         del state["tsView"]
+        state["timingPlan"] = None
         return state
 
     def __setstate__(self, state):
+        state.setdefault("streaming", False)  # projects saved before streaming was added
+        state.setdefault("adaptive", False)
+        state["timingPlan"] = None
         self.__dict__.update(state)
         self.ctrl = SettingsCtrl(self)
         self.tsView = None
@@ -92,25 +136,46 @@ class GeneralSettings:
         self.possible_types = TIME_SETTINGS_OPTIONS
         self.type = self.possible_types[0]
 
-    def get_music_duration(self) -> int:
-        md = int(float(self.data.get_size()) / 1.5) if self.musicDuration is None else self.musicDuration
+    def get_timing_plan(self) -> TimingPlan:
+        """
+        :return: the TimingPlan of the current settings and data, built again only if one of them changed
+        """
+        size = self.data.get_size()
+        key = (self.type, self.musicDuration, self.tempoNValue, self.tempoDurValue, self.tempoOffsetValue, self.minVal,
+               self.maxVal, self.idMax, size)
+        plan = self.timingPlan
+        if plan is not None and plan.key == key:
+            return plan
+        md = int(float(size) / 1.5) if self.musicDuration is None else self.musicDuration
         if (self.type == self.possible_types[1]):
-            bpm = int(round(60 * float(self.data.get_size()) / md))
+            bpm = int(round(60 * float(size) / md))
             aoffset = float(self.tempoDurValue) / (100 * bpm / 60)  # [0-100] to s
             aoffset = numpy.trunc(
-                (self.data.get_size() + (self.tempoNValue - 1 + self.tempoOffsetValue)) / self.tempoNValue) * float(
-                aoffset)
+                (size + (self.tempoNValue - 1 + self.tempoOffsetValue)) / self.tempoNValue) * float(aoffset)
             md += aoffset
-        return md
+        bpm = int(round(60 * float(size) / md))
+        plan = TimingPlan(type=self.type, key=key, bpm=bpm, music_duration=md, min_val=self.minVal,
+                          distance=None if self.minVal is None else float(self.maxVal - self.minVal),
+                          id_max=None if self.idMax is None else float(self.idMax),
+                          tempo_n=self.tempoNValue, tempo_offset=self.tempoOffsetValue,
+                          offset_unit=1 / (100 * bpm / 60) / float(md),  # [0-100] to s to tfactor
+                          cluster_duration=float(self.tempoDurValue) / (100 * bpm / 60) / float(md))
+        self.timingPlan = plan
+        return plan
+
+    def get_music_duration(self) -> int:
+        return self.get_timing_plan().music_duration
 
     def reset_music_duration(self) -> None:
         self.musicDuration = int(float(self.data.get_size()) / 1.5)
+        note_model.NoteData.getInstance().invalidate()
 
     def get_bpm(self) -> float:  # bpm = size/length
-        return int(round(60 * float(self.data.get_size()) / self.get_music_duration()))
+        return self.get_timing_plan().bpm
 
     def set_bpm(self, bpm):  # length = size/bpm
         self.musicDuration = int(round(60 * float(self.data.get_size()) / float(bpm)))
+        note_model.NoteData.getInstance().invalidate()
 
     def set_type(self, type: str) -> None:
         if (type not in self.possible_types):
@@ -127,11 +192,14 @@ class GeneralSettings:
         """
         if (maxVal <= minVal):
             raise ValueError("Max val {} must be > at min val {}".format(maxVal, minVal))
+        changed = (self.minVal, self.maxVal, self.idMax) != (minVal, maxVal, idMax) or not self.musicDuration
         self.minVal = minVal
         self.maxVal = maxVal
         self.idMax = idMax
         if not self.musicDuration:
             self.musicDuration = int(float(idMax) / 1.5)
+        if changed:  # called before every playback and export, most of the time with the same values
+            note_model.NoteData.getInstance().invalidate()
 
     def get_temporal_position(self, current, offset=0) -> float:
         """
@@ -141,31 +209,15 @@ class GeneralSettings:
         :param offset: between 0-100, in %, change the temporal position relative to bpm
         :return: a temporal position between 0 and 1.
         """
-        return_value = None
         if self.maxVal < current["internal_timestamp"] < self.minVal:
             raise ValueError(
                 "current{} must be in range [min; max] : [{};{}]".format(current.internal_timestamp, self.minVal,
                                                                          self.maxVal))
-        distance = self.maxVal - self.minVal
-
-        offset = float(offset) / (100 * self.get_bpm() / 60)  # [0-100] to s
-        offset = float(offset) / float(self.get_music_duration())  # s to tfactor
+        return float(self.get_temporal_positions(numpy.array([current["internal_timestamp"]], dtype=float),
+                                                 numpy.array([current["internal_id"]], dtype=float), offset)[0])
 
-        if self.type == self.possible_types[2]:
-            return_value = offset + (current["internal_timestamp"] - self.minVal) / float(
-                distance)  # (ratio - min) * current
-        elif self.type == self.possible_types[1]:
-            aoffset = float(self.tempoDurValue) / (100 * self.get_bpm() / 60)  # [0-100] to s
-            aoffset = numpy.trunc(
-                (current["internal_id"] + (self.tempoNValue - 1 + self.tempoOffsetValue)) / self.tempoNValue) * float(
-                aoffset) / float(self.get_music_duration())  # s to tfactor
-            return_value = aoffset + offset + float(current["internal_id"]) / float(self.idMax)
-        elif self.type == self.possible_types[0]:
-            return_value = offset + float(current["internal_id"]) / float(self.idMax)
-        else:
-            raise NotImplementedError()
-        # if (return_value < 0 or return_value > 1):
-        #     raise ValueError("absolute temporal position computation ended up with a non valid value ({}). "
-        #                      "the current timestamp {} is between the maximun {} and the minimum {}"
-        #                      .format(return_value, current.internal_timestamp, self.maxVal, self.minVal))
-        return return_value
+    def get_temporal_positions(self, timestamps: numpy.ndarray, ids: numpy.ndarray, offset=0) -> numpy.ndarray:
+        """
+        Vectorized get_temporal_position, for a whole batch of data points, see TimingPlan.tfactors.
+        """
+        return self.get_timing_plan().tfactors(timestamps, ids, offset)
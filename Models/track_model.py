@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import pickle
 
-import pandas as pd
+import numpy as np
 from pandas import DataFrame
 
 import Models.data_model as data_model
@@ -78,42 +78,41 @@ class Track:
             self.__dict__.update(var.__dict__)
             self.id = oldid
             self.ctrl.model = self
+            note.NoteData.getInstance().invalidate()
             self.music.sonification_view.set_status_text("Track imported to id {}".format(self.id))
 
-    def generate_notes(self, batch: DataFrame) -> [note.TNote]:
+    def generate_note_array(self, batch: DataFrame) -> np.ndarray:
         """
-        Generate notes for the current track, based on main variable, parameter encoding and filters.
+        Generate notes for the current track, based on main variable, parameter encoding and filters. Every field of the
+        notes is computed at once for the whole batch.
         :param batch: pandas Dataframe,
             a subset of the dataset regardless the considered filter
-        :return list of notes
+        :return numpy array of note.NOTE_DTYPE, one note per row of the batch
         """
-        notes = []  # Container for the next batch of data
-        for idx, row in self.filter_batch(batch, False).iterrows():  # iterate over index and row
-            notes.append(self.build_note(row))
+        notes = np.empty(batch.shape[0], dtype=note.NOTE_DTYPE)
+        if batch.shape[0] == 0:
+            return notes
+        ids = batch['internal_id'].to_numpy()
+        notes['tfactor'] = self.music.settings.get_temporal_positions(
+            batch['internal_timestamp'].to_numpy(dtype=np.float64), ids.astype(np.float64), self.offset)
+        notes['channel'] = self.id
+        notes['value'] = self.pencodings["value"].get_parameters(batch)
+        notes['velocity'] = (self.pencodings["velocity"].get_parameters(batch) * 1.27).astype(np.int64)
+        notes['duration'] = self.pencodings["duration"].get_parameters(batch)
+        notes['void'] = ~self.filter_mask(batch)
+        notes['id'] = ids
         return notes
 
-    def build_note(self, row):
-        return note.TNote(tfactor=self.music.settings.get_temporal_position(row, self.offset),
-                          channel=self.id,
-                          value=self.pencodings["value"].get_parameter(row),
-                          velocity=int(self.pencodings["velocity"].get_parameter(row) * 1.27),
-                          duration=int(self.pencodings["duration"].get_parameter(row)),
-                          void=not row['internal_filter'],
-                          id=row['internal_id'])
-
-    def build_note2(self, row):
-        return pd.Series({'tfactor': self.music.settings.get_temporal_position(row, self.offset),
-                          'channel': self.id,
-                          'value': self.pencodings["value"].get_parameter(row),
-                          'velocity': self.pencodings["velocity"].get_parameter(row),
-                          'duration': self.pencodings["duration"].get_parameter(row),
-                          'void': not row['internal_filter'],
-                          'id': row['internal_id']})
-
-    def filter_batch(self, batch: DataFrame, discard_filtered: bool) -> DataFrame:
+    def filter_mask(self, batch: DataFrame) -> np.ndarray:
+        """
+        Combine the track filter and the filters of all encodings into a single mask, without copying the batch.
+        :return: numpy array, True for rows that should be converted as notes
+        """
+        mask = batch['internal_filter'].to_numpy(dtype=bool, copy=True)
         for encoding in self.pencodings.values():
-            batch = encoding.filter.eval_batch(batch, discard_filtered)
-        return self.filter.eval_batch(batch, discard_filtered)
+            mask &= encoding.filter.mask(batch)
+        mask &= self.filter.mask(batch)
+        return mask
 
     def set_main_var(self, variable: str) -> None:
         self.filter.assign_column(variable)
@@ -0,0 +1,97 @@
+import logging
+import threading
+from collections import namedtuple
+
+import pandas as pd
+from dateutil.parser import parse
+from pandas import DataFrame
+
+from Utils.constants import PROFILE_TOP_K
+
+# instances are the distinct values of the column in order of appearance, nulls included, top the PROFILE_TOP_K most
+# frequent values with their number of occurrences
+ColumnProfile = namedtuple("ColumnProfile", ["dtype", "cardinality", "null_ratio", "top", "instances", "timestamp_like"])
+
+
+def is_date(string: str, fuzzy=False) -> bool:
+    """
+    Return whether the string can be interpreted as a date.
+    :param string: str, string to check for date
+    :param fuzzy: bool, ignore unknown tokens in string if True
+    """
+    try:
+        parse(string, fuzzy=fuzzy)
+        return True
+    except ValueError:
+        return False
+    except TypeError:
+        return False
+    except OverflowError:
+        return False
+
+
+class ColumnProfiler:
+    """
+    Profile every column of a dataset in a single pass, so that questions such as "which columns look like timestamps"
+    or "what are the instances of this variable" do not need to scan the dataset again. Columns can be profiled in a
+    background thread, a column requested before the thread reached it is profiled on demand.
+    """
+
+    def __init__(self, dataset: DataFrame, top_k: int = PROFILE_TOP_K):
+        """
+            dataset     : DataFrame,
+                        the dataset to profile
+            top_k       : int,
+                        number of most frequent values kept for each column
+        """
+        self.dataset = dataset
+        self.top_k = top_k
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def profile(self, column: str) -> ColumnProfile:
+        values = self.dataset[column]
+        counts = values.value_counts(dropna=True)
+        first_valid = values.first_valid_index()
+        return ColumnProfile(dtype=values.dtype,
+                             cardinality=values.nunique(dropna=False),
+                             null_ratio=float(values.isna().mean()) if len(values) > 0 else 0.0,
+                             top=list(counts.head(self.top_k).items()),
+                             instances=pd.unique(values),
+                             timestamp_like=first_valid is not None and is_date(values.loc[first_valid]))
+
+    def get(self, column: str) -> ColumnProfile:
+        """
+        :return: the profile of a column, computed if it is not already known
+        """
+        profile = self.profiles.get(column)
+        if profile is None:
+            with self.lock:
+                profile = self.profiles.get(column)
+                if profile is None:
+                    profile = self.profile(column)
+                    self.profiles[column] = profile
+        return profile
+
+    def run(self) -> dict:
+        """
+        Profile every column.
+        :return: dict, column -> ColumnProfile
+        """
+        for column in self.dataset.columns:
+            if self.stopEvent.is_set():
+                break
+            self.get(column)
+        return self.profiles
+
+    def start(self) -> None:
+        """
+        Profile every column in a background thread.
+        """
+        self.thread = threading.Thread(target=self.run, daemon=True, name="Column_profiler_thread")
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
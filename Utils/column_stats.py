@@ -0,0 +1,29 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+# min, max, mean and quantiles are None/empty if the column is not numeric, cardinality includes nulls and counts is
+# the number of occurrences of each value, most frequent first
+ColumnStats = namedtuple("ColumnStats", ["numeric", "min", "max", "mean", "quantiles", "cardinality", "counts"])
+
+
+def compute_stats(column: pd.Series) -> ColumnStats:
+    """
+    Compute the statistics of a column with vectorized operations.
+    :param column: pandas Series,
+        the column
+    :return: ColumnStats
+    """
+    counts = column.value_counts(dropna=False)
+    try:
+        values = np.asarray(column.to_numpy(), dtype=np.float64)
+    except (ValueError, TypeError):
+        values = None
+    if values is None or len(values) == 0 or np.isnan(values).all():
+        return ColumnStats(False, None, None, None, {}, len(counts), counts)
+    quantiles = np.nanquantile(values, QUANTILES)
+    return ColumnStats(True, float(np.nanmin(values)), float(np.nanmax(values)), float(np.nanmean(values)),
+                       dict(zip(QUANTILES, quantiles.tolist())), len(counts), counts)
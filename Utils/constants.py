@@ -4,6 +4,40 @@ BATCH_SIZE = 10
 BATCH_NBR_PLANNED = 20
 MAX_NOTE_GRAPH = 100
 SAMPLE_SIZE = 10
+TIMESTAMP_SAMPLE_SIZE = 100  # rows used to detect the format of a timestamp column
+CHUNK_SIZE = 100000  # rows read at once when streaming a data file
+READ_AHEAD = 4  # chunks read in advance when streaming a data file
+CACHE_DIRECTORY = ".soda_cache"  # created next to the data files
+CACHE_MAX_SIZE = 2 * 1024 ** 3  # bytes, per cache directory
+CACHE_VERSION = 2  # bump to invalidate existing cache entries
+CACHE_STALE_AGE = 3600  # s, entries being written (.tmp) left untouched this long are from interrupted writes
+PROFILE_TOP_K = 10  # most frequent values kept by the column profiler
+NOTE_DATA_CHUNK = 100000  # rows turned into notes at once when precomputing the song
+NOTE_DATA_DELAY = 0.5  # s, precomputed notes are rebuilt once encodings stopped changing for this long
+SCHEDULER_RETRY = 10  # ms, delay before the scheduler looks for notes again when the queue is empty
+SEEK_STEP = 10  # s, move of the fast forward and fast backward buttons
+PROGRESS_BAR_RANGE = 1000  # positions of the music progress bar
+PROGRESS_PERIOD = 200  # ms between two updates of the music progress bar
+ADAPTIVE_PERIOD = 1.0  # s, minimum delay between two adaptations of the look-ahead
+ADAPTIVE_SMOOTHING = 0.3  # weight of the last batch in the measured production and music rates
+LOOKAHEAD_TARGET = 2.0  # s of music queued in adaptive mode, more if production is slow
+BATCH_TARGET = 0.25  # s of music per batch in adaptive mode
+BATCH_SIZE_BOUNDS = (1, 10000)  # rows, bounds of the batch size in adaptive mode
+BATCH_PLANNED_BOUNDS = (2, 500)  # bounds of the number of batches planned in adaptive mode
+TIME_BUFFER_BOUNDS = (200, 5000)  # ms, bounds of the scheduler window in adaptive mode
+PLAYBACK_STATS_WINDOW = 10000  # notes per track kept for playback timing statistics
+LATENESS_BINS = [float("-inf"), -1000, -500, -200, -100, -50, -20, 0, 20, 50, 100, 200, 500, 1000,
+                 float("inf")]  # ms, bins of the lateness histograms of playback statistics
+RENDER_BLOCK = 8192  # frames written at once to the wav file when exporting music
+RENDER_TAIL = 2000  # ms rendered after the last note when exporting music, for release and reverb
+RENDER_PROGRESS_PERIOD = 0.5  # s between two progress reports when exporting music
+STEM_CHUNK = 44100  # frames rendered at once by a stem worker between two progress and cancel checks
+STEM_QUEUE = 16  # chunks of events waiting for a stem worker before the export waits for it
+MIX_BLOCK = 65536  # frames of every stem mixed at once
+STEM_MIN_TRACKS = 4  # tracks from which music is exported by a process per core, below it processes cost more
+MIDI_TICKS_PER_QUARTER = 960  # time resolution of exported midi files
+MIDI_BUFFER = 65536  # bytes of events buffered per track before they are spooled to disk when exporting midi
+MIDI_CHUNK = 100000  # notes of a track encoded at once when exporting midi
 
 # OPTIONS
 TIME_SETTINGS_OPTIONS = ["tempo-basic", "tempo-N", "linear"]
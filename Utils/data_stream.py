@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+
+import pandas as pd
+from pandas import DataFrame
+
+from Utils.constants import CHUNK_SIZE, READ_AHEAD
+
+
+class DataStream:
+    """
+    Chunked reader for csv files too large to be loaded in memory. Chunks are read by a background thread into a
+    bounded queue (the read-ahead) and sliced into batches on demand, so that only a few chunks are in memory at once.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, read_ahead: int = READ_AHEAD):
+        """
+            path        : str,
+                        the csv file
+            chunk_size  : int,
+                        number of rows read from disk at once
+            read_ahead  : int,
+                        number of chunks the reader thread can read in advance
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead
+        self.sep = self.detect_separator()
+        self.size = self.count_rows()  # estimation, exact once the file has been scanned
+        self.transform = None  # function(chunk, first_row) -> chunk, applied to every chunk read
+
+        self.position = 0  # index of the next row returned by get_next
+        self.pending = None  # batch returned by a peek, given again by the next iteration
+        self.chunk = None  # chunk currently sliced into batches
+        self.chunk_position = 0
+        self.exhausted = False
+        self.chunks = None  # queue filled by the reader thread
+        self.stopEvent = threading.Event()
+        self.reader_thread = None
+
+    def detect_separator(self) -> str:
+        try:
+            pd.read_csv(self.path, sep=";", nrows=self.chunk_size)
+            return ";"
+        except:
+            return ","
+
+    def count_rows(self) -> int:
+        """
+        Count the lines of the file without parsing it.
+        """
+        lines = 0
+        last = b"\n"
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 24), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if last != b"\n":
+            lines += 1
+        return max(0, lines - 1)  # header
+
+    def head(self, n: int) -> DataFrame:
+        """
+        Read the first n rows of the file, with the transform applied.
+        """
+        chunk = pd.read_csv(self.path, sep=self.sep, nrows=n)
+        return chunk if self.transform is None else self.transform(chunk, 0)
+
+    def read_chunks(self, start: int = 0, columns: [str] = None):
+        """
+        Generator over the chunks of the file, beginning at row start.
+        :param start: int,
+            index of the first row to read
+        :param columns: list,
+            columns to read, all by default. The transform is only applied when all columns are read.
+        """
+        first_row = 0
+        for chunk in pd.read_csv(self.path, sep=self.sep, chunksize=self.chunk_size, usecols=columns):
+            if first_row + len(chunk) <= start:
+                first_row += len(chunk)
+                continue
+            if first_row < start:
+                chunk = chunk.iloc[start - first_row:]
+                first_row = start
+            if self.transform is not None and columns is None:
+                chunk = self.transform(chunk, first_row)
+            first_row += len(chunk)
+            yield chunk
+
+    def start(self, position: int = 0) -> None:
+        """
+        (Re)start the reader thread at a given row.
+        """
+        self.stop()
+        self.position = position
+        self.pending = None
+        self.chunk = None
+        self.chunk_position = 0
+        self.exhausted = False
+        self.chunks = queue.Queue(maxsize=self.read_ahead)
+        self.stopEvent = threading.Event()
+        self.reader_thread = threading.Thread(target=self.read, args=[position, self.chunks, self.stopEvent],
+                                              daemon=True, name="Data_reader_thread")
+        self.reader_thread.start()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+        self.reader_thread = None
+
+    def read(self, position: int, chunks: queue.Queue, stop_event: threading.Event) -> None:
+        """
+        Threaded.
+        Read chunks into the queue, blocking while the read-ahead is full.
+        """
+        try:
+            for chunk in self.read_chunks(position):
+                if not self.put(chunks, chunk, stop_event):
+                    return
+        except Exception as e:
+            logging.log(logging.ERROR, "Error while streaming {}: {}".format(self.path, e))
+        self.put(chunks, None, stop_event)  # end of file
+
+    @staticmethod
+    def put(chunks: queue.Queue, chunk, stop_event: threading.Event) -> bool:
+        while not stop_event.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get_next(self, batch_size: int, iterate: bool = False) -> DataFrame:
+        """
+        Same as Data.get_next, for a streamed file.
+        """
+        if self.pending is None:
+            self.pending = self.read_batch(batch_size)
+        batch = self.pending
+        if iterate:
+            self.pending = None
+            self.position += len(batch)
+        return batch
+
+    def read_batch(self, batch_size: int) -> DataFrame:
+        if self.reader_thread is None:
+            self.start(self.position)
+        pieces = []
+        missing = batch_size
+        while missing > 0 and not self.exhausted:
+            if self.chunk is None or self.chunk_position >= len(self.chunk):
+                self.chunk = self.chunks.get()
+                self.chunk_position = 0
+                if self.chunk is None:
+                    self.exhausted = True
+                    break
+            piece = self.chunk.iloc[self.chunk_position:self.chunk_position + missing]
+            self.chunk_position += len(piece)
+            missing -= len(piece)
+            pieces.append(piece)
+        if len(pieces) == 0:
+            return DataFrame()
+        return pieces[0] if len(pieces) == 1 else pd.concat(pieces)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from Utils.constants import CACHE_DIRECTORY, CACHE_MAX_SIZE, CACHE_VERSION, CACHE_STALE_AGE
+
+
+class DatasetCache:
+    """
+    On-disk columnar cache of parsed datasets, i.e. after timestamps assignment and sort. Each entry is a directory of
+    .npy files (one per column, plus codes and categories for text columns) written in a cache directory next to the
+    data file, so that reopening an unchanged file is a memory-mapped load instead of a full parse.
+    Entries are keyed by the path, size and modification time of the file, and by the timestamp column and formats.
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        """
+            max_size    : int,
+                        size in bytes above which least recently used entries of a cache directory are evicted
+        """
+        self.max_size = max_size
+
+    @staticmethod
+    def get_directory(path: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRECTORY)
+
+    @staticmethod
+    def get_key(path: str, date_column: str, formats: [str]) -> str:
+        stat = os.stat(path)
+        fingerprint = [CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, date_column, formats]
+        return hashlib.sha1(json.dumps(fingerprint).encode()).hexdigest()
+
+    def load(self, path: str, date_column: str, formats: [str]) -> (DataFrame, dict):
+        """
+        Load a dataset from the cache.
+        :return: the dataset and the metadata of the entry (first_date, last_date, ...), or None if the dataset is not
+            in the cache
+        """
+        try:
+            entry = os.path.join(self.get_directory(path), self.get_key(path, date_column, formats))
+            with open(os.path.join(entry, "meta.json"), "r") as f:
+                meta = json.load(f)
+            columns = {}
+            for i, column in enumerate(meta["columns"]):
+                if column["kind"] == "text":
+                    codes = np.load(os.path.join(entry, "{}.codes.npy".format(i)), mmap_mode="r")
+                    categories = np.load(os.path.join(entry, "{}.categories.npy".format(i)))
+                    values = np.append(categories.astype(object), np.nan)[codes]  # code -1 is NaN
+                    columns[column["name"]] = values if column["dtype"] == "object" else pd.array(values,
+                                                                                                  dtype=column["dtype"])
+                else:
+                    columns[column["name"]] = np.load(os.path.join(entry, "{}.npy".format(i)), mmap_mode="r")
+            index = np.load(os.path.join(entry, "index.npy"), mmap_mode="r")
+            dataset = DataFrame(columns, index=pd.Index(index), copy=False)
+            os.utime(os.path.join(entry, "meta.json"))  # mark as recently used
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.log(logging.WARNING, "Could not load {} from cache: {}".format(path, e))
+            return None
+        logging.log(logging.INFO, "Data {} loaded from cache {}".format(path, entry))
+        return dataset, meta
+
+    def store(self, path: str, date_column: str, formats: [str], dataset: DataFrame, first_date: float,
+              last_date: float) -> None:
+        """
+        Write a parsed dataset into the cache, then evict old entries if the cache is too large. Datasets with text
+        columns containing non text values are not cached, as they would not be restored identically.
+        """
+        directory = self.get_directory(path)
+        try:
+            key = self.get_key(path, date_column, formats)
+            for column in dataset.columns:
+                if not self.is_text(dataset[column]) and not isinstance(dataset[column].dtype, np.dtype):
+                    logging.log(logging.INFO, "Data {} not cached, column {} has type {}".format(
+                        path, column, dataset[column].dtype))
+                    return
+                if (self.is_text(dataset[column]) and
+                        pd.api.types.infer_dtype(dataset[column], skipna=True) not in ("string", "empty")):
+                    logging.log(logging.INFO, "Data {} not cached, column {} has mixed types".format(path, column))
+                    return
+            temporary = os.path.join(directory, "{}.tmp".format(key))
+            shutil.rmtree(temporary, ignore_errors=True)
+            os.makedirs(temporary)
+            columns = []
+            for i, column in enumerate(dataset.columns):
+                if self.is_text(dataset[column]):
+                    codes, categories = pd.factorize(dataset[column])
+                    np.save(os.path.join(temporary, "{}.codes.npy".format(i)), codes.astype(np.int32))
+                    np.save(os.path.join(temporary, "{}.categories.npy".format(i)), np.asarray(categories, dtype=str))
+                    columns.append({"name": column, "kind": "text", "dtype": str(dataset[column].dtype)})
+                else:
+                    np.save(os.path.join(temporary, "{}.npy".format(i)), dataset[column].to_numpy())
+                    columns.append({"name": column, "kind": "array"})
+            if not isinstance(dataset.index.dtype, np.dtype) or dataset.index.dtype == object:
+                logging.log(logging.INFO, "Data {} not cached, index has type {}".format(path, dataset.index.dtype))
+                shutil.rmtree(temporary, ignore_errors=True)
+                return
+            np.save(os.path.join(temporary, "index.npy"), dataset.index.to_numpy())
+            with open(os.path.join(temporary, "meta.json"), "w") as f:
+                json.dump({"version": CACHE_VERSION, "path": os.path.abspath(path), "date_column": date_column,
+                           "columns": columns, "rows": dataset.shape[0], "first_date": first_date,
+                           "last_date": last_date, "created": time.time()}, f)
+            entry = os.path.join(directory, key)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(temporary, entry)
+        except (OSError, ValueError, TypeError) as e:
+            logging.log(logging.WARNING, "Could not write {} to cache: {}".format(path, e))
+            return
+        logging.log(logging.INFO, "Data {} written to cache {}".format(path, entry))
+        self.evict(directory)
+
+    @staticmethod
+    def is_text(column: pd.Series) -> bool:
+        return column.dtype == object or pd.api.types.is_string_dtype(column.dtype)
+
+    def evict(self, directory: str) -> None:
+        """
+        Remove least recently used entries of a cache directory until its size is below max_size, and entries left
+        half-written by an interrupted store.
+        """
+        entries = []
+        for key in os.listdir(directory):
+            entry = os.path.join(directory, key)
+            if key.endswith(".tmp"):  # possibly being written by another process, unless untouched for long
+                try:
+                    if time.time() - os.path.getmtime(entry) > CACHE_STALE_AGE:
+                        shutil.rmtree(entry, ignore_errors=True)
+                        logging.log(logging.INFO, "Stale cache entry {} removed".format(entry))
+                except OSError:  # renamed meanwhile by the store writing it
+                    pass
+                continue
+            meta = os.path.join(entry, "meta.json")
+            if os.path.isdir(entry) and os.path.exists(meta):
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((os.path.getmtime(meta), size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logging.log(logging.INFO, "Cache entry {} evicted".format(entry))
+
+    def invalidate(self, path: str) -> int:
+        """
+        Remove every cached version of a data file, whatever its timestamp column or format.
+        :return: the number of entries removed
+        """
+        directory = self.get_directory(path)
+        if not os.path.isdir(directory):
+            return 0
+        removed = 0
+        for key in os.listdir(directory):
+            entry = os.path.join(directory, key)
+            try:
+                with open(os.path.join(entry, "meta.json"), "r") as f:
+                    if json.load(f)["path"] != os.path.abspath(path):
+                        continue
+            except (OSError, ValueError, KeyError):
+                if not key.endswith(".tmp"):
+                    continue
+            shutil.rmtree(entry, ignore_errors=True)
+            removed += 1
+        logging.log(logging.INFO, "{} cache entries removed for {}".format(removed, path))
+        return removed
@@ -1,7 +1,11 @@
-from PyQt5.QtWidgets import QMessageBox
+import logging
 
 
 class ErrorManager:
+    """
+    Warn the user with message boxes. When headless, messages are logged instead and questions take their default
+    answer, PyQt5 is then never imported.
+    """
     _instance = None
 
     @staticmethod
@@ -13,6 +17,7 @@ class ErrorManager:
     def __init__(self):
         if ErrorManager._instance is None:
             ErrorManager._instance = self
+            self.headless = False
             self.warning = {"datetime_replacement":True,
                             "timestamp_notfound":True,
                             "sorted_data":True}
@@ -20,6 +25,10 @@ class ErrorManager:
     def sorted_data_warning(self):
         if(self.warning["sorted_data"]):
             self.warning["sorted_data"] = True
+            if self.headless:
+                logging.log(logging.WARNING, "Data are not sequential, they are sorted by their timestamps")
+                return True
+            from PyQt5.QtWidgets import QMessageBox
             msg = QMessageBox()
             ans = msg.question(None,'Warning: data are not sequential!',
                                 'Soda requires sequential data. The selected timestamp column is either invalid or the data needs to be reformated.\nDo you want Soda to sort your data?',
@@ -29,52 +38,54 @@ class ErrorManager:
     def datetime_replacement_warning(self):
         if(self.warning["datetime_replacement"]):
             self.warning["datetime_replacement"] = False
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Warning)
-            msg.setText("Warning: years before 1971 will be replaced!")
-            msg.setInformativeText('Some or all years found in data will be replaced by 1971. If this is an issue, you need to reformat your data.')
-            msg.setWindowTitle("Warning")
-            msg.exec_()
+            self.show_message("Warning", "Warning", "Warning: years before 1971 will be replaced!",
+                              'Some or all years found in data will be replaced by 1971. If this is an issue, you need to reformat your data.')
 
     def timestamp_warning(self):
         if(self.warning["timestamp_notfound"]):
             self.warning["timestamp_notfound"] = False
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Warning)
-            msg.setText("Warning: no candidate column found that can be used as timestamp!")
-            msg.setInformativeText('Soda requires data to be sequential, but no column has been found that can '
-                                   'be used a timestamp. \nIf your data does contain a column that can be used as '
-                                   'timestamp, you need to inform Soda of the format used and the name of the '
-                                   'column.')
-            msg.setWindowTitle("Warning")
-            msg.exec_()
+            self.show_message("Warning", "Warning", "Warning: no candidate column found that can be used as timestamp!",
+                              'Soda requires data to be sequential, but no column has been found that can '
+                              'be used a timestamp. \nIf your data does contain a column that can be used as '
+                              'timestamp, you need to inform Soda of the format used and the name of the '
+                              'column.')
 
     def loadproject_error(self):
-        msg = QMessageBox()
-        msg.setIcon(QMessageBox.Critical)
-        msg.setText("Error: Problem when loading project!")
-        msg.setInformativeText('An error occured while loading a previous project.\n'
-                               'This is probably due to loadind a project made with another datafile.')
-        msg.setWindowTitle("Error")
-        msg.exec_()
+        self.show_message("Critical", "Error", "Error: Problem when loading project!",
+                          'An error occured while loading a previous project.\n'
+                          'This is probably due to loadind a project made with another datafile.')
     def timeformat_error(self):
-        msg = QMessageBox()
-        msg.setIcon(QMessageBox.Critical)
-        msg.setText("Error: No format found for this timestamp!")
-        msg.setInformativeText('No valid format have been found for this timestamp. You will need to manually '
-                               'set the timestamp format while loading your data. The format should follow '
-                               'python formatting found here: \n'
-                               'https://docs.python.org/3.10/library/datetime.html#strftime-and-strptime-format-codes')
-        msg.setWindowTitle("Error")
-        msg.exec_()
+        self.show_message("Critical", "Error", "Error: No format found for this timestamp!",
+                          'No valid format have been found for this timestamp. You will need to manually '
+                          'set the timestamp format while loading your data. The format should follow '
+                          'python formatting found here: \n'
+                          'https://docs.python.org/3.10/library/datetime.html#strftime-and-strptime-format-codes')
+    def unsorted_stream_error(self):
+        self.show_message("Critical", "Error", "Error: streamed data are not sequential!",
+                          'Data streamed from disk cannot be sorted by Soda. The selected timestamp column is '
+                          'either invalid or the data needs to be sorted beforehand.\nTry another timestamp '
+                          'column, sort your data or disable streaming in the settings.')
+
     def wrong_data_error(self):
+        self.show_message("Critical", "Error", "Error: additional data do not match already loaded data!",
+                          'Loading additional data to compare it with already loaded data requires the new'
+                          ' files header to be the same as the original data \nTry loading another file'
+                          ' as additional, load this file directly as primary data or reformat your data.')
+
+    def show_message(self, icon: str, title: str, text: str, informative: str) -> None:
+        """
+        :param icon: str, name of the QMessageBox icon, Warning or Critical
+        """
+        if self.headless:
+            logging.log(logging.ERROR if icon == "Critical" else logging.WARNING,
+                        "{} {}".format(text, informative.replace("\n", " ")))
+            return
+        from PyQt5.QtWidgets import QMessageBox
         msg = QMessageBox()
-        msg.setIcon(QMessageBox.Critical)
-        msg.setText("Error: additional data do not match already loaded data!")
-        msg.setInformativeText('Loading additional data to compare it with already loaded data requires the new'
-                               ' files header to be the same as the original data \nTry loading another file'
-                               ' as additional, load this file directly as primary data or reformat your data.')
-        msg.setWindowTitle("Error")
+        msg.setIcon(getattr(QMessageBox, icon))
+        msg.setText(text)
+        msg.setInformativeText(informative)
+        msg.setWindowTitle(title)
         msg.exec_()
 
     @staticmethod
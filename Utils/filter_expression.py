@@ -0,0 +1,243 @@
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+TOKEN_REGEX = re.compile(r"""
+    \s*(?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?![\w.])
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op><=|>=|!=|==|=|<|>)
+      | (?P<punctuation>[()\[\]{},;])
+      | (?P<word>[^\s()\[\]{},;<>=!"']+)
+    )""", re.VERBOSE)
+KEYWORDS = {"and", "or", "not", "prefix", "regex"}
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+class ColumnView:
+    """
+    Numeric and text views of a column, computed once per evaluation and shared by every predicate of an expression.
+    """
+
+    def __init__(self, column: pd.Series):
+        self.column = column
+        self._numeric = None
+        self._text = None
+
+    @property
+    def numeric(self) -> np.ndarray:
+        """
+        The column as floats, NaN for values that are not numbers.
+        """
+        if self._numeric is None:
+            if pd.api.types.is_numeric_dtype(self.column.dtype) and not pd.api.types.is_bool_dtype(self.column.dtype):
+                self._numeric = self.column.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                self._numeric = pd.to_numeric(self.column, errors="coerce").to_numpy(dtype=np.float64,
+                                                                                    na_value=np.nan)
+        return self._numeric
+
+    @property
+    def text(self) -> pd.Series:
+        """
+        The column as strings, NA for null values.
+        """
+        if self._text is None:
+            self._text = self.column.astype("string")
+        return self._text
+
+
+def to_mask(result) -> np.ndarray:
+    if isinstance(result, np.ndarray):
+        return result
+    return result.to_numpy(dtype=bool, na_value=False)
+
+
+class FilterExpression:
+    """
+    Predicate over the values of a column, parsed from a user entered filter and compiled once into a vectorized mask
+    function. Syntax, keywords being case insensitive:
+        5, "label", label       equal to a number or a string
+        = 5, != 5, < 5, <= 5, > 5, >= 5
+                                comparisons, against a number or a string
+        [2, 9]                  range, 2 <= value < 9
+        {a, b, 5}               value in the set
+        a;b;5                   value not in the list, as the qualitative filter of the advanced view
+        prefix "abc"            strings starting with abc
+        regex "a.c"             strings containing a match of the regular expression
+        ... and ..., ... or ..., not ..., ( ... )
+    """
+
+    def __init__(self, text: str):
+        """
+            text        : str,
+                        the filter, as entered by the user. Raises FilterSyntaxError if it is not valid.
+        """
+        self.text = text
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.predicate = self.parse_or()
+        if self.peek() is not None:
+            raise FilterSyntaxError("Unexpected {} in filter {}".format(self.peek()[1], text))
+        self.tokens = None
+
+    def mask(self, column: pd.Series) -> np.ndarray:
+        """
+        :param column: pandas Series,
+            values to evaluate, a batch or a whole column
+        :return: numpy array, True for values validated by the expression
+        """
+        return to_mask(self.predicate(ColumnView(column)))
+
+    @staticmethod
+    def tokenize(text: str) -> [(str, str)]:
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN_REGEX.match(text, position)
+            if match is None:
+                raise FilterSyntaxError("Invalid character {} in filter {}".format(text[position:].strip()[:1], text))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "word" and value.lower() in KEYWORDS:
+                kind, value = "keyword", value.lower()
+            elif kind == "string":
+                value = re.sub(r"\\(.)", r"\1", value[1:-1])
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def peek(self) -> (str, str):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def next(self) -> (str, str):
+        token = self.peek()
+        if token is None:
+            raise FilterSyntaxError("Unexpected end of filter {}".format(self.text))
+        self.position += 1
+        return token
+
+    def accept(self, kind: str, value: str = None) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value: str = None) -> (str, str):
+        token = self.next()
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise FilterSyntaxError("Expected {} instead of {} in filter {}".format(value or kind, token[1], self.text))
+        return token
+
+    def parse_or(self):
+        predicates = [self.parse_and()]
+        while self.accept("keyword", "or"):
+            predicates.append(self.parse_and())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda view: np.logical_or.reduce([to_mask(p(view)) for p in predicates])
+
+    def parse_and(self):
+        predicates = [self.parse_not()]
+        while self.accept("keyword", "and"):
+            predicates.append(self.parse_not())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda view: np.logical_and.reduce([to_mask(p(view)) for p in predicates])
+
+    def parse_not(self):
+        if self.accept("keyword", "not"):
+            predicate = self.parse_not()
+            return lambda view: ~to_mask(predicate(view))
+        return self.parse_primary()
+
+    def parse_primary(self):
+        if self.accept("punctuation", "("):
+            predicate = self.parse_or()
+            self.expect("punctuation", ")")
+            return predicate
+        if self.accept("punctuation", "["):
+            low = self.parse_number()
+            self.expect("punctuation", ",")
+            high = self.parse_number()
+            self.expect("punctuation", "]")
+            return lambda view: (view.numeric >= low) & (view.numeric < high)
+        if self.accept("punctuation", "{"):
+            literals = [self.parse_literal()]
+            while self.accept("punctuation", ","):
+                literals.append(self.parse_literal())
+            self.expect("punctuation", "}")
+            return self.in_set(literals)
+        if self.accept("keyword", "prefix"):
+            prefix = self.expect("string")[1]
+            return lambda view: view.text.str.startswith(prefix)
+        if self.accept("keyword", "regex"):
+            try:
+                pattern = re.compile(self.expect("string")[1])
+            except re.error as e:
+                raise FilterSyntaxError("Invalid regular expression in filter {}: {}".format(self.text, e))
+            return lambda view: view.text.str.contains(pattern, regex=True)
+        token = self.peek()
+        if token is not None and token[0] == "op":
+            self.next()
+            return self.compare(token[1], self.parse_literal())
+        literals = [self.parse_literal()]
+        if self.peek() == ("punctuation", ";"):
+            while self.accept("punctuation", ";"):
+                literals.append(self.parse_literal())
+            predicate = self.in_set(literals)
+            return lambda view: ~to_mask(predicate(view))
+        return self.compare("=", literals[0])
+
+    def parse_number(self) -> float:
+        token = self.next()
+        if token[0] != "number":
+            raise FilterSyntaxError("Expected a number instead of {} in filter {}".format(token[1], self.text))
+        return float(token[1])
+
+    def parse_literal(self):
+        """
+        :return: float for numbers, str for strings and bare words
+        """
+        token = self.next()
+        if token[0] == "number":
+            return float(token[1])
+        if token[0] in ("string", "word"):
+            return token[1]
+        raise FilterSyntaxError("Expected a value instead of {} in filter {}".format(token[1], self.text))
+
+    @staticmethod
+    def compare(op: str, literal):
+        """
+        Numbers are compared to the numeric view of the column, strings to its text view.
+        """
+        operators = {"=": operator.eq, "==": operator.eq, "<": operator.lt, "<=": operator.le, ">": operator.gt,
+                     ">=": operator.ge}
+        if op == "!=":  # null values are different from any value
+            predicate = FilterExpression.compare("=", literal)
+            return lambda view: ~to_mask(predicate(view))
+        if isinstance(literal, float):
+            return lambda view: operators[op](view.numeric, literal)
+        return lambda view: operators[op](view.text, literal)
+
+    @staticmethod
+    def in_set(literals: list):
+        numbers = [v for v in literals if isinstance(v, float)]
+        strings = [v for v in literals if isinstance(v, str)]
+
+        def predicate(view: ColumnView) -> np.ndarray:
+            mask = np.zeros(view.column.shape[0], dtype=bool)
+            if len(numbers) > 0:
+                mask |= np.isin(view.numeric, numbers)
+            if len(strings) > 0:
+                mask |= to_mask(view.text.isin(strings))
+            return mask
+
+        return predicate
@@ -1,13 +1,20 @@
+import logging
+import numbers
 from enum import Enum
 
+import numpy as np
+import pandas as pd
 from pandas import DataFrame
 
+from Utils.filter_expression import FilterExpression, FilterSyntaxError
+
 
 class FilterType(Enum):
     NONE = 1,
     SINGLE = 2,
     RANGE = 3,
-    MULTIPLE = 4
+    MULTIPLE = 4,
+    EXPRESSION = 5
 
 
 class FilterModule:
@@ -20,30 +27,73 @@ class FilterModule:
         self.filter = {}
         self.column = None  # column on which to apply the filter
         self.mode = {}
+        self.expressions = {}  # column -> compiled FilterExpression, for filters of type EXPRESSION
 
     def __getstate__(self):
         state = self.__dict__.copy()
+        state["expressions"] = {}  # compiled again from the text of the filter when needed
         return state
 
-    def eval_batch(self, batch:DataFrame, discard_filtered:bool)->None:
+    def __setstate__(self, state):
+        state.setdefault("expressions", {})  # projects saved before filter expressions were added
+        self.__dict__.update(state)
+
+    def get_expression(self) -> FilterExpression:
+        if self.column not in self.expressions:
+            self.expressions[self.column] = FilterExpression(self.filter[self.column])
+        return self.expressions[self.column]
+
+    def mask(self, batch:DataFrame)->np.ndarray:
         """
-        Determines which rows of a batch should be converted as notes, based on filter. A row can be converted as a note
-        if the values found in the column corresponding to self.column are validated by the filter
+        Vectorized evaluate, for a whole batch. Numeric columns are compared at once, text columns are evaluated once per
+        distinct value of the batch. The batch is not copied.
         :param batch: pandas Dataframe,
             a subset of the dataset
-        :return: pandas Dataframe,
-            Dataframe w.r.t the filter
+        :return: numpy array,
+            True for rows whose value follows the filter, False otherwise.
         """
-
-        df = batch.copy()
-        df['internal_filter'] = (df[self.column].apply(lambda y: self.evaluate(y)) & df['internal_filter'])
-        # We return row where 'new' is True and we remove the created column
-        if(discard_filtered):
-            df = df[df['internal_filter'] == True].drop('internal_filter', axis=1)
-        return df
-        # Create a new column and fill it with True or False value after eval
-        df["internal_filter"] = df[self.column].apply(lambda y: self.evaluate(y))
-        return df[df["internal_filter"]].drop("internal_filter", axis=1)
+        if self.column not in self.mode or self.mode[self.column] is FilterType.NONE:
+            return np.ones(batch.shape[0], dtype=bool)
+        column = batch[self.column]
+        mode = self.mode[self.column]
+        f = self.filter[self.column]
+        if mode is FilterType.EXPRESSION:
+            return self.get_expression().mask(column)
+        if (pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype) and
+                isinstance(column.dtype, np.dtype)):
+            values = column.to_numpy()
+            if mode is FilterType.SINGLE and isinstance(f, numbers.Number):
+                return values == f
+            if mode is FilterType.RANGE and f.step == 1:
+                mask = (values >= f.start) & (values < f.stop)
+                return mask if values.dtype.kind in "iu" else mask & (values == np.floor(values))
+            if mode is FilterType.MULTIPLE:
+                return ~self.isin_strings(values, f)
+        if pd.api.types.infer_dtype(column, skipna=True) not in ("string", "empty", "boolean"):
+            # mixed types: factorize would merge values such as 1 and "1" or None and NaN
+            return np.fromiter((self.evaluate(v) for v in column.to_numpy()), dtype=bool, count=column.shape[0])
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+        evaluations = np.array([self.evaluate(u) for u in uniques], dtype=bool)
+        return evaluations[codes] if len(evaluations) > 0 else np.zeros(0, dtype=bool)
+
+    @staticmethod
+    def isin_strings(values:np.ndarray, strings:list)->np.ndarray:
+        """
+        Vectorized str(value) in strings, for a numeric array. Only strings that are the exact representation of a value
+        of this dtype can match.
+        """
+        targets = []
+        for s in strings:
+            try:
+                v = values.dtype.type(s) if isinstance(s, str) else None
+            except (ValueError, OverflowError):
+                v = None
+            if v is not None and str(v) == s:
+                targets.append(v)
+        mask = np.isin(values, targets)
+        if values.dtype.kind == "f" and any(np.isnan(t) for t in targets):
+            mask |= np.isnan(values)
+        return mask
 
     def evaluate(self, value:int)->bool:
         """
@@ -63,6 +113,8 @@ class FilterModule:
             return True
         if self.mode[self.column] is FilterType.MULTIPLE and str(value) not in self.filter[self.column]:
             return True
+        if self.mode[self.column] is FilterType.EXPRESSION:
+            return bool(self.get_expression().mask(pd.Series([value]))[0])
         return False
 
     def assign_column(self, column:str)->None:
@@ -72,31 +124,28 @@ class FilterModule:
 
     def assign(self, filter:str)->None:
         """
-        Setup a filter, based on implemented options
+        Setup a filter, based on implemented options. The filter is parsed and compiled once, see FilterExpression for
+        its syntax.
         :param filter: str,
             representation of a filter, entered by user
         :return: bool,
             True if the filter entered is legal, otherwise False
         """
-        if (filter.isnumeric()):
-            self.mode[self.column] = FilterType.SINGLE
-            self.filter[self.column] = eval(filter)
-            return True
-        if (len(filter) > 0 and filter[0] == "["):
-            self.mode[self.column] = FilterType.RANGE
-            tab_f = eval(filter)
-            self.filter[self.column] = range(tab_f[0], tab_f[1])
-            return True
-        if (len(filter.split(";")) > 1):
-            self.mode[self.column] = FilterType.MULTIPLE
-            self.filter[self.column] = [eval(v) for v in filter.split(";")]
-            return True
+        self.expressions.pop(self.column, None)
+        if (filter.strip() != ""):
+            try:
+                self.expressions[self.column] = FilterExpression(filter)
+                self.mode[self.column] = FilterType.EXPRESSION
+                self.filter[self.column] = filter
+                return True
+            except FilterSyntaxError as e:
+                logging.log(logging.WARNING, str(e))
         self.mode[self.column] = FilterType.NONE
         self.filter[self.column] = None
         return False
 
     def assign_quali_value(self, value:str, add=True)->None:
-        if (self.column not in self.filter):
+        if (self.column not in self.filter or self.mode.get(self.column) is not FilterType.MULTIPLE):
             self.assign_quali_table([])
         if add:
             self.filter[self.column].append(value)
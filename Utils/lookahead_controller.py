@@ -0,0 +1,97 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+from Utils.constants import ADAPTIVE_PERIOD, ADAPTIVE_SMOOTHING, LOOKAHEAD_TARGET, BATCH_TARGET, BATCH_SIZE_BOUNDS, \
+    BATCH_PLANNED_BOUNDS, TIME_BUFFER_BOUNDS
+
+
+def bound(value: float, bounds: (int, int)) -> int:
+    return int(min(max(value, bounds[0]), bounds[1]))
+
+
+class LookaheadController:
+    """
+    Adapt batchSize, batchPlanned and timeBuffer to the density of the data during playback, when the adaptive setting
+    is on. The producer reports each batch: its number of rows, notes and the music time it covers give the rates of
+    the music (rows and notes per second), its computation time gives the production rate. Then:
+        - a batch covers BATCH_TARGET seconds of music,
+        - the queue holds LOOKAHEAD_TARGET seconds of music, more if production is less than twice as fast as the music,
+        - the scheduler window grows when notes are skipped and shrinks back to the value set by the user otherwise.
+    Dense segments do not starve the scheduler, sparse segments do not keep thousands of notes queued.
+    """
+
+    def __init__(self, music):
+        """
+            music       : Music,
+                        the music whose settings are adapted
+        """
+        self.music = music
+        self.productionRate = None  # rows generated per second of computation
+        self.rowRate = None  # rows per second of music
+        self.noteRate = None  # notes per second of music
+        self.lastUpdate = 0.0
+        self.skipped = 0  # notes skipped by the scheduler at the last adaptation
+        self.base = None  # (batchSize, batchPlanned, timeBuffer) set by the user, restored when music stops
+
+    @staticmethod
+    def smooth(previous: float, value: float) -> float:
+        return value if previous is None else (1 - ADAPTIVE_SMOOTHING) * previous + ADAPTIVE_SMOOTHING * value
+
+    def on_batch(self, notes: np.ndarray, rows: int, duration: float) -> None:
+        """
+        Measure a batch produced, and adapt the look-ahead at most every ADAPTIVE_PERIOD seconds.
+        :param notes: numpy array of NOTE_DTYPE, the notes of the batch sorted by tfactor
+        :param rows: int, number of rows of the batch
+        :param duration: float, time spent generating the notes, in seconds
+        """
+        if len(notes) < 2 or rows == 0:
+            return
+        span = float(notes['tfactor'][-1] - notes['tfactor'][0]) * self.music.settings.get_music_duration()
+        if span <= 0:
+            return
+        if self.base is None:
+            settings = self.music.settings
+            self.base = (settings.batchSize, settings.batchPlanned, settings.timeBuffer)
+        self.productionRate = self.smooth(self.productionRate, rows / max(duration, 1e-6))
+        self.rowRate = self.smooth(self.rowRate, rows / span)
+        self.noteRate = self.smooth(self.noteRate, len(notes) / span)
+        now = time.perf_counter()
+        if now - self.lastUpdate >= ADAPTIVE_PERIOD:
+            self.lastUpdate = now
+            self.adapt()
+
+    def adapt(self) -> None:
+        settings = self.music.settings
+        batch_size = bound(math.ceil(self.rowRate * BATCH_TARGET), BATCH_SIZE_BOUNDS)
+        speed = self.productionRate / self.rowRate  # how many times faster than the music notes are produced
+        lookahead = LOOKAHEAD_TARGET * min(max(2.0 / speed, 1.0), 4.0)  # seconds of music to queue
+        batch_planned = bound(math.ceil(self.noteRate * lookahead / batch_size), BATCH_PLANNED_BOUNDS)
+        _, skipped = self.music.ctrl.view.stats.get_totals()
+        if skipped > self.skipped:
+            time_buffer = bound(settings.timeBuffer * 1.5, TIME_BUFFER_BOUNDS)
+        else:
+            time_buffer = bound(max(settings.timeBuffer * 0.9, self.base[2]), TIME_BUFFER_BOUNDS)
+        self.skipped = skipped
+        if (batch_size, batch_planned, time_buffer) != (settings.batchSize, settings.batchPlanned, settings.timeBuffer):
+            logging.log(logging.INFO, "Look-ahead adapted to {:.1f} rows/s, {:.1f} notes/s, production x{:.1f}: "
+                                      "batch size {}, {} batches planned, time buffer {} ms".format(
+                self.rowRate, self.noteRate, speed, batch_size, batch_planned, time_buffer))
+            settings.timeBuffer = time_buffer
+            settings.ctrl.change_batch_size(batch_size, batch_planned)
+
+    def restore(self) -> None:
+        """
+        Restore the values set by the user and forget measurements, e.g. when music stops.
+        """
+        if self.base is not None:
+            batch_size, batch_planned, time_buffer = self.base
+            self.music.settings.timeBuffer = time_buffer
+            self.music.settings.ctrl.change_batch_size(batch_size, batch_planned)
+        self.productionRate = None
+        self.rowRate = None
+        self.noteRate = None
+        self.skipped = 0
+        self.base = None
@@ -27,7 +27,6 @@ import logging
 from ctypes import *
 from ctypes.util import find_library
 import os
-import subprocess
 
 # A short circuited or expression to find the FluidSynth library
 # (mostly needed for Windows distributions of libfluidsynth supplied with QSynth)
@@ -197,6 +196,14 @@ fluid_synth_program_reset = cfunc('fluid_synth_program_reset', c_int,
 fluid_synth_system_reset = cfunc('fluid_synth_system_reset', c_int,
                                  ('synth', c_void_p, 1))
 
+fluid_synth_all_notes_off = cfunc('fluid_synth_all_notes_off', c_int,
+                                  ('synth', c_void_p, 1),
+                                  ('chan', c_int, 1))
+
+fluid_synth_all_sounds_off = cfunc('fluid_synth_all_sounds_off', c_int,
+                                   ('synth', c_void_p, 1),
+                                   ('chan', c_int, 1))
+
 fluid_synth_write_s16 = cfunc('fluid_synth_write_s16', c_void_p,
                               ('synth', c_void_p, 1),
                               ('len', c_int, 1),
@@ -207,6 +214,16 @@ fluid_synth_write_s16 = cfunc('fluid_synth_write_s16', c_void_p,
                               ('roff', c_int, 1),
                               ('rincr', c_int, 1))
 
+fluid_synth_write_float = cfunc('fluid_synth_write_float', c_int,
+                                ('synth', c_void_p, 1),
+                                ('len', c_int, 1),
+                                ('lout', c_void_p, 1),
+                                ('loff', c_int, 1),
+                                ('lincr', c_int, 1),
+                                ('rout', c_void_p, 1),
+                                ('roff', c_int, 1),
+                                ('rincr', c_int, 1))
+
 
 class fluid_synth_channel_info_t(Structure):
     _fields_ = [
@@ -351,6 +368,12 @@ fluid_sequencer_send_at = cfunc('fluid_sequencer_send_at', c_int,
                                 ('time', c_uint, 1),
                                 ('absolute', c_int, 1))
 
+fluid_sequencer_remove_events = cfunc('fluid_sequencer_remove_events', None,
+                                      ('seq', c_void_p, 1),
+                                      ('source', c_short, 1),
+                                      ('dest', c_short, 1),
+                                      ('type', c_int, 1))
+
 delete_fluid_sequencer = cfunc('delete_fluid_sequencer', None,
                                ('seq', c_void_p, 1))
 
@@ -900,6 +923,14 @@ class Synth:
         """Stop all notes and reset all programs"""
         return fluid_synth_system_reset(self.synth)
 
+    def all_notes_off(self, chan=-1):
+        """Send a note off to every playing note of a channel, -1 for all channels"""
+        return fluid_synth_all_notes_off(self.synth, chan)
+
+    def all_sounds_off(self, chan=-1):
+        """Immediately stop every sound of a channel, release included, -1 for all channels"""
+        return fluid_synth_all_sounds_off(self.synth, chan)
+
     def get_samples(self, len=1024):
         """Generate audio samples
 
@@ -910,10 +941,22 @@ class Synth:
         """
         return fluid_synth_write_s16_stereo(self.synth, len)
 
-    def midi_to_audio(self, midi_file, audio_file, config_file):
-        #os.system('fluidsynth')
-        subprocess.call(['fluidsynth', "-q", "-f", config_file, midi_file, '-F', audio_file, '-r', str(44100)])
-        #        subprocess.call(['fluidsynth',  midi_file, '-F', audio_file, '-r', str(44100)]) @'-ni', soundfont,
+    def write_s16(self, buf, offset, length):
+        """Generate audio samples in place
+
+        Write length frames of stereo 16-bit samples, interleaved, into a writable buffer given by its address (e.g.
+        numpy_array.ctypes.data), starting at frame offset. Avoids the copies of get_samples when rendering offline.
+
+        """
+        fluid_synth_write_s16(self.synth, length, buf, 2 * offset, 2, buf, 2 * offset + 1, 2)
+
+    def write_float(self, buf, length):
+        """Generate audio samples in place, as floats
+
+        Write length frames of stereo 32-bit float samples, interleaved, at the address buf.
+
+        """
+        fluid_synth_write_float(self.synth, length, buf, 0, 2, buf, 1, 2)
 
 
 class Sequencer:
@@ -953,6 +996,24 @@ class Sequencer:
         self._schedule_event(evt, time, absolute)
         delete_fluid_event(evt)
 
+    def notes(self, times, channels, keys, velocities, durations, source=-1, dest=-1, absolute=True):
+        """Schedule many notes at once, reusing a single event
+
+        Arguments other than source, dest and absolute are sequences (e.g. numpy arrays) of the same length,
+        one item per note.
+        """
+        import numpy
+        columns = [numpy.asarray(column).tolist() for column in (times, channels, keys, velocities, durations)]
+        evt = self._create_event(source, dest)
+        try:
+            for time, channel, key, velocity, duration in zip(*columns):
+                fluid_event_note(evt, channel, key, velocity, duration)
+                if fluid_sequencer_send_at(self.sequencer, evt, time, absolute) == FLUID_FAILED:  # event is copied
+                    logging.log(logging.FATAL, "Scheduling event failed")
+                    raise Exception("Scheduling event failed")
+        finally:
+            delete_fluid_event(evt)
+
     def note_on(self, time, channel, key, velocity=127, source=-1, dest=-1, absolute=True):
         evt = self._create_event(source, dest)
         fluid_event_noteon(evt, channel, key, velocity)
@@ -983,6 +1044,10 @@ class Sequencer:
             logging.log(logging.FATAL, "Scheduling event failed")
             raise Exception("Scheduling event failed")
 
+    def remove_events(self, source=-1, dest=-1, type=-1):
+        """Remove scheduled events matching a source, a destination and a type, -1 matching any"""
+        fluid_sequencer_remove_events(self.sequencer, source, dest, type)
+
     def get_tick(self):
         return fluid_sequencer_get_tick(self.sequencer)
 
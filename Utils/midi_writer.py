@@ -0,0 +1,195 @@
+import logging
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from Utils.constants import MIDI_TICKS_PER_QUARTER, MIDI_BUFFER, MIDI_CHUNK
+
+
+def vlq(value: int) -> bytes:
+    """
+    Variable length quantity of midi files: 7 bits per byte, most significant first, high bit set on all but the last.
+    """
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value > 0:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+def encode_events(deltas: np.ndarray, status: np.ndarray, keys: np.ndarray, velocities: np.ndarray) -> bytes:
+    """
+    Encode channel events of 3 bytes, each preceded by its delta-time, in a single pass over the arrays.
+    :param deltas: numpy array, ticks since the previous event, at most 0x0FFFFFFF (4 bytes)
+    """
+    deltas = np.minimum(deltas.astype(np.int64), 0x0FFFFFFF)
+    lengths = 1 + (deltas >= 1 << 7).astype(np.int64) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    offsets = np.zeros(len(deltas), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 3, out=offsets[1:])
+    encoded = np.empty(int(lengths.sum()) + 3 * len(deltas), dtype=np.uint8)
+    for byte in range(4):  # byte-th byte of the delta-time, most significant first
+        selected = lengths > byte
+        shift = 7 * (lengths[selected] - 1 - byte)
+        encoded[offsets[selected] + byte] = ((deltas[selected] >> shift) & 0x7F) | \
+            np.where(shift > 0, 0x80, 0)  # high bit set on all bytes but the last
+    end = offsets + lengths
+    encoded[end] = status
+    encoded[end + 1] = keys
+    encoded[end + 2] = velocities
+    return encoded.tobytes()
+
+
+class TrackChunk:
+    """
+    Events of a track of a midi file, spooled to a temporary file once more than MIDI_BUFFER bytes are buffered.
+    Note offs wait until a later note on passes them, so that events are written in order of time. Events of a batch
+    of notes are ordered and encoded with numpy, without a Python operation per note.
+    """
+
+    def __init__(self, channel: int, name: str = None):
+        """
+            channel     : int,
+                        midi channel of the notes, between 0 and 15
+        """
+        self.channel = channel
+        self.buffer = bytearray()
+        self.spool = tempfile.TemporaryFile(prefix="soda_midi_")
+        self.size = 0  # bytes written to spool
+        self.tick = 0  # tick of the last event written
+        # note offs of notes started but not ended: tick, key, velocity and insertion number, to keep the order of notes
+        self.offTicks = np.empty(0, dtype=np.int64)
+        self.offKeys = np.empty(0, dtype=np.int64)
+        self.offVelocities = np.empty(0, dtype=np.int64)
+        self.offOrder = np.empty(0, dtype=np.int64)
+        self.counter = 0
+        if name is not None:
+            self.meta(0, 0x03, name.encode())
+
+    def event(self, tick: int, data: bytes) -> None:
+        if tick < self.tick:  # batches overlapping in time, the event is written as soon as possible
+            logging.log(logging.DEBUG, "Midi event at {} written at {}".format(tick, self.tick))
+            tick = self.tick
+        self.buffer += vlq(tick - self.tick)
+        self.buffer += data
+        self.tick = tick
+        if len(self.buffer) >= MIDI_BUFFER:
+            self.flush()
+
+    def meta(self, tick: int, kind: int, data: bytes) -> None:
+        self.event(tick, bytes((0xFF, kind)) + vlq(len(data)) + data)
+
+    def add_notes(self, ticks: np.ndarray, durations: np.ndarray, keys: np.ndarray, velocities: np.ndarray) -> None:
+        """
+        :param ticks: numpy array, start of each note, in ascending order
+        :param durations: numpy array, duration of each note, in ticks
+        """
+        if len(ticks) == 0:
+            return
+        order = self.counter + np.arange(len(ticks), dtype=np.int64)
+        self.counter += len(ticks)
+        self.offTicks = np.concatenate([self.offTicks, ticks + np.maximum(1, durations)])
+        self.offKeys = np.concatenate([self.offKeys, keys])
+        self.offVelocities = np.concatenate([self.offVelocities, velocities])  # note offs repeat it, as MIDIUtil did
+        self.offOrder = np.concatenate([self.offOrder, order])
+        # following notes start at or after the last one, so can not come before the note offs up to it
+        self.write(ticks, keys, velocities, order, int(ticks.max()))
+
+    def write(self, ticks: np.ndarray, keys: np.ndarray, velocities: np.ndarray, order: np.ndarray,
+              until: float) -> None:
+        """
+        Write note ons and the pending note offs up to tick until, included, note offs first on a same tick.
+        """
+        ready = self.offTicks <= until
+        ticks = np.concatenate([self.offTicks[ready], ticks])
+        status = np.concatenate([np.full(int(ready.sum()), 0x80 | self.channel),
+                                 np.full(len(keys), 0x90 | self.channel)])
+        keys = np.concatenate([self.offKeys[ready], keys])
+        velocities = np.concatenate([self.offVelocities[ready], velocities])
+        order = np.concatenate([self.offOrder[ready], order])
+        self.offTicks, self.offKeys = self.offTicks[~ready], self.offKeys[~ready]
+        self.offVelocities, self.offOrder = self.offVelocities[~ready], self.offOrder[~ready]
+        events = np.lexsort((order, status, ticks))  # 0x8. note offs sort before 0x9. note ons
+        ticks = np.maximum.accumulate(np.maximum(ticks[events], self.tick))  # late events written as soon as possible
+        self.buffer += encode_events(np.diff(ticks, prepend=self.tick), status[events], keys[events],
+                                     velocities[events])
+        self.tick = int(ticks[-1]) if len(ticks) > 0 else self.tick
+        if len(self.buffer) >= MIDI_BUFFER:
+            self.flush()
+
+    def flush(self) -> None:
+        self.spool.write(self.buffer)
+        self.size += len(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self) -> None:
+        self.write(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                   np.empty(0, dtype=np.int64), float("inf"))
+        self.meta(self.tick, 0x2F, b"")  # end of track
+        self.flush()
+
+    def copy_to(self, output) -> None:
+        output.write(b"MTrk" + struct.pack(">I", self.size))
+        self.spool.seek(0)
+        while True:
+            data = self.spool.read(MIDI_BUFFER)
+            if len(data) == 0:
+                break
+            output.write(data)
+        self.spool.close()
+
+
+class MidiWriter:
+    """
+    Standard midi file (format 1) written as notes arrive, without keeping them in memory: a tempo track, then a track
+    per Soda track. Notes of each track must be added in order of time, which is the case of batches sorted by tfactor.
+    """
+
+    def __init__(self, filename: str, tracks: dict, bpm: float, ticks_per_quarter: int = MIDI_TICKS_PER_QUARTER):
+        """
+            tracks      : dict,
+                        track id -> track name
+            bpm         : float,
+                        tempo of the file, notes are added in quarters
+        """
+        self.filename = filename
+        self.ticksPerQuarter = ticks_per_quarter
+        self.tempo = TrackChunk(0)
+        self.tempo.meta(0, 0x51, struct.pack(">I", int(60000000 / bpm))[1:])  # microseconds per quarter
+        self.tracks = {track: TrackChunk(track % 16, name) for track, name in tracks.items()}  # 16 midi channels
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for track in [self.tempo] + list(self.tracks.values()):
+                track.spool.close()
+
+    def add_notes(self, track: int, times: np.ndarray, durations: np.ndarray, keys: np.ndarray,
+                  velocities: np.ndarray) -> None:
+        """
+        :param track: int, track id
+        :param times: numpy array, start of each note in quarters, in ascending order
+        :param durations: numpy array, duration of each note in quarters
+        """
+        ticks = (times * self.ticksPerQuarter).astype(np.int64)  # truncated, as MIDIUtil did
+        durations = (durations * self.ticksPerQuarter).astype(np.int64)
+        for start in range(0, len(ticks), MIDI_CHUNK):  # whole tracks are encoded by chunks, to bound memory
+            self.tracks[track].add_notes(ticks[start:start + MIDI_CHUNK], durations[start:start + MIDI_CHUNK],
+                                         keys[start:start + MIDI_CHUNK].astype(np.int64),
+                                         velocities[start:start + MIDI_CHUNK].astype(np.int64))
+
+    def close(self) -> None:
+        chunks = [self.tempo] + list(self.tracks.values())
+        for chunk in chunks:
+            chunk.close()
+        with open(self.filename, "wb") as output:
+            output.write(b"MThd" + struct.pack(">IHHH", 6, 1, len(chunks), self.ticksPerQuarter))
+            for chunk in chunks:
+                chunk.copy_to(output)
+        logging.log(logging.INFO, "Midi file {} written, {} bytes".format(self.filename, os.path.getsize(self.filename)))
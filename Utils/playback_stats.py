@@ -0,0 +1,127 @@
+import logging
+import threading
+
+import numpy as np
+
+from Utils.constants import LATENESS_BINS, PLAYBACK_STATS_WINDOW
+
+# planned: tick the note should be played at, sent: tick it was handed to the sequencer at, lateness: sent - planned,
+# negative when the note was sent ahead of time
+RECORD_DTYPE = np.dtype([('planned', np.int64), ('sent', np.int64), ('lateness', np.int64), ('skipped', bool)])
+
+
+class PlaybackStats:
+    """
+    Timing of the notes handed to the sequencer during playback, kept per track over a rolling window of the last notes.
+    Used to tune timeBuffer, batchSize and batchPlanned: notes sent late, or skipped, mean that the look-ahead is too
+    short for the density of the data.
+    """
+
+    def __init__(self, window: int = PLAYBACK_STATS_WINDOW):
+        """
+            window      : int,
+                        number of most recent notes kept for each track
+        """
+        self.window = window
+        self.records = {}  # channel -> numpy array of RECORD_DTYPE, used as a circular buffer
+        self.positions = {}  # channel -> index of the next record to overwrite
+        self.counts = {}  # channel -> (notes, skipped notes) since reset, not limited to the window
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.records = {}
+            self.positions = {}
+            self.counts = {}
+
+    def record(self, channels: np.ndarray, planned: np.ndarray, sent: int, skipped: np.ndarray) -> None:
+        """
+        Record notes handed to the sequencer at the same tick.
+        :param channels: numpy array, channel (i.e. track id) of each note
+        :param planned: numpy array, tick each note should be played at
+        :param sent: int, current tick
+        :param skipped: numpy array of bool, True for notes too late to be played
+        """
+        with self.lock:
+            for channel in np.unique(channels).tolist():
+                selected = channels == channel
+                records = np.empty(int(selected.sum()), dtype=RECORD_DTYPE)
+                records['planned'] = planned[selected]
+                records['sent'] = sent
+                records['lateness'] = sent - records['planned']
+                records['skipped'] = skipped[selected]
+                notes, skipped_notes = self.counts.get(channel, (0, 0))
+                self.counts[channel] = (notes + len(records), skipped_notes + int(records['skipped'].sum()))
+                self.append(channel, records[-self.window:])
+
+    def append(self, channel: int, records: np.ndarray) -> None:
+        if channel not in self.records:
+            self.records[channel] = np.empty(0, dtype=RECORD_DTYPE)
+            self.positions[channel] = 0
+        buffer = self.records[channel]
+        if len(buffer) < self.window:  # not full yet
+            self.records[channel] = np.concatenate([buffer, records])[-self.window:]
+            self.positions[channel] = len(self.records[channel]) % self.window
+            return
+        position = self.positions[channel]
+        first = min(len(records), self.window - position)
+        buffer[position:position + first] = records[:first]
+        buffer[:len(records) - first] = records[first:]
+        self.positions[channel] = (position + len(records)) % self.window
+
+    def get_records(self, channel: int) -> np.ndarray:
+        """
+        :return: the records of the rolling window of a track, oldest first
+        """
+        with self.lock:
+            buffer = self.records.get(channel)
+            if buffer is None:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            position = self.positions[channel] if len(buffer) == self.window else 0
+            return np.concatenate([buffer[position:], buffer[:position]])
+
+    def get_histogram(self, channel: int) -> (np.ndarray, np.ndarray):
+        """
+        :return: number of notes of the rolling window of a track in each lateness bin, and the bins edges in ms
+        """
+        edges = np.array(LATENESS_BINS, dtype=np.float64)
+        counts, _ = np.histogram(self.get_records(channel)['lateness'], bins=edges)
+        return counts, edges
+
+    def get_summary(self, channel: int) -> dict:
+        """
+        :return: notes and skipped notes since reset, and lateness statistics in ms over the rolling window
+        """
+        records = self.get_records(channel)
+        notes, skipped = self.counts.get(channel, (0, 0))
+        summary = {"notes": notes, "skipped": skipped}
+        if len(records) > 0:
+            lateness = records['lateness']
+            summary.update({"mean": float(lateness.mean()), "median": float(np.median(lateness)),
+                            "p95": float(np.percentile(lateness, 95)), "max": int(lateness.max())})
+        return summary
+
+    def get_totals(self) -> (int, int):
+        """
+        :return: notes and skipped notes of every track since reset
+        """
+        with self.lock:
+            return sum(n for n, _ in self.counts.values()), sum(s for _, s in self.counts.values())
+
+    def get_channels(self) -> [int]:
+        with self.lock:
+            return sorted(self.counts.keys())
+
+    def log_summary(self) -> None:
+        """
+        Write the statistics and histogram of each track in the log.
+        """
+        for channel in self.get_channels():
+            summary = self.get_summary(channel)
+            counts, edges = self.get_histogram(channel)
+            histogram = ", ".join("[{:g}, {:g}[: {}".format(low, high, count)
+                                  for low, high, count in zip(edges[:-1], edges[1:], counts.tolist()) if count > 0)
+            logging.log(logging.INFO, "Playback track {}: {} notes, {} skipped, lateness (ms) mean {:.1f}, median {:.1f}, "
+                                      "p95 {:.1f}, max {}. Histogram {}".format(
+                channel, summary["notes"], summary["skipped"], summary.get("mean", 0), summary.get("median", 0),
+                summary.get("p95", 0), summary.get("max", 0), histogram))
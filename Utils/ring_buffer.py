@@ -0,0 +1,151 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Bounded FIFO of numpy records, shared by a producer and a consumer thread. Records are put and taken in bulk, with a
+    single lock operation per call.
+    Each reset increments the epoch of the buffer, so that a producer blocked or working on data of a previous epoch
+    (e.g. before music was stopped) can find out that its records are not expected anymore.
+    The capacity can be changed while records are queued, see resize.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype):
+        """
+            capacity    : int,
+                        maximum number of records in the buffer
+            dtype       : numpy dtype,
+                        type of the records
+        """
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be >= 1")
+        self.dtype = dtype
+        self.buffer = np.empty(capacity, dtype=dtype)  # longer than limit until a shrink requested by resize is done
+        self.limit = capacity
+        self.head = 0  # index of the oldest record
+        self.size = 0
+        self.epoch = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return self.limit
+
+    def __len__(self) -> int:
+        return self.size
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def free(self) -> int:
+        return max(0, self.limit - self.size)
+
+    def is_current(self, epoch: int) -> bool:
+        return not self.closed and (epoch is None or epoch == self.epoch)
+
+    def wait_for_space(self, n: int, epoch: int = None, timeout: float = None) -> bool:
+        """
+        Block until n records (at most the capacity) can be put.
+        :param epoch: int,
+            the epoch the caller is working on, the wait is interrupted if the buffer is reset meanwhile
+        :return: True if there is room, False on timeout or if the buffer was closed or reset
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: not self.is_current(epoch) or self.free() >= min(n, self.capacity),
+                                           timeout):
+                return False
+            return self.is_current(epoch)
+
+    def put(self, records: np.ndarray, epoch: int = None, timeout: float = None) -> bool:
+        """
+        Append records, blocking while the buffer is full. Records that do not fit are put as soon as there is room.
+        :param epoch: int,
+            the epoch the records were produced for, they are dropped if the buffer is reset meanwhile
+        :return: True if every record was put, False on timeout or if the buffer was closed or reset
+        """
+        position = 0
+        with self.condition:
+            while position < len(records):
+                if not self.condition.wait_for(lambda: not self.is_current(epoch) or self.free() > 0, timeout):
+                    return False
+                if not self.is_current(epoch):
+                    return False
+                n = min(self.free(), len(records) - position)
+                tail = (self.head + self.size) % self.buffer.shape[0]
+                first = min(n, self.buffer.shape[0] - tail)  # records written before wrapping around
+                self.buffer[tail:tail + first] = records[position:position + first]
+                self.buffer[:n - first] = records[position + first:position + n]
+                self.size += n
+                position += n
+                self.condition.notify_all()
+        return True
+
+    def get(self, n: int = 1, timeout: float = None) -> np.ndarray:
+        """
+        Take up to n records, blocking until at least one is available.
+        :return: numpy array of records, empty on timeout or if the buffer was closed or reset while waiting
+        """
+        with self.condition:
+            epoch = self.epoch
+            if not self.condition.wait_for(lambda: not self.is_current(epoch) or self.size > 0, timeout):
+                return np.empty(0, dtype=self.dtype)
+            if not self.is_current(epoch):
+                return np.empty(0, dtype=self.dtype)
+            n = min(n, self.size)
+            first = min(n, self.buffer.shape[0] - self.head)
+            records = np.concatenate([self.buffer[self.head:self.head + first], self.buffer[:n - first]])
+            self.head = (self.head + n) % self.buffer.shape[0]
+            self.size -= n
+            if self.buffer.shape[0] > self.limit >= self.size:  # shrink requested by resize
+                self.reallocate()
+            self.condition.notify_all()
+            return records
+
+    def reset(self) -> int:
+        """
+        Drop every record and wake up waiting threads.
+        :return: the new epoch
+        """
+        with self.condition:
+            self.head = 0
+            self.size = 0
+            if self.buffer.shape[0] > self.limit:
+                self.reallocate()
+            self.epoch += 1
+            self.closed = False
+            self.condition.notify_all()
+            return self.epoch
+
+    def close(self) -> None:
+        """
+        Wake up waiting threads, every following call returns immediately until the buffer is reset.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def resize(self, capacity: int) -> None:
+        """
+        Change the capacity, keeping the records. Nothing more can be put until the number of records is below the new
+        capacity, and if there are more records than that, memory is only reduced once enough of them are taken.
+        """
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be >= 1")
+        with self.condition:
+            self.limit = capacity
+            if capacity >= self.size:
+                self.reallocate()
+            self.condition.notify_all()
+
+    def reallocate(self) -> None:
+        """
+        Move the records to a new array of limit records, to be called with the condition held.
+        """
+        first = min(self.size, self.buffer.shape[0] - self.head)
+        records = np.concatenate([self.buffer[self.head:self.head + first], self.buffer[:self.size - first]])
+        self.buffer = np.empty(self.limit, dtype=self.dtype)
+        self.buffer[:self.size] = records
+        self.head = 0
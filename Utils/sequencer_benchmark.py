@@ -0,0 +1,52 @@
+"""
+Micro-benchmark of note scheduling through the fluidsynth sequencer: one Sequencer.note call per note against a single
+Sequencer.notes call. Notes are scheduled far in the future and removed afterwards, so nothing is heard.
+Usage: python -m Utils.sequencer_benchmark [number of notes]
+"""
+import sys
+import time
+
+import numpy as np
+
+from Utils import m_fluidsynth
+
+
+def run(note_nbr: int = 100000) -> (float, float):
+    """
+    :param note_nbr: int,
+        number of notes scheduled by each path
+    :return: duration in seconds of the note path and of the notes path
+    """
+    synth = m_fluidsynth.Synth()
+    sequencer = m_fluidsynth.Sequencer(use_system_timer=False)
+    dest = sequencer.register_fluidsynth(synth)
+    rng = np.random.default_rng(0)
+    start = sequencer.get_tick() + 3600 * 1000  # in an hour
+    times = start + np.arange(note_nbr, dtype=np.int64)
+    channels = rng.integers(0, 16, note_nbr)
+    keys = rng.integers(21, 109, note_nbr)
+    velocities = rng.integers(1, 128, note_nbr)
+    durations = rng.integers(50, 1000, note_nbr)
+
+    t = time.perf_counter()
+    for tick, channel, key, velocity, duration in zip(times.tolist(), channels.tolist(), keys.tolist(),
+                                                      velocities.tolist(), durations.tolist()):
+        sequencer.note(tick, channel, key, velocity, duration, dest=dest)
+    single = time.perf_counter() - t
+    sequencer.remove_events(dest=dest)
+
+    t = time.perf_counter()
+    sequencer.notes(times, channels, keys, velocities, durations, dest=dest)
+    batch = time.perf_counter() - t
+    sequencer.remove_events(dest=dest)
+
+    sequencer.delete()
+    synth.delete()
+    return single, batch
+
+
+if __name__ == "__main__":
+    note_nbr = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    single, batch = run(note_nbr)
+    print("Sequencer.note : {:.3f} s, {:.0f} notes/s".format(single, note_nbr / single))
+    print("Sequencer.notes: {:.3f} s, {:.0f} notes/s, x{:.1f}".format(batch, note_nbr / batch, single / batch))
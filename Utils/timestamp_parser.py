@@ -0,0 +1,258 @@
+import logging
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse, ParserError
+
+from Utils.constants import TIMESTAMP_SAMPLE_SIZE
+from Utils.error_manager import ErrorManager
+
+NAT = np.iinfo(np.int64).min  # int64 representation of NaT
+DAY = 86400 * 10 ** 9
+QUARTER = 900 * 10 ** 9  # changes of offset to UTC happen on a quarter of hour
+FIXED_WIDTH_DIRECTIVES = {"%Y": ("year", 4), "%y": ("year", 2), "%m": ("month", 2), "%d": ("day", 2),
+                          "%H": ("hour", 2), "%M": ("minute", 2), "%S": ("second", 2)}
+
+
+class TimestampParser:
+    """
+    Vectorized parser for a timestamp column. The format is detected once on a sample of the column, then the whole
+    column is parsed in a single pass into int64 epoch values (nanoseconds). Only the rows failing this pass are parsed
+    one by one. Naive timestamps are in local time, and years up to 1970 of timestamps matching a format are replaced by
+    1971, as parsing with datetime.strptime then datetime.timestamp did.
+    """
+
+    def __init__(self, formats: [str], sample_size: int = TIMESTAMP_SAMPLE_SIZE):
+        """
+            formats         : list,
+                            formats to try, in order, on the sample
+            sample_size     : int,
+                            number of non null values used to detect the format
+        """
+        self.formats = formats
+        self.sample_size = sample_size
+        self.format = None  # format detected on the sample, None if pandas had to infer it
+        self.kind = None  # "datetime", "numeric" or "string", depending on the dtype of the parsed column
+        self.fallback_count = 0  # number of rows parsed one by one during the last call to parse
+
+    def parse(self, column: pd.Series) -> np.ndarray:
+        """
+        Parse a column into epoch values.
+        :param column: pandas Series,
+            the timestamp column
+        :return: numpy array,
+            int64 epoch values in nanoseconds
+        """
+        self.fallback_count = 0
+        self.check_nulls(column)
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            self.kind = "datetime"
+            return self.to_epoch(column) if column.dt.tz is not None else self.to_local(self.to_epoch(column))
+        if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype):
+            self.kind = "numeric"
+            return self.from_epoch(column.to_numpy())
+        self.kind = "string"
+        return self.from_strings(column)
+
+    @staticmethod
+    def check_nulls(column: pd.Series) -> None:
+        nulls = column.isna()
+        if nulls.any():
+            value = column[nulls].iloc[0]
+            raise ValueError("No format found for this timestamp: {}".format(value))
+
+    @staticmethod
+    def to_epoch(column: pd.Series) -> np.ndarray:
+        """
+        Convert a datetime64 column, timezone aware or not, into epoch nanoseconds.
+        """
+        if column.dt.tz is not None:
+            column = column.dt.tz_convert(None)
+        return column.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+    @staticmethod
+    def to_local(values: np.ndarray) -> np.ndarray:
+        """
+        Convert epoch values of naive timestamps, i.e. read as if they were UTC, into epoch values of the local time, as
+        datetime.timestamp does. The offset to UTC is computed once per day, and once per quarter of hour on days when it
+        changes.
+        """
+        valid = values != NAT
+        values = values.copy()
+        days, inverse = np.unique(values[valid] // DAY, return_inverse=True)
+        offsets = np.array([TimestampParser.get_offset(d * DAY) for d in days.tolist()], dtype=np.int64)
+        changing = offsets != np.array([TimestampParser.get_offset((d + 1) * DAY - 1) for d in days.tolist()],
+                                       dtype=np.int64)
+        offsets = offsets[inverse]
+        if changing.any():
+            selected = changing[inverse]
+            quarters, quarter_inverse = np.unique(values[valid][selected] // QUARTER, return_inverse=True)
+            offsets[selected] = np.array([TimestampParser.get_offset(q * QUARTER) for q in quarters.tolist()],
+                                         dtype=np.int64)[quarter_inverse]
+        values[valid] -= offsets
+        return values
+
+    @staticmethod
+    def get_offset(value: int) -> int:
+        """
+        :return: int,
+            offset to UTC in nanoseconds of the local time value, as epoch nanoseconds of a naive timestamp
+        """
+        date = datetime(1970, 1, 1) + timedelta(microseconds=value // 1000)
+        return round((date - datetime(1970, 1, 1)).total_seconds() - date.timestamp()) * 10 ** 9
+
+    @staticmethod
+    def replace_years(values: np.ndarray) -> np.ndarray:
+        """
+        Replace years up to 1970 by 1971, as timestamps before 1970-01-02 can not be converted on every platform. The
+        29th of February becomes NAT, so that the row is parsed one by one.
+        """
+        dates = pd.DatetimeIndex(values.view("datetime64[ns]"))
+        old = (values != NAT) & (dates.year <= 1970)
+        if not old.any():
+            return values
+        ErrorManager.getInstance().datetime_replacement_warning()
+        dates = dates[old]
+        replaced = pd.to_datetime(pd.DataFrame({"year": 1971, "month": dates.month, "day": dates.day}),
+                                  errors="coerce") + (dates - dates.normalize())
+        values = values.copy()
+        values[old] = replaced.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        return values
+
+    @staticmethod
+    def from_epoch(values: np.ndarray) -> np.ndarray:
+        """
+        Convert numeric epoch values into epoch nanoseconds. The unit (s, ms, us or ns) is guessed from the magnitude of
+        the values.
+        """
+        magnitude = np.nanmax(np.abs(values)) if len(values) > 0 else 0
+        if magnitude < 1e11:
+            factor = 10 ** 9  # seconds
+        elif magnitude < 1e14:
+            factor = 10 ** 6  # milliseconds
+        elif magnitude < 1e17:
+            factor = 10 ** 3  # microseconds
+        else:
+            factor = 1  # nanoseconds
+        if np.issubdtype(values.dtype, np.integer):
+            return values.astype(np.int64) * factor
+        return np.round(values.astype(np.float64) * factor).astype(np.int64)
+
+    def from_strings(self, column: pd.Series) -> np.ndarray:
+        strings = column.astype(str)
+        self.format = self.detect_format(strings.iloc[:self.sample_size])
+        epoch = self.from_fixed_width(strings) if self.format is not None else None
+        if epoch is None:
+            epoch = np.full(len(strings), NAT, dtype=np.int64)
+        elif self.format is not None:
+            epoch = self.replace_years(epoch)
+        failed = epoch == NAT
+        aware = np.zeros(len(strings), dtype=bool)  # rows with a time zone, not in local time
+        if failed.any():
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")  # pandas warns when it has to infer the format
+                    parsed = pd.to_datetime(strings[failed], format=self.format, errors="coerce")
+                aware[failed] = parsed.dt.tz is not None
+                values = self.to_epoch(parsed)
+                epoch[failed] = self.replace_years(values) if self.format is not None and parsed.dt.tz is None \
+                    else values
+            except (ValueError, TypeError):  # mixed time zones, rows are parsed one by one
+                pass
+        naive = (epoch != NAT) & ~aware
+        epoch[naive] = self.to_local(epoch[naive])
+        failed = np.flatnonzero(epoch == NAT)
+        self.fallback_count = len(failed)
+        if self.fallback_count > 0:
+            logging.log(logging.INFO, "{} timestamps did not match format {}, parsing them one by one".format(
+                self.fallback_count, self.format))
+            for position in failed:
+                epoch[position] = self.parse_one(column.iloc[position])
+        return epoch
+
+    def from_fixed_width(self, strings: pd.Series) -> np.ndarray:
+        """
+        Fast path for formats only made of fixed width numeric fields (such as %d/%m/%Y %H:%M:%S). Strings are viewed
+        as a matrix of bytes and every field is read at once for the whole column.
+        :param strings: pandas Series,
+            the timestamp column, as str
+        :return: numpy array,
+            epoch values in nanoseconds, NAT for rows that do not follow the format. None if the format is not
+            supported.
+        """
+        fields = []  # (field, start, width)
+        literals = []  # (position, character)
+        width = 0
+        i = 0
+        while i < len(self.format):
+            if self.format[i] == "%":
+                if self.format[i:i + 2] not in FIXED_WIDTH_DIRECTIVES:
+                    return None
+                field, field_width = FIXED_WIDTH_DIRECTIVES[self.format[i:i + 2]]
+                fields.append((field, width, field_width))
+                width += field_width
+                i += 2
+            else:
+                if ord(self.format[i]) > 127:
+                    return None
+                literals.append((width, ord(self.format[i])))
+                width += 1
+                i += 1
+        try:
+            raw = strings.to_numpy(dtype=str).astype("S{}".format(width))
+        except UnicodeEncodeError:
+            return None
+        matrix = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, width)
+        valid = strings.str.len().to_numpy() == width
+        for position, character in literals:
+            valid &= matrix[:, position] == character
+        components = {"year": 1900, "month": 1, "day": 1}  # same defaults as datetime.strptime
+        for field, start, field_width in fields:
+            digits = matrix[:, start:start + field_width].astype(np.int64) - ord("0")
+            valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+            components[field] = digits @ (10 ** np.arange(field_width - 1, -1, -1))
+            if field_width == 2 and field == "year":  # same pivot as datetime.strptime
+                components[field] = np.where(components[field] < 69, 2000, 1900) + components[field]
+        epoch = np.full(len(strings), NAT, dtype=np.int64)
+        if valid.any():
+            components = pd.DataFrame({k: np.broadcast_to(v, len(strings))[valid] for k, v in components.items()})
+            epoch[valid] = self.to_epoch(pd.to_datetime(components, errors="coerce"))
+        return epoch
+
+    def detect_format(self, sample: pd.Series) -> str:
+        """
+        Return the first format matching every value of the sample, None if no format matches.
+        """
+        for f in self.formats:
+            parsed = pd.to_datetime(sample, format=f, errors="coerce")
+            if parsed.notna().all():
+                return f
+        return None
+
+    def parse_one(self, d) -> int:
+        """
+        Slow path, parse a single timestamp by trying every format, then dateutil.
+        :param d: str,
+            date to convert
+        :return: int,
+            epoch value in nanoseconds
+        """
+        date = None
+        for f in self.formats:
+            try:
+                date = datetime.strptime(str(d), f)
+                if date.year <= 1970:  # see replace_years
+                    date = date.replace(year=1971)
+                    ErrorManager.getInstance().datetime_replacement_warning()
+                break
+            except ValueError:
+                date = None
+        if date is None:
+            try:
+                date = parse(str(d))
+            except (ParserError, OverflowError):
+                raise ValueError("No format found for this timestamp: {}".format(d))
+        value = pd.Timestamp(date).value
+        return value if date.tzinfo is not None else value - self.get_offset(value)  # naive timestamps in local time
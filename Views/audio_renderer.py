@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from Utils import m_fluidsynth
+from Utils.constants import RENDER_BLOCK, RENDER_TAIL, RENDER_PROGRESS_PERIOD, STEM_CHUNK, STEM_QUEUE, MIX_BLOCK
+
+# frame: sample the event happens at, on: True for note on, False for note off
+EVENT_DTYPE = np.dtype([('frame', np.int64), ('on', np.bool_), ('channel', np.int16), ('value', np.int16),
+                        ('velocity', np.int16)])
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def to_events(notes: np.ndarray, timings: np.ndarray, samplerate: int) -> np.ndarray:
+    """
+    :param notes: numpy array of NOTE_DTYPE
+    :param timings: numpy array, start of each note in ms
+    :return: numpy array of EVENT_DTYPE, note on and note off of each note that is not void
+    """
+    audible = ~notes["void"]
+    notes, timings = notes[audible], timings[audible]
+    events = np.empty(2 * len(notes), dtype=EVENT_DTYPE)
+    starts = timings * samplerate // 1000
+    events["frame"][:len(notes)] = starts
+    events["frame"][len(notes):] = starts + np.maximum(1, notes["duration"] * samplerate // 1000)
+    events["on"][:len(notes)] = True
+    events["on"][len(notes):] = False
+    for name in ("channel", "value", "velocity"):
+        events[name][:len(notes)] = notes[name]
+        events[name][len(notes):] = notes[name]
+    return events
+
+
+def sort_events(events: np.ndarray) -> np.ndarray:
+    return events[np.lexsort((events["on"], events["frame"]))]  # note off first on a same frame
+
+
+class AudioRenderer:
+    """
+    Offline counterpart of MusicView: render notes to a wav file with a synth that has no audio driver, as fast as the
+    synth can go. Notes are turned into note on and note off events, applied between calls to fluid_synth_write_s16,
+    and samples are written to the file by blocks of RENDER_BLOCK frames, so that memory does not depend on the length
+    of the music.
+    """
+
+    def __init__(self, gain: float = 0.2, samplerate: int = 44100):
+        """
+            gain        : float,
+                        global gain of the synth, as synth.gain
+            samplerate  : int,
+                        sample rate of the wav file, in Hz
+        """
+        self.samplerate = samplerate
+        self.synth = m_fluidsynth.Synth(gain=gain, samplerate=samplerate)  # never started, no audio driver
+        self.block = np.zeros(RENDER_BLOCK * 2, dtype=np.int16)  # interleaved stereo samples
+        self.fill = 0  # frames of block already rendered
+        self.position = 0  # frames rendered since the beginning
+        self.total = 1  # frames expected, for progress
+        self.wav = None
+        self.progress = None
+        self.cancelled = None
+        self.lastProgress = 0
+
+    def load_tracks(self, tracks: dict) -> None:
+        """
+        Assign soundfonts and gains of tracks to channels, as MusicCtrl.load_soundfonts and change_local_gain do.
+        :param tracks: dict, track id -> Track
+        """
+        for track in tracks.values():
+            soundfont_fid = self.synth.sfload(track.soundfont)
+            self.synth.program_select(track.id, soundfont_fid, 0, 0)
+            self.synth.cc(track.id, 7, int(track.gain * 1.27))  # 7 volume command, accepting value between 1-127
+
+    def render(self, batches, timings, filename: str, duration: float, progress=None, cancelled=None) -> bool:
+        """
+        Render the notes of a music to a wav file.
+        :param batches: iterable of numpy arrays of NOTE_DTYPE, batches of notes sorted by tfactor, in order of time
+        :param timings: callable, start in ms of each note of a batch from their tfactor
+        :param filename: str, wav file to write, removed if rendering is cancelled
+        :param duration: float, length of the music in s, used for progress
+        :param progress: callable, called at most every RENDER_PROGRESS_PERIOD s with the rendered fraction
+        :param cancelled: callable, rendering stops as soon as it returns True
+        :return: True if the music was rendered, False if it was cancelled
+        """
+        self.progress = progress
+        self.cancelled = cancelled
+        self.fill = 0
+        self.position = 0
+        self.total = max(1, int((duration * 1000 + RENDER_TAIL) * self.samplerate / 1000))
+        self.lastProgress = time.perf_counter()
+        pending = np.empty(0, dtype=EVENT_DTYPE)
+        try:
+            with wave.open(filename, "wb") as self.wav:
+                self.wav.setnchannels(2)
+                self.wav.setsampwidth(2)
+                self.wav.setframerate(self.samplerate)
+                for notes in batches:
+                    if len(notes) == 0:
+                        continue
+                    events = to_events(notes, timings(notes["tfactor"]), self.samplerate)
+                    pending = sort_events(np.concatenate([pending, events]))
+                    # events before the first note of the batch can not be preceded by notes of the next batches
+                    ready = np.searchsorted(pending["frame"], events["frame"][events["on"]].min(), side="left") \
+                        if events["on"].any() else len(pending)
+                    self.apply(pending[:ready])
+                    pending = pending[ready:]
+                self.apply(pending)
+                self.render_until(self.position + RENDER_TAIL * self.samplerate // 1000)
+                self.flush()
+        except RenderCancelled:
+            self.synth.all_sounds_off()
+            self.wav = None
+            logging.log(logging.INFO, "Rendering of {} cancelled".format(filename))
+            return False
+        finally:
+            self.synth.system_reset()
+        self.wav = None
+        logging.log(logging.INFO, "Rendered {} frames to {}".format(self.position, filename))
+        return True
+
+    def apply(self, events: np.ndarray) -> None:
+        for frame, on, channel, value, velocity in events.tolist():
+            self.render_until(frame)  # events late because of unordered batches are applied right away
+            if on:
+                self.synth.noteon(channel, value, velocity)
+            else:
+                self.synth.noteoff(channel, value)
+
+    def render_until(self, frame: int) -> None:
+        while self.position < frame:
+            n = min(frame - self.position, RENDER_BLOCK - self.fill)
+            self.synth.write_s16(self.block.ctypes.data, self.fill, n)
+            self.fill += n
+            self.position += n
+            if self.fill == RENDER_BLOCK:
+                self.flush()
+
+    def flush(self) -> None:
+        self.wav.writeframes(self.block[:self.fill * 2].tobytes())
+        self.fill = 0
+        if self.cancelled is not None and self.cancelled():
+            raise RenderCancelled()
+        if self.progress is not None and time.perf_counter() - self.lastProgress >= RENDER_PROGRESS_PERIOD:
+            self.lastProgress = time.perf_counter()
+            self.progress(min(1.0, self.position / self.total))
+
+    def delete(self) -> None:
+        self.synth.delete()
+
+
+class Stem:
+    """
+    Track rendered by a stem worker into a raw file of interleaved stereo float32 samples, with its own synth set up
+    as AudioRenderer sets up its single synth, so that the stems sum up to the same music. Events arrive by chunks, see
+    StemRenderer.
+    """
+
+    def __init__(self, index: int, soundfont: str, channel: int, volume: int, path: str, gain: float, samplerate: int,
+                 positions, cancelled):
+        """
+            volume      : int,
+                        cc 7 volume of the channel, from the gain of the track as in AudioRenderer.load_tracks
+            gain        : float,
+                        global gain of the synth, as synth.gain
+            positions   : multiprocessing Array,
+                        frames rendered by each stem, for progress
+            cancelled   : multiprocessing Event,
+                        set by the parent process to stop rendering
+        """
+        self.index = index
+        self.positions = positions
+        self.cancelled = cancelled
+        self.synth = m_fluidsynth.Synth(gain=gain, samplerate=samplerate)
+        self.synth.program_select(channel, self.synth.sfload(soundfont), 0, 0)
+        self.synth.cc(channel, 7, volume)
+        self.file = open(path, "wb")
+        self.buffer = np.zeros((STEM_CHUNK, 2), dtype=np.float32)
+        self.position = 0
+        self.pending = np.empty(0, dtype=EVENT_DTYPE)
+
+    def add_events(self, events: np.ndarray) -> None:
+        """
+        Apply the events that can not be preceded by events of the next chunks, as AudioRenderer.render does.
+        """
+        self.pending = sort_events(np.concatenate([self.pending, events]))
+        ready = np.searchsorted(self.pending["frame"], events["frame"][events["on"]].min(), side="left") \
+            if events["on"].any() else len(self.pending)
+        self.apply(self.pending[:ready])
+        self.pending = self.pending[ready:]
+
+    def apply(self, events: np.ndarray) -> None:
+        for frame, on, channel, value, velocity in events.tolist():
+            self.render_until(frame)
+            if on:
+                self.synth.noteon(channel, value, velocity)
+            else:
+                self.synth.noteoff(channel, value)
+
+    def render_until(self, frame: int) -> None:
+        while self.position < frame:
+            n = min(frame - self.position, STEM_CHUNK)
+            self.synth.write_float(self.buffer.ctypes.data, n)
+            self.file.write(self.buffer[:n].tobytes())
+            self.position += n
+            self.positions[self.index] = self.position
+            if self.cancelled.is_set():
+                raise RenderCancelled()
+
+    def finish(self, frames: int) -> None:
+        self.apply(self.pending)
+        self.render_until(frames)
+        self.file.close()
+
+    def delete(self) -> None:
+        self.file.close()
+        self.synth.delete()
+
+
+def render_stem_worker(jobs: list, messages, results, positions, cancelled, directory: str, gain: float,
+                       samplerate: int) -> None:
+    """
+    Worker process of StemRenderer, rendering a group of tracks into <directory>/<index>.f32.
+    :param jobs: list of (index, soundfont, channel, volume), the tracks of the worker
+    :param messages: multiprocessing Queue of (index, events) chunks, ended by (None, frames), the length of the music
+    :param results: multiprocessing Queue, receives None when the worker is done, or the error that stopped it
+    """
+    stems = {}
+    try:
+        for index, soundfont, channel, volume in jobs:
+            stems[index] = Stem(index, soundfont, channel, volume, os.path.join(directory, "{}.f32".format(index)),
+                                gain, samplerate, positions, cancelled)
+        while True:
+            index, data = messages.get()
+            if index is None:
+                for stem in stems.values():
+                    stem.finish(data)
+                break
+            stems[index].add_events(data)
+        results.put(None)
+    except RenderCancelled:
+        results.put(None)
+    except Exception as e:
+        results.put("{}: {}".format(type(e).__name__, e))
+    finally:
+        for stem in stems.values():
+            stem.delete()
+
+
+class StemRenderer:
+    """
+    Render each track with its own synth into a stem, in parallel processes, then sum the stems. Gains are applied by
+    the synths as in AudioRenderer, so that the mix matches its output. Scales with the number of cores when there are
+    several tracks, and can also write each stem to its own wav file. Notes are sent to the workers by chunks as batches are generated, so that memory does
+    not depend on the length of the music.
+    """
+
+    def __init__(self, gain: float = 0.2, samplerate: int = 44100, processes: int = None):
+        """
+            gain        : float,
+                        global gain, as synth.gain
+            samplerate  : int,
+                        sample rate of the wav files, in Hz
+            processes   : int,
+                        worker processes, one per core by default
+        """
+        self.gain = gain
+        self.samplerate = samplerate
+        self.processes = processes or os.cpu_count() or 1
+        self.workers = []
+        self.results = None
+        self.done = 0  # workers done
+        self.progress = None
+        self.cancelled = None
+        self.lastProgress = 0
+
+    def render(self, batches, timings, tracks: dict, filename: str, duration: float, stems: bool = False,
+               progress=None, cancelled=None) -> bool:
+        """
+        Render the notes of a music to a wav file, see AudioRenderer.render.
+        :param tracks: dict, track id -> Track
+        :param stems: bool, if True also write the stem of each track, to <filename>-<track id>.wav
+        :return: True if the music was rendered, False if it was cancelled
+        """
+        self.progress = progress or (lambda p: None)
+        self.cancelled = cancelled or (lambda: False)
+        self.lastProgress = time.perf_counter()
+        tracks = list(tracks.values())
+        groups = min(self.processes, len(tracks))
+        ctx = multiprocessing.get_context("spawn")  # the interface process is multithreaded, forking it is unsafe
+        positions = ctx.Array("q", len(tracks), lock=False)
+        stop = ctx.Event()
+        queues = [ctx.Queue(STEM_QUEUE) for _ in range(groups)]
+        self.results = ctx.Queue()
+        self.done = 0
+        total = max(1, int((duration * 1000 + RENDER_TAIL) * self.samplerate / 1000))  # frames expected
+        with tempfile.TemporaryDirectory(prefix="soda_stems_") as directory:
+            self.workers = [ctx.Process(target=render_stem_worker, daemon=True, name="Stem_worker_{}".format(g),
+                                        args=([(i, t.soundfont, t.id, int(t.gain * 1.27))  # as AudioRenderer
+                                               for i, t in enumerate(tracks) if i % groups == g],
+                                              queues[g], self.results, positions, stop, directory, self.gain,
+                                              self.samplerate))
+                            for g in range(groups)]
+            try:
+                for worker in self.workers:
+                    worker.start()
+                indexes = {t.id: i for i, t in enumerate(tracks)}
+                last = 0  # last frame of the events sent
+                for notes in batches:
+                    for channel in np.unique(notes["channel"]).tolist():
+                        if channel in indexes:
+                            selected = notes[notes["channel"] == channel]
+                            events = to_events(selected, timings(selected["tfactor"]), self.samplerate)
+                            if len(events) > 0:
+                                last = max(last, int(events["frame"].max()))
+                                self.send(queues[indexes[channel] % groups], (indexes[channel], sort_events(events)),
+                                          positions, len(tracks) * max(total, last))
+                frames = last + RENDER_TAIL * self.samplerate // 1000
+                for messages in queues:
+                    self.send(messages, (None, frames), positions, len(tracks) * frames)
+                while self.done < groups:
+                    self.wait(positions, len(tracks) * frames)
+                self.mixdown([os.path.join(directory, "{}.f32".format(i)) for i in range(len(tracks))], filename, ["{}-{}.wav".format(os.path.splitext(filename)[0], t.id) for t in tracks]
+                             if stems else None, frames)
+            except RenderCancelled:
+                stop.set()
+                logging.log(logging.INFO, "Rendering of {} cancelled".format(filename))
+                return False
+            finally:
+                for worker in self.workers:
+                    worker.join(RENDER_PROGRESS_PERIOD)
+                    if worker.is_alive():
+                        worker.terminate()
+                        worker.join()
+                self.workers = []
+        logging.log(logging.INFO, "Rendered {} stems of {} frames to {}".format(len(tracks), frames, filename))
+        return True
+
+    def send(self, messages, message, positions, total: int) -> None:
+        """
+        Queue a message for a worker, waiting while its queue is full.
+        """
+        while True:
+            if self.cancelled():
+                raise RenderCancelled()
+            try:
+                messages.put(message, timeout=RENDER_PROGRESS_PERIOD)
+                return
+            except queue.Full:
+                self.wait(positions, total, 0)
+
+    def wait(self, positions, total: int, timeout: float = RENDER_PROGRESS_PERIOD) -> None:
+        """
+        Collect the results of workers, raising their errors, and report their progress.
+        :param total: int, frames of every stem together
+        """
+        try:
+            error = self.results.get(timeout=timeout) if timeout > 0 else self.results.get_nowait()
+            if error is not None:
+                raise RuntimeError("Stem rendering failed: {}".format(error))
+            self.done += 1
+        except queue.Empty:
+            if self.cancelled():
+                raise RenderCancelled()
+            if any(not worker.is_alive() and worker.exitcode != 0 for worker in self.workers):
+                raise RuntimeError("A stem worker stopped unexpectedly")
+        self.report(0.9 * sum(positions) / max(1, total))
+
+    def report(self, fraction: float) -> None:
+        if time.perf_counter() - self.lastProgress >= RENDER_PROGRESS_PERIOD:
+            self.lastProgress = time.perf_counter()
+            self.progress(min(1.0, fraction))
+
+    def mixdown(self, paths: [str], filename: str, stem_filenames: [str], frames: int) -> None:
+        """
+        Sum the stems into a 16 bits wav file, MIX_BLOCK frames at a time.
+        :param stem_filenames: list of str, wav file of each stem, None to write only the mix
+        """
+        stems = [np.memmap(path, dtype=np.float32, mode="r", shape=(frames, 2)) for path in paths]
+        outputs = [wave.open(name, "wb") for name in [filename] + (stem_filenames or [])]
+        try:
+            for output in outputs:
+                output.setnchannels(2)
+                output.setsampwidth(2)
+                output.setframerate(self.samplerate)
+            for start in range(0, frames, MIX_BLOCK):
+                if self.cancelled():
+                    raise RenderCancelled()
+                block = np.stack([stem[start:start + MIX_BLOCK] for stem in stems])  # (stems, frames, 2)
+                channels = [block.sum(axis=0)] + (list(block) if stem_filenames else [])
+                for output, samples in zip(outputs, channels):
+                    output.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+                self.report(0.9 + 0.1 * min(frames, start + MIX_BLOCK) / max(1, frames))
+        finally:
+            for output in outputs:
+                output.close()
+            del stems  # release the memory maps before the stems are removed
@@ -3,14 +3,16 @@ from __future__ import annotations
 import logging
 import platform
 import threading
-import time
-from queue import Empty
+
+import numpy as np
 
 import Ctrls.music_controller as mctrl
 import Models.music_model as music
 # import fluidsynth as m_fluidsynth
-from Models.note_model import int_to_note, ANote
+from Models.note_model import int_to_note, to_tnotes, NOTE_DTYPE
 from Utils import m_fluidsynth
+from Utils.constants import SCHEDULER_RETRY
+from Utils.playback_stats import PlaybackStats
 
 
 class MusicView:
@@ -27,8 +29,16 @@ class MusicView:
 
         self.starting_time = None
         self.pause_start_time = None
-        self.consumer_thread = threading.Thread(target=self.consume, daemon=True, name="Note_consumer_thread")
-        self.consumer_thread.start()
+
+        # Scheduler, woken up by the sequencer to send the notes of the look-ahead window
+        self.schedulerClient = self.sequencer.register_client("soda_scheduler", self.on_timer)
+        self.schedulerLock = threading.RLock()
+        self.scheduling = False
+        self.pending = np.empty(0, dtype=NOTE_DTYPE)  # notes taken from the queue, not yet sent
+        self.sent = np.empty(0, dtype=NOTE_DTYPE)  # notes sent to the sequencer, possibly not played yet
+        self.sentTicks = np.empty(0, dtype=np.int64)
+        self.prevNoteId = 0
+        self.stats = PlaybackStats()  # timing of the notes sent, logged at stop
 
         logging.log(logging.INFO, "platform {} detected ".format(platform.system()))
 
@@ -47,7 +57,9 @@ class MusicView:
 
     def save_play_time(self) -> None:
         if (not self.ctrl.playing):  # If we are starting a new music, register the starting time
-            self.starting_time = self.sequencer.get_tick()
+            self.stats.reset()
+            self.starting_time = int(self.sequencer.get_tick() -
+                                     self.ctrl.startTfactor * self.model.settings.get_music_duration() * 1000)
             logging.log(logging.INFO, "started playing from origin: {}".format(self.starting_time))
         elif (self.ctrl.paused):  # If the model was paused, increment starting time by pause time
             paused_time = self.sequencer.get_tick() - self.pause_start_time
@@ -60,83 +72,122 @@ class MusicView:
         self.pause_start_time = self.sequencer.get_tick()  # Register when the pause button was pressed
         logging.log(logging.INFO, "pausing at : {}".format(self.pause_start_time))
 
-    def TNote_to_ANote(self, n):
-        print(n)
-        abs = self.model.get_absolute_note_timing(n.tfactor)
-        return ANote(timing=self.get_relative_note_timing(abs), tfactor=n.tfactor, channel=n.channel, value=n.value,
-                     velocity=n.velocity, duration=n.duration, void=n.void, id=n.id)
-
-    def dummy(self, row):
-        return 0
-
-    def play_dataframe(self):
-        for notes in self.model.tracks_note.values():
-            print(notes)
-            timed_notes = notes.apply(lambda x: self.TNote_to_ANote(x), axis=1)
-            print(timed_notes)
-            for idx, note in timed_notes.iteritems():
-                self.sequencer.note(absolute=False, time=int(note.timing), channel=note.channel, key=note.value,
-                                    duration=note.duration, velocity=note.velocity, dest=self.registeredSynth)
-
     def play_note(self, note):
         self.sequencer.note(absolute=True, time=0, channel=note.channel, key=note.value,
                             duration=note.duration, velocity=note.velocity, dest=self.registeredSynth)
 
-    def consume(self) -> None:  # TODO test if 3.11 is faster.
+    def start_scheduling(self) -> None:
+        """
+        Start sending notes to the sequencer, from the start of the music or after a pause.
+        """
+        with self.schedulerLock:
+            self.scheduling = True
+            self.refill()
+
+    def suspend_scheduling(self, flush: bool = False) -> None:
+        """
+        Stop sending notes and remove the notes already sent but not played yet. They are sent again when scheduling
+        restarts, unless flushed.
+        :param flush: bool,
+            True to forget every note taken from the queue, e.g. when the music is stopped
+        """
+        with self.schedulerLock:
+            self.scheduling = False
+            self.sequencer.remove_events(dest=self.schedulerClient)  # pending timer
+            self.sequencer.remove_events(dest=self.registeredSynth)  # notes and their note off
+            self.synth.all_notes_off()
+            self.model.sonification_view.uiScheduler.cancel(self.push_row)  # rows of the notes removed
+            if flush:
+                self.pending = np.empty(0, dtype=NOTE_DTYPE)
+                self.prevNoteId = 0
+            else:
+                unplayed = self.sentTicks > self.sequencer.get_tick()
+                self.pending = np.concatenate([self.sent[unplayed], self.pending])
+                played = self.sent[~unplayed]
+                self.prevNoteId = int(played["id"][-1]) if len(played) > 0 else 0  # rows are pushed again on play
+            self.sent = np.empty(0, dtype=NOTE_DTYPE)
+            self.sentTicks = np.empty(0, dtype=np.int64)
+
+    def on_timer(self, tick, event, sequencer, data) -> None:
+        """
+        Sequencer callback, called from fluidsynth's thread at the tick of the timer event sent by refill.
+        fluidsynth holds the sequencer lock during callbacks: if scheduling is being started or suspended, which needs
+        that lock, the timer is simply dropped, as a new one is sent when scheduling restarts.
+        """
+        if not self.schedulerLock.acquire(blocking=False):
+            return
+        try:
+            if self.scheduling:
+                self.refill()
+        except Exception as e:
+            logging.log(logging.ERROR, "Exception while scheduling notes: {}".format(e))
+        finally:
+            self.schedulerLock.release()
+
+    def refill(self) -> None:
+        """
+        Send to the sequencer, in absolute ticks, every note to be played within the look-ahead window
+        (settings.timeBuffer ms), then send a timer event to be woken up at half the window, or sooner if the queue
+        could not fill the window.
+        Must be called with schedulerLock held.
+        """
+        now = self.sequencer.get_tick()
+        horizon = now + self.model.settings.timeBuffer
+        played = self.sentTicks <= now
+        self.sent = self.sent[~played]
+        self.sentTicks = self.sentTicks[~played]
+        while True:
+            if len(self.pending) == 0:
+                self.pending = self.model.notes.get(self.model.data.batch_size, timeout=0)
+                if len(self.pending) == 0:
+                    break
+            ticks = (self.starting_time + self.model.get_absolute_note_timings(self.pending["tfactor"])).astype(np.int64)
+            ripe = np.argmax(ticks > horizon) if (ticks > horizon).any() else len(ticks)  # notes are in order
+            self.send(self.pending[:ripe], ticks[:ripe], now)
+            self.pending = self.pending[ripe:]
+            if len(self.pending) > 0:
+                break
+        if self.ctrl.finished and len(self.pending) == 0 and len(self.sent) == 0 and self.model.notes.empty():
+            self.scheduling = False
+            self.model.sonification_view.uiScheduler.call_soon(self.end_music)
+        else:
+            period = SCHEDULER_RETRY if len(self.pending) == 0 else max(1, self.model.settings.timeBuffer // 2)
+            self.sequencer.timer(now + period, dest=self.schedulerClient)
+
+    def send(self, notes: np.ndarray, ticks: np.ndarray, now: int) -> None:
         """
-        Threaded.
-        Consume notes generated by music_model and feed them to the sequencer at regular interval.
+        Send notes to the synth through the sequencer. Notes more than 100ms late are skipped.
         """
-        prev_note_idx = 0
-        while True:  # This thread never stops.
-            if (self.ctrl.finished and self.model.notes.empty()):
-                self.model.sonification_view.topBarView.press_stop_button()
-                logging.log(logging.INFO,
-                            "Music ended after {} secs".format(self.model.settings.get_music_duration()), )
-                self.model.sonification_view.set_status_text(
-                    "Music ended after {} secs".format(self.model.settings.get_music_duration()), 10000)
-                time.sleep(0.1)
-            self.ctrl.playingEvent.wait()  # Wait for the playing event
-            self.ctrl.pausedEvent.wait()  # Wait for the playing event
-            self.ctrl.fullSemaphore.acquire()  # Wait for the queue to have at least 1 note
-            self.ctrl.queueSemaphore.acquire()  # Check if the queue is free
-            try:
-                note = self.model.notes.get_nowait()
-                self.ctrl.queueSemaphore.release()  # Release queue
-                self.ctrl.emptySemaphore.release()  # Inform producer that there is room in the queue
-                # relative timing: how many ms a note has to wait before it can be played.
-                # i.e. in how many ms should this note be played
-                note_timing_abs = self.model.get_absolute_note_timing(note.tfactor)
-                note_timing = self.get_relative_note_timing(note_timing_abs)  # update timing
-                if (not note.void):
-                    while (note_timing > self.model.settings.timeBuffer and  # check if next note is ripe
-                           not self.ctrl.skipNextNote and  # check if next note should be skipped
-                           note_timing > -100 and self.ctrl.playing):  # Check if the note is not stale
-                        time.sleep(self.model.settings.timeBuffer / 2000)  # wait half the buffer time
-                        self.ctrl.pausedEvent.wait()  # If paused was pressed during this waiting time, wait for PLAY event
-                        note_timing = self.get_relative_note_timing(note_timing_abs)  # update timing
-
-                    if (self.ctrl.playing and note_timing > -100 and not self.ctrl.skipNextNote):
-                        # log_line = self.write_log_line(note, track_log_str, note_timing, note_timing_abs, prev_note_idx)
-                        self.sequencer.note(absolute=False, time=int(note_timing), channel=note.channel, key=note.value,
-                                            duration=note.duration, velocity=note.velocity, dest=self.registeredSynth)
-                    else:
-                        self.ctrl.skipNextNote = False  # Once the note is skipped, don't skip the next ones
-                        log_line = "SKIPPED Note [track={}, value={}, vel={}, dur={}, timing abs={}] at t={}, data row #{} planned scheduled in {}ms. {} notes remaining".format(
-                            note.channel, int_to_note(note.value), note.velocity, note.duration, note_timing_abs,
-                            self.sequencer.get_tick(), note.id, note_timing, self.model.notes.qsize())
-                        logging.log(logging.INFO, log_line)
-                if (prev_note_idx != note.id):
-                    threading.Thread(
-                        target=self.model.sonification_view.tableView.currentDataModel.push_row_to_data_frame,
-                        args=[note_timing],
-                        daemon=True).start()
-                prev_note_idx = note.id
-
-            except Empty:
-                logging.log(logging.ERROR, "Empty notes queue")
-                self.ctrl.queueSemaphore.release()  # Release semaphores
-                self.ctrl.emptySemaphore.release()
+        timings = ticks - now
+        audible = ~notes["void"]
+        stale = audible & (timings <= -100)
+        played = audible & ~stale
+        self.stats.record(notes["channel"][audible], ticks[audible], now, stale[audible])
+        self.sequencer.notes(np.maximum(ticks[played], now), notes["channel"][played], notes["value"][played],
+                             notes["velocity"][played], notes["duration"][played], dest=self.registeredSynth)
+        for note, tick in zip(to_tnotes(notes[stale]), ticks[stale].tolist()):
+            log_line = "SKIPPED Note [track={}, value={}, vel={}, dur={}, timing abs={}] at t={}, data row #{} planned scheduled in {}ms. {} notes remaining".format(
+                note.channel, int_to_note(note.value), note.velocity, note.duration, tick - self.starting_time,
+                now, note.id, tick - now, len(self.model.notes))
+            logging.log(logging.INFO, log_line)
+        ui_scheduler = self.model.sonification_view.uiScheduler
+        for note_id, tick in zip(notes["id"].tolist(), ticks.tolist()):
+            if (self.prevNoteId != note_id):  # first note of a row, show the row in the table when played
+                ui_scheduler.schedule(tick, self.push_row)
+            self.prevNoteId = note_id
+        self.sent = np.concatenate([self.sent, notes])
+        self.sentTicks = np.concatenate([self.sentTicks, ticks])
+
+    def push_row(self) -> None:
+        if self.ctrl.playing:
+            self.model.sonification_view.tableView.currentDataModel.push_row_to_data_frame()
+
+    def end_music(self) -> None:
+        self.model.sonification_view.topBarView.press_stop_button()
+        logging.log(logging.INFO,
+                    "Music ended after {} secs".format(self.model.settings.get_music_duration()), )
+        self.model.sonification_view.set_status_text(
+            "Music ended after {} secs".format(self.model.settings.get_music_duration()), 10000)
 
     def get_relative_note_timing(self, note_timing_absolute: float) -> int:
         """
@@ -148,7 +148,7 @@ class AdvancedTrackView(object):
         self.model.ctrl.set_value(value=ebox.valueLine.text(), variable=ebox.checkbox.text())
 
     def set_qualitative_filter(self, ebox):
-        self.model.filter.assign_quali_value(ebox.checkbox.text(), not ebox.checkbox.isChecked())
+        self.model.ctrl.assign_quali_value(ebox.checkbox.text(), not ebox.checkbox.isChecked())
 
     def play_test_sound(self, ebox):
         value = self.track.pencodings["value"].get_parameter_from_variable(ebox.checkbox.text())
@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-import threading
-import time
 from collections import deque
 
 import matplotlib as mpl
@@ -16,7 +14,17 @@ import ViewsPyQT5.sonification_view as sv
 from Models.music_model import Music
 
 
+# Notes of the piano roll, start and end in ms of music time
+GRAPH_NOTE_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('channel', np.int16), ('value', np.int16),
+                             ('velocity', np.int16)])
+
+
 class GraphView():
+    """
+    Scrolling piano roll of the notes around the current position of the music. The image is kept between frames: each
+    frame shifts it by the time elapsed, rasterizes only the notes of the columns that appeared on the right, and blits
+    it over the background of the axes.
+    """
 
     def __init__(self, parent: sv.SonificationView):
         self.parent = parent
@@ -35,7 +43,11 @@ class GraphView():
         self.timeWindow = self.music_model.settings.graphicalLength
         self.lookBackward = self.music_model.settings.graphicalBarPercentage  # % of graph dedicated to past notes
         self.movingBarPos = int(self.lookBackward * self.horizontalRes)
-        self.futureNotes = deque()
+        self.futureNotes = deque()  # arrays of NOTE_DTYPE added by the producer, not yet merged into notes
+        self.notes = np.empty(0, dtype=GRAPH_NOTE_DTYPE)  # sorted by start, notes before the graph are dropped
+        self.image = np.zeros((self.verticalRes, self.horizontalRes))
+        self.origin = None  # ms of music time of the first column of image divided by ms per column, None to redraw
+        self.background = None
         self.maxNotes = None
         self.line = None
         self.timeStep = None
@@ -45,15 +57,14 @@ class GraphView():
         self.setup_canvas()
         self.layout.addWidget(self.dynamic_canvas)
 
-        self.movingGraphThread = threading.Thread(target=self.moving_canvas, daemon=True,
-                                                  name="graphical_canvas_moving_thread")
-        self.movingGraphThread.start()
+        self.parent.uiScheduler.repeat(self.updateFrequency, self.moving_canvas)
 
     def setup_canvas(self):
         self.figure = Figure(figsize=(5, 4), dpi=100)
         self.ax = self.figure.add_subplot()
-        data = np.zeros((self.verticalRes, self.horizontalRes))
-        self.line = self.ax.pcolormesh(data, cmap=self.colormap, rasterized=True, vmin=0, vmax=100)
+        self.line = self.ax.imshow(self.image, cmap=self.colormap, vmin=0, vmax=100, origin="lower", aspect="auto",
+                                   interpolation="nearest", extent=(0, self.horizontalRes, 0, self.verticalRes),
+                                   animated=True)
         self.colorbar = self.figure.colorbar(self.line, ax=self.ax)
         self.ax.set_ylabel("Midi note (Midi Tuning Standard, Hz)")
         self.ax.set_xlabel("Time (seconds)")
@@ -64,7 +75,7 @@ class GraphView():
         xticks = np.arange(0, 1100, 200)
         self.ax.set_xticks(xticks, xlabels)
         # self.ax.set_xticklabels(xlabels)
-        self.movingBar = self.ax.axvline(x=self.movingBarPos, color="darkred")
+        self.movingBar = self.ax.axvline(x=self.movingBarPos, color="darkred", animated=True)
         self.colorbar.ax.set_xlabel("Volume")
 
         self.figure.subplots_adjust(
@@ -78,42 +89,105 @@ class GraphView():
 
         self.dynamic_canvas = FigureCanvas(self.figure)  # A tk.DrawingArea.
         self.dynamic_canvas.setMinimumSize(QSize(720, 300))
-
-    def draw_notes(self):
-        data = np.zeros((self.verticalRes, self.horizontalRes))
-        past_notes = []
+        self.background = None
+        self.dynamic_canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, event):
+        """
+        Save the axes without the notes after each full draw (e.g. on resize), to blit the notes over it.
+        """
+        self.background = self.dynamic_canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.movingBar)
+
+    def blit(self):
+        if self.background is None:
+            self.dynamic_canvas.draw()  # the draw event saves the background
+            return
+        self.line.set_data(self.image)
+        self.dynamic_canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.movingBar)
+        self.dynamic_canvas.blit(self.ax.bbox)
+
+    def merge_notes(self) -> np.ndarray:
+        """
+        Add the notes produced since last frame to notes, keeping them sorted by start.
+        :return: numpy array of GRAPH_NOTE_DTYPE, the notes added, sorted by start
+        """
         self.parent.model.ctrl.graphSemaphore.acquire()
-        for note in self.futureNotes:
-            # time is seconds telling when the note will be played
-            start_time = -self.startx + note.tfactor * self.parent.model.settings.get_music_duration() - self.parent.model.ctrl.get_music_time()
-            note_timing = self.parent.model.ctrl.view.get_relative_note_timing(
-                self.parent.model.get_absolute_note_timing(note.tfactor))
-            if (0 < start_time <= self.timeWindow / 1000 and note_timing > self.startx * 1000 and not note.void):
-                end_pos = min(int(self.horizontalRes * (start_time * 1000 + note.duration) / self.timeWindow),
-                              self.horizontalRes)
-                start_pos = int(self.horizontalRes * (start_time * 1000) / self.timeWindow)
-                max_vertical_pos = max(0, note.value + 1)
-                min_vertical_pos = min(127, note.value - 1)
-                if (str(note.channel) in self.parent.model.tracks):  # check if tracks is not destroyed since
-                    gain = int(note.velocity * float(self.parent.model.tracks[str(note.channel)].gain) / 128)
-                    data[min_vertical_pos:max_vertical_pos, start_pos:end_pos] = gain
-            if (start_time < 0 or note_timing < self.startx * 1000):
-                past_notes.append(note)
-        for note in past_notes:
-            self.futureNotes.remove(note)
+        arrivals = list(self.futureNotes)
+        self.futureNotes.clear()
         self.parent.model.ctrl.graphSemaphore.release()
-        self.line.set_array(data)
-        self.line.figure.canvas.draw()
+        arrivals = [n[~n["void"]] for n in arrivals]
+        notes = np.empty(sum(len(n) for n in arrivals), dtype=GRAPH_NOTE_DTYPE)
+        if len(notes) == 0:
+            return notes
+        arrivals = np.concatenate(arrivals)
+        notes["start"] = self.parent.model.get_absolute_note_timings(arrivals["tfactor"])
+        notes["end"] = notes["start"] + arrivals["duration"]
+        for name in ("channel", "value", "velocity"):
+            notes[name] = arrivals[name]
+        notes = notes[np.argsort(notes["start"], kind="stable")]
+        if len(self.notes) > 0 and notes["start"][0] < self.notes["start"][-1]:  # batches overlapping in time
+            merged = np.concatenate([self.notes, notes])
+            self.notes = merged[np.argsort(merged["start"], kind="stable")]
+        else:
+            self.notes = np.concatenate([self.notes, notes])
+        return notes
+
+    def rasterize(self, first: int, last: int, notes: np.ndarray = None):
+        """
+        Draw notes between two columns of image.
+        :param first: int, first column, included
+        :param last: int, last column, excluded
+        :param notes: numpy array of GRAPH_NOTE_DTYPE sorted by start, self.notes by default
+        """
+        notes = self.notes if notes is None else notes
+        ms_per_column = self.timeWindow / self.horizontalRes
+        start, end = (self.origin + first) * ms_per_column, (self.origin + last) * ms_per_column
+        notes = notes[:np.searchsorted(notes["start"], end, side="left")]
+        notes = notes[notes["end"] > start]
+        if len(notes) == 0:
+            return
+        gains = {}
+        for channel in np.unique(notes["channel"]).tolist():
+            if str(channel) in self.parent.model.tracks:  # check if tracks is not destroyed since
+                gains[channel] = float(self.parent.model.tracks[str(channel)].gain) / 128
+        starts = np.maximum(np.floor(notes["start"] / ms_per_column).astype(np.int64) - self.origin, first)
+        ends = np.minimum(np.ceil(notes["end"] / ms_per_column).astype(np.int64) - self.origin, last)
+        for channel, value, velocity, s, e in zip(notes["channel"].tolist(), notes["value"].tolist(),
+                                                  notes["velocity"].tolist(), starts.tolist(), ends.tolist()):
+            if channel in gains:
+                self.image[min(127, max(0, value - 1)):max(0, value + 1), s:e] = int(velocity * gains[channel])
+
+    def draw_notes(self):
+        ms_per_column = self.timeWindow / self.horizontalRes
+        left = self.parent.model.ctrl.get_music_time() * 1000 - self.lookBackward * self.timeWindow
+        origin = int(np.floor(left / ms_per_column))
+        arrivals = self.merge_notes()
+        shift = None if self.origin is None else origin - self.origin
+        self.origin = origin
+        if shift is None or shift < 0 or shift >= self.horizontalRes:  # first frame or seek, draw everything
+            self.image[:] = 0
+            self.rasterize(0, self.horizontalRes)
+        else:
+            if shift > 0:
+                self.image[:, :-shift] = self.image[:, shift:]
+                self.image[:, -shift:] = 0
+                self.rasterize(self.horizontalRes - shift, self.horizontalRes)
+            if len(arrivals) > 0:  # notes produced after the columns they are in were drawn
+                self.rasterize(0, self.horizontalRes - shift, arrivals)
+        # notes started before the graph were drawn already, they are not needed for the next columns
+        self.notes = self.notes[np.searchsorted(self.notes["start"], origin * ms_per_column, side="left"):]
+        self.blit()
 
     def moving_canvas(self):
-        while (True):
-            self.parent.model.ctrl.playingEvent.wait()  # wait if we are stopped
-            self.parent.model.ctrl.pausedEvent.wait()  # wait if we are paused
+        if self.parent.model.ctrl.playing and not self.parent.model.ctrl.paused:
             try:
                 self.draw_notes()
             except:
                 pass
-            time.sleep(self.updateFrequency / 1000)
 
     def setup(self, max_notes, time_window, backward_percentage):
         self.timeWindow = time_window
@@ -121,18 +195,21 @@ class GraphView():
         self.movingBarPos = int(self.lookBackward * self.horizontalRes)
 
         self.layout.removeWidget(self.dynamic_canvas)
+        self.image = np.zeros((self.verticalRes, self.horizontalRes))
+        self.origin = None
         self.setup_canvas()
         self.layout.addWidget(self.dynamic_canvas)
 
         step = self.horizontalRes / (self.timeWindow / 1000)
         self.timeStep = self.updateFrequency * step
         self.maxNotes = max_notes
-        data = np.zeros((self.verticalRes, self.horizontalRes))
-        self.line.set_array(data)
-        self.line.figure.canvas.draw()
+        self.dynamic_canvas.draw()
 
     def reset(self):
+        self.parent.model.ctrl.graphSemaphore.acquire()
         self.futureNotes.clear()
-        data = np.zeros((self.verticalRes, self.horizontalRes))
-        self.line.set_array(data)
-        self.line.figure.canvas.draw()
+        self.parent.model.ctrl.graphSemaphore.release()
+        self.notes = np.empty(0, dtype=GRAPH_NOTE_DTYPE)
+        self.image[:] = 0
+        self.origin = None
+        self.blit()
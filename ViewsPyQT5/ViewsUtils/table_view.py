@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import logging
-import time
 from collections import deque
 from pathlib import Path
 
@@ -75,7 +74,7 @@ class TableView(object):
     def column_select(self):
         if self.dataColumnComboBox.currentText() != "":
             self.tableViews[0].selectColumn(
-                self.data_model[0]._dataframe.columns.get_loc(self.dataColumnComboBox.currentText()))
+                self.data_model[0].columns.get_loc(self.dataColumnComboBox.currentText()))
 
     def load_data(self):
         file, check = QFileDialog.getOpenFileName(None, "Load data file",
@@ -104,6 +103,8 @@ class TableView(object):
             if (not ErrorManager.compare_headers(list(header), list(self.data.current_dataset.columns))):
                 self.data.set_data_index(self.data.data_index - 1)
                 del self.data.df[-1]
+                del self.data.streams[-1]
+                del self.data.paths[-1]
                 ErrorManager.getInstance().wrong_data_error()
                 return
             self.data.assign_timestamps(self.timestampFormatLineEdit.text())
@@ -205,68 +206,113 @@ class TableView(object):
 
 
 class DataFrameModel(QAbstractTableModel):
+    """
+    Table of the last rows played. Rows are formatted once, when they are added, and kept in a ring buffer of size rows,
+    so that adding a row and removing the oldest one cost the same whatever the row rate and the table size. Rows to be
+    shown next are kept in buffer until their note is played.
+    """
     DtypeRole = Qt.UserRole + 1000
     ValueRole = Qt.UserRole + 1001
 
     def __init__(self, df=pd.DataFrame(), dfb=pd.DataFrame(), size=20, parent=None, mom=None):
         super(DataFrameModel, self).__init__(parent)
-        self._dataframe = df
-        self.size = size
-        self.buffer = deque()
         self.mom = mom
-        for d in dfb.itertuples():
-            self.buffer.append(d)
+        self.size = size
+        self.columns = pd.Index([])
+        self.dtypes = []
+        self.rows = [None] * size  # ring buffer of (index label, values, displayed values) of the visible rows
+        self.head = 0  # position in rows of the first visible row
+        self.count = 0  # number of visible rows
+        self.buffer = deque()  # rows waiting to be shown, as named tuples from DataFrame.itertuples
+        self.known = set()  # index labels of the visible and waiting rows
+        self.reset(size, df, dfb)
 
     def reset(self, size=None, df=pd.DataFrame(), dfb=pd.DataFrame()):
+        self.beginResetModel()
         if size is not None:
             self.size = size
+        self.columns = df.columns
+        self.dtypes = list(df.dtypes)
+        self.rows = [None] * self.size
+        self.head = 0
+        self.count = 0
         self.buffer.clear()
+        self.known.clear()
+        for d in df.iloc[:self.size].itertuples():
+            self.rows[self.count] = self.format_row(d)
+            self.known.add(d[0])
+            self.count += 1
+        self.endResetModel()
         for d in dfb.itertuples():
-            self.buffer.append(d)
+            self.buffer_row(d)
+
+    @staticmethod
+    def format_row(row) -> tuple:
+        values = tuple(row[1:])
+        return row[0], values, tuple(str(v) for v in values)
+
+    def set_columns(self, row):
+        """
+        Take the columns of the first row added to a table reset without data.
+        """
         self.beginResetModel()
-        self._dataframe = df
+        self.columns = pd.Index(row._fields[1:])
+        self.dtypes = list(pd.DataFrame([row[1:]], columns=self.columns).dtypes)
         self.endResetModel()
 
-    def load_row(self, row):
-        if (self._dataframe.shape[0] <= self.size - 1):
-            self.beginResetModel()
-            self._dataframe = pd.concat([self._dataframe.iloc[1:], pd.DataFrame([row], columns=row._fields)],
-                                        ignore_index=True)
-            self._dataframe.reset_index(inplace=True, drop=True)
-            self.endResetModel()
-        elif (row not in self.buffer and row not in self._dataframe):
+    def buffer_row(self, row):
+        if row[0] not in self.known:
+            self.known.add(row[0])
             self.buffer.append(row)
 
-    def push_row_to_data_frame(self, note_timing):
-        if note_timing > 0:
-            time.sleep(note_timing / 1000)
-        if not self.mom.parent.model.ctrl.playing:
+    def append_row(self, row) -> None:
+        if self.columns.size == 0:
+            self.set_columns(row)
+        self.beginInsertRows(QModelIndex(), self.count, self.count)
+        self.rows[(self.head + self.count) % self.size] = self.format_row(row)
+        self.count += 1
+        self.endInsertRows()
+
+    def remove_first_row(self) -> None:
+        self.beginRemoveRows(QModelIndex(), 0, 0)
+        self.known.discard(self.rows[self.head][0])
+        self.rows[self.head] = None
+        self.head = (self.head + 1) % self.size
+        self.count -= 1
+        self.endRemoveRows()
+
+    def load_row(self, row):
+        if row[0] in self.known:
             return
-        self.mom.parent.model.ctrl.pausedEvent.wait()  # wait if we are paused
+        if self.count < self.size and len(self.buffer) == 0:
+            self.known.add(row[0])
+            self.append_row(row)
+        else:
+            self.buffer_row(row)
+
+    def push_row_to_data_frame(self):
+        """
+        Scroll the table by one row, when the note of the next row is played.
+        """
         try:
-            self.beginResetModel()
-            if (len(self.buffer) > 0):
-                row = [self.buffer.popleft()]
-                if (self._dataframe.shape[0] <= self.size - 1 and len(self.buffer) > 0):
-                    row.append(self.buffer.popleft())
-                # row['internal_filter'] = row["internal_filter"].astype(bool)
-                self._dataframe = pd.concat([self._dataframe.iloc[1:], pd.DataFrame(row, columns=row[0]._fields)],
-                                            ignore_index=True)
-            else:
-                # print("reducing from {}".format(self._dataframe.shape))
-                self._dataframe = self._dataframe.iloc[1:]
-            self._dataframe.reset_index(inplace=True, drop=True)
-            self.endResetModel()
+            if self.count > 0 and (self.count == self.size or len(self.buffer) == 0):
+                self.remove_first_row()
+            for _ in range(2):  # a table not full yet grows by one row
+                if len(self.buffer) == 0 or self.count == self.size:
+                    break
+                self.append_row(self.buffer.popleft())
         except Exception:
             logging.log(logging.WARNING, "Exception while pushing rows to data table.")
 
+    def get_row(self, row: int) -> tuple:
+        return self.rows[(self.head + row) % self.size]
+
     def set_data_frame(self, dataframe):
-        self.beginResetModel()
-        self._dataframe = dataframe.copy()
-        self.endResetModel()
+        self.reset(df=dataframe)
 
     def data_frame(self):
-        return self._dataframe
+        rows = [self.get_row(i) for i in range(self.count)]
+        return pd.DataFrame([r[1] for r in rows], index=[r[0] for r in rows], columns=self.columns)
 
     dataFrame = pyqtProperty(pd.DataFrame, fget=data_frame, fset=set_data_frame)
 
@@ -274,41 +320,32 @@ class DataFrameModel(QAbstractTableModel):
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
-                return self._dataframe.columns[section]
+                return self.columns[section]
             else:
-                try:
-                    return str(self._dataframe.index[section])
-                except IndexError:
-                    return QVariant()
+                if 0 <= section < self.count:
+                    return str(self.get_row(section)[0])
+                return QVariant()
         return QVariant()
 
     def rowCount(self, parent=QModelIndex()):
         if parent.isValid():
             return 0
-        return len(self._dataframe.index)
+        return self.count
 
     def columnCount(self, parent=QModelIndex()):
         if parent.isValid():
             return 0
-        return self._dataframe.columns.size
+        return self.columns.size
 
     def data(self, index, role=Qt.DisplayRole):
-        if not index.isValid() or not (0 <= index.row() < self.rowCount() and 0 <= index.column() < self.columnCount()):
+        if not index.isValid() or not (0 <= index.row() < self.count and 0 <= index.column() < self.columns.size):
             return QVariant()
-        row = self._dataframe.index[index.row()]
-        col = self._dataframe.columns[index.column()]
-        dt = self._dataframe[col].dtype
-        try:
-            # val = self._dataframe.loc[index.row(), index.column()]
-            val = self._dataframe.iloc[row][col]
-        except IndexError:
-            val = 0
         if role == Qt.DisplayRole:
-            return str(val)
+            return self.get_row(index.row())[2][index.column()]
         elif role == DataFrameModel.ValueRole:
-            return val
+            return self.get_row(index.row())[1][index.column()]
         if role == DataFrameModel.DtypeRole:
-            return dt
+            return self.dtypes[index.column()]
         return QVariant()
 
     def roleNames(self):
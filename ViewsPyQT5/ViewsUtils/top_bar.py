@@ -2,30 +2,50 @@ from __future__ import annotations
 
 import logging
 
-from PyQt5.QtCore import QSize, Qt, pyqtSignal, QObject, QThread
+from PyQt5.QtCore import QSize, Qt, pyqtSignal, QObject
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QHBoxLayout, QSizePolicy, QPushButton, QSpacerItem, QFrame, QSlider, QGridLayout, \
     QLabel, QStyle
 
 import ViewsPyQT5.sonification_view as sv
 from Models.music_model import Music
+from Utils.constants import PROGRESS_BAR_RANGE, PROGRESS_PERIOD, SEEK_STEP
 from ViewsPyQT5.ViewsUtils.views_utils import buttonStyle, sliderGainStyle, playButtonReadyStyle, \
     sliderProgressStyle
 
 
-class QJumpSlider(QSlider):  # TODO: Change music value on click
+class QJumpSlider(QSlider):
+    """
+    Slider jumping to the clicked position, which can then be dragged. jumped is emitted with the new value when the
+    mouse is released.
+    """
+    jumped = pyqtSignal(int)
+
     def __init__(self, parent=None):
         super(QJumpSlider, self).__init__(parent)
+        self.dragging = False
 
     def mousePressEvent(self, event):
         # Jump to click position
-        position = QStyle.sliderValueFromPosition(self.minimum(), self.maximum(), event.x(), self.width())
-        # self.setValue(position)
+        self.dragging = True
+        self.setValue(QStyle.sliderValueFromPosition(self.minimum(), self.maximum(), event.x(), self.width()))
 
     def mouseMoveEvent(self, event):
         # Jump to pointer position while moving
-        position = QStyle.sliderValueFromPosition(self.minimum(), self.maximum(), event.x(), self.width())
-        # self.setValue(position)
+        if self.dragging:
+            self.setValue(QStyle.sliderValueFromPosition(self.minimum(), self.maximum(), event.x(), self.width()))
+
+    def mouseReleaseEvent(self, event):
+        if self.dragging:
+            self.dragging = False
+            self.jumped.emit(self.value())
+
+    def set_progress(self, value: int):
+        """
+        Update the position from the playing music, unless the user is dragging the slider.
+        """
+        if not self.dragging:
+            self.setValue(value)
 
 
 class TopSettingsBar(QObject):
@@ -34,7 +54,6 @@ class TopSettingsBar(QObject):
     def __init__(self, parent: sv.SonificationView):
         super(TopSettingsBar, self).__init__()
         self.parent = parent
-        self.progress_bar_thread = External(parent=self)
 
     def setupUi(self):
         self.horizontalLayout = QHBoxLayout()
@@ -118,7 +137,7 @@ class TopSettingsBar(QObject):
 
         self.musicProgressBar = QJumpSlider()
         self.musicProgressBar.setOrientation(Qt.Horizontal)
-        self.musicProgressBar.setRange(0, 100)
+        self.musicProgressBar.setRange(0, PROGRESS_BAR_RANGE)
         self.musicProgressBar.setObjectName(u"musicProgressBar")
         self.musicProgressBar.setValue(0)
         self.musicProgressBar.setSliderPosition(0)
@@ -228,36 +247,54 @@ class TopSettingsBar(QObject):
         self.PPButton.clicked.connect(self.press_pp_button)
         self.StopButton.clicked.connect(self.press_stop_button)
         self.SettingsButton.clicked.connect(self.press_settings_button)
-        # self.progressBarSignal.connect(self.musicProgressBar.setValue)
-        self.progress_bar_thread.progressBarSignal.connect(self.musicProgressBar.setValue)
-        self.progress_bar_thread.start()
+        self.parent.uiScheduler.repeat(PROGRESS_PERIOD, self.update_progress)
+        self.musicProgressBar.jumped.connect(lambda value: self.seek(value / PROGRESS_BAR_RANGE))
+        self.FfwButton.clicked.connect(lambda: self.skip(SEEK_STEP))
+        self.FbwButton.clicked.connect(lambda: self.skip(-SEEK_STEP))
         self.GainSlider.setValue(self.music_model.gain)
 
     def press_settings_button(self):
         self.parent.open_settings()
 
-    # def handle_progress(self):
-    #     while True:
-    #         self.parent.model.ctrl.playingEvent.wait()  # wait if we are stopped
-    #         self.parent.model.ctrl.pausedEvent.wait()  # wait if we are paused
-    #         mtime = self.parent.model.ctrl.get_music_time()
-    #         em, es = divmod(self.parent.model.settings.get_music_duration(), 60)
-    #         eh, em = divmod(em, 60)
-    #         sm, ss = divmod(mtime, 60)
-    #         sh, sm = divmod(sm, 60)
-    #         try:
-    #             self.musicEndLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(eh, em, es))
-    #             self.musicStartLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(sh, sm, ss))
-    #             self.progressBarSignal.emit(min(99, int(100 * mtime / self.parent.model.settings.get_music_duration())))
-    #         except RuntimeError:
-    #             print("Runtime error on updating music start and end label.")
-    #         QThread.msleep(int(1000/5))
+    def seek(self, tfactor: float):
+        """
+        Move the music to a temporal position, between 0 and 1, and show it.
+        """
+        if not self.PPButton.isEnabled():  # no track, no music to move in
+            return
+        tfactor = self.parent.model.ctrl.seek(tfactor)
+        self.show_position(tfactor)
+
+    def skip(self, seconds: float):
+        if not self.PPButton.isEnabled():
+            return
+        tfactor = self.parent.model.ctrl.skip(seconds)
+        self.show_position(tfactor)
+
+    def show_position(self, tfactor: float):
+        sm, ss = divmod(tfactor * self.parent.model.settings.get_music_duration(), 60)
+        sh, sm = divmod(sm, 60)
+        self.musicStartLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(sh, sm, ss))
+        self.musicProgressBar.set_progress(min(PROGRESS_BAR_RANGE - 1, int(PROGRESS_BAR_RANGE * tfactor)))
+
+    def update_progress(self):
+        if not self.parent.model.ctrl.playing or self.parent.model.ctrl.paused:
+            return
+        mtime = self.parent.model.ctrl.get_music_time()
+        em, es = divmod(self.parent.model.settings.get_music_duration(), 60)
+        eh, em = divmod(em, 60)
+        sm, ss = divmod(mtime, 60)
+        sh, sm = divmod(sm, 60)
+        self.musicEndLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(eh, em, es))
+        self.musicStartLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(sh, sm, ss))
+        self.musicProgressBar.set_progress(min(PROGRESS_BAR_RANGE - 1, int(
+            PROGRESS_BAR_RANGE * mtime / self.parent.model.settings.get_music_duration())))
 
     def press_stop_button(self):
         if self.parent.model.ctrl.playing:
             self.parent.model.ctrl.stop()
             try:
-                self.progress_bar_thread.progressBarSignal.emit(0)
+                self.musicProgressBar.set_progress(0)
                 self.musicStartLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(0, 0, 0))
                 self.PPButton.setIcon(self.playIcon)
                 self.PPButton.setStyleSheet(playButtonReadyStyle)
@@ -266,6 +303,8 @@ class TopSettingsBar(QObject):
                 logging.log(logging.DEBUG, "Issue with UI top bar")
 
     def press_pp_button(self):
+        if not self.PPButton.isEnabled():  # the space shortcut is active even without tracks or while exporting
+            return
         if (self.parent.model.ctrl.playing and not self.parent.model.ctrl.paused):
             self.parent.model.ctrl.pause()
             self.PPButton.setIcon(self.playIcon)
@@ -283,32 +322,3 @@ class TopSettingsBar(QObject):
         self.PPButton.setText("")
         self.StopButton.setText("")
         self.FfwButton.setText("")
-
-
-class External(QThread):
-    """
-    Runs a counter thread.
-    """
-    progressBarSignal = pyqtSignal(int)
-
-    def __init__(self, parent: TopSettingsBar):
-        super(External, self).__init__()
-        self.parent = parent
-
-    def run(self):
-        while True:
-            self.parent.parent.model.ctrl.playingEvent.wait()  # wait if we are stopped
-            self.parent.parent.model.ctrl.pausedEvent.wait()  # wait if we are paused
-            mtime = self.parent.parent.model.ctrl.get_music_time()
-            em, es = divmod(self.parent.parent.model.settings.get_music_duration(), 60)
-            eh, em = divmod(em, 60)
-            sm, ss = divmod(mtime, 60)
-            sh, sm = divmod(sm, 60)
-            try:
-                self.parent.musicEndLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(eh, em, es))
-                self.parent.musicStartLabel.setText("{:02.0f}:{:02.0f}:{:02.0f}".format(sh, sm, ss))
-                self.progressBarSignal.emit(
-                    min(99, int(100 * mtime / self.parent.parent.model.settings.get_music_duration())))
-            except RuntimeError:
-                print("Runtime error on updating music start and end label.")
-            QThread.msleep(int(1000 / 5))
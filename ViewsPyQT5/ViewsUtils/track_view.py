@@ -440,4 +440,6 @@ class TrackView(object):
             self.AddTrackButton.setText("")
             self.parent.visualisationView.GraphFrame.show()
             self.parent.parent.exportAction.setEnabled(True)
+            self.parent.parent.exportStemsAction.setEnabled(True)
+            self.parent.parent.exportMidiAction.setEnabled(True)
             self.parent.parent.saveAction.setEnabled(True)
@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import logging
+import threading
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class UiScheduler(QObject):
+    """
+    Run UI updates on the GUI thread at given ticks, from a single single-shot QTimer armed for the earliest entry.
+    Entries can be added from any thread, they are fired in order of due tick, then of insertion.
+    """
+    scheduled = pyqtSignal()
+
+    def __init__(self, clock, parent=None):
+        """
+            clock       : callable,
+                        returns the current tick, in ms (e.g. the sequencer tick)
+        """
+        super(UiScheduler, self).__init__(parent)
+        self.clock = clock
+        self.entries = []  # heap of (due tick, insertion number, callback, args, period)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.fire)
+        self.scheduled.connect(self.arm)  # queued to the GUI thread when emitted from another thread
+
+    def schedule(self, due: int, callback, *args) -> None:
+        """
+        Call callback(*args) on the GUI thread at tick due, or as soon as possible if due is past.
+        """
+        self.push(due, callback, args, None)
+
+    def call_soon(self, callback, *args) -> None:
+        self.push(self.clock(), callback, args, None)
+
+    def repeat(self, period: int, callback, *args) -> None:
+        """
+        Call callback(*args) on the GUI thread every period ms, until it is cancelled.
+        """
+        self.push(self.clock() + period, callback, args, period)
+
+    def push(self, due: int, callback, args: tuple, period) -> None:
+        with self.lock:
+            first = len(self.entries) == 0 or due < self.entries[0][0]
+            heapq.heappush(self.entries, (due, next(self.counter), callback, args, period))
+        if first:
+            self.scheduled.emit()
+
+    def cancel(self, callback) -> None:
+        """
+        Remove every entry, repeated or not, of a callback.
+        """
+        with self.lock:
+            self.entries = [entry for entry in self.entries if entry[2] != callback]
+            heapq.heapify(self.entries)
+
+    def arm(self) -> None:
+        with self.lock:
+            if len(self.entries) == 0:
+                self.timer.stop()
+                return
+            delay = self.entries[0][0] - self.clock()
+        self.timer.start(max(0, int(delay)))
+
+    def fire(self) -> None:
+        now = self.clock()
+        due = []
+        with self.lock:
+            while len(self.entries) > 0 and self.entries[0][0] <= now:
+                entry = heapq.heappop(self.entries)
+                due.append(entry)
+                if entry[4] is not None:  # repeated, the next call is planned from now to avoid bursts
+                    heapq.heappush(self.entries, (now + entry[4], next(self.counter)) + entry[2:])
+        for _, _, callback, args, _ in due:
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.log(logging.WARNING, "Exception in UI update {}: {}".format(callback, e))
+        self.arm()
@@ -2,7 +2,7 @@ from pathlib import Path
 
 from PyQt5.QtCore import QCoreApplication
 from PyQt5.QtGui import QKeySequence
-from PyQt5.QtWidgets import QMainWindow, QAction, QShortcut
+from PyQt5.QtWidgets import QMainWindow, QAction, QShortcut, QPushButton
 
 from Models.data_model import Data
 from Models.music_model import Music
@@ -41,6 +41,12 @@ class MainWindow(QMainWindow):
         self.exportActionShortcut = QShortcut(QKeySequence("Ctrl+E"), self)
         self.menuFile.addAction(self.exportAction)
         self.exportAction.setEnabled(False)
+        self.exportStemsAction = QAction('Export mix and tracks to .wav', self)
+        self.menuFile.addAction(self.exportStemsAction)
+        self.exportStemsAction.setEnabled(False)
+        self.exportMidiAction = QAction('Export to .mid', self)
+        self.menuFile.addAction(self.exportMidiAction)
+        self.exportMidiAction.setEnabled(False)
         self.openAction = QAction('Open project\tCtrl+L', self)
         self.openActionShortcut = QShortcut(QKeySequence("Ctrl+L"), self)
         self.menuFile.addAction(self.openAction)
@@ -51,6 +57,8 @@ class MainWindow(QMainWindow):
         self.settingsAction = QAction('Settings\tCtrl+T', self)
         self.settingsActionShortcut = QShortcut(QKeySequence("Ctrl+T"), self)
         self.menuFile.addAction(self.settingsAction)
+        self.clearCacheAction = QAction('Clear data cache', self)
+        self.menuFile.addAction(self.clearCacheAction)
         self.playAction = QAction('Play/Pause\tSpace', self)
         self.playAction.setEnabled(False)
         self.playActionShortcut = QShortcut(QKeySequence("Space"), self)
@@ -60,8 +68,10 @@ class MainWindow(QMainWindow):
 
         self.setMenuBar(self.menubar)
 
-        self.exportAction.triggered.connect(self.sonification_main_widget.export_music)
+        self.exportAction.triggered.connect(lambda: self.sonification_main_widget.export_music())
         self.exportActionShortcut.activated.connect(self.sonification_main_widget.export_music)
+        self.exportStemsAction.triggered.connect(lambda: self.sonification_main_widget.export_music(stems=True))
+        self.exportMidiAction.triggered.connect(self.sonification_main_widget.export_midi)
         self.settingsAction.triggered.connect(self.sonification_main_widget.open_settings)
         self.settingsActionShortcut.activated.connect(self.sonification_main_widget.open_settings)
         self.exitAction.triggered.connect(QCoreApplication.quit)
@@ -75,12 +85,18 @@ class MainWindow(QMainWindow):
         self.playActionShortcut.activated.connect(self.sonification_main_widget.topBarView.press_pp_button)
         self.openAction.triggered.connect(self.sonification_main_widget.import_all_tracks)
         self.openActionShortcut.activated.connect(self.sonification_main_widget.import_all_tracks)
+        self.clearCacheAction.triggered.connect(self.clear_cache)
+        self.cancelExportButton.clicked.connect(self.sonification_main_widget.cancel_export)
 
 
     def setup_statusbar(self):
         self.statusbar = self.statusBar()
         self.statusbar.setObjectName(u"statusbar")
         self.setStatusBar(self.statusbar)
+        self.cancelExportButton = QPushButton("Cancel export")
+        self.cancelExportButton.setToolTip("Stop writing the music to a wav file.")
+        self.statusbar.addPermanentWidget(self.cancelExportButton)
+        self.cancelExportButton.hide()
 
     def show_load_data(self):
         self.sonification_main_widget.topBarView.press_stop_button()
@@ -95,12 +111,18 @@ class MainWindow(QMainWindow):
         self.sonification_main_widget.advancedTrackView.detailsScrollArea.hide()
         self.saveAction.setEnabled(False)
         self.exportAction.setEnabled(False)
+        self.exportStemsAction.setEnabled(False)
+        self.exportMidiAction.setEnabled(False)
         self.settingsAction.setEnabled(False)
         self.sonification_main_widget.topBarView.AddTrackButton.setEnabled(False)
         self.sonification_main_widget.topBarView.SettingsButton.setEnabled(False)
 
         self.sonification_main_widget.tableView.load_data()
 
+    def clear_cache(self):
+        removed = self.db.invalidate_cache()
+        self.statusbar.showMessage("{} cached datasets removed".format(removed), 5000)
+
     def show_load_additional_data(self):
         self.sonification_main_widget.tableView.load_additional_data()
 
@@ -108,9 +130,7 @@ class MainWindow(QMainWindow):
         # TODO add other filetypes
         m = Music.getInstance()
         if (m.settings.autoload):
-            self.db.read_primary_data(m.settings.autoloadDataPath)
-            self.db.date_column = m.settings.autoloadTimestampcol
-            self.db.assign_timestamps()
+            self.db.load_primary_data(m.settings.autoloadDataPath, m.settings.autoloadTimestampcol)
             self.sonification_main_widget.tableView.setup_data_model()
             self.sonification_main_widget.tableView.tabWidget.setTabText(0, Path(m.settings.autoloadDataPath).stem)
 
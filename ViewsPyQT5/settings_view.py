@@ -99,6 +99,14 @@ class SettingsView(QMainWindow):
         self.previousDataCheckBox.setObjectName(u"previousDataCheckBox")
 
         self.verticalLayout.addWidget(self.previousDataCheckBox)
+        self.streamingCheckBox = QCheckBox(self.checkboxFrame)
+        self.streamingCheckBox.setObjectName(u"streamingCheckBox")
+
+        self.verticalLayout.addWidget(self.streamingCheckBox)
+        self.adaptiveCheckBox = QCheckBox(self.checkboxFrame)
+        self.adaptiveCheckBox.setObjectName(u"adaptiveCheckBox")
+
+        self.verticalLayout.addWidget(self.adaptiveCheckBox)
 
         self.gridLayout.addWidget(self.checkboxFrame, 0, 3, 1, 1)
 
@@ -230,6 +238,8 @@ class SettingsView(QMainWindow):
 
         self.NoteTimingLabel.setText(QCoreApplication.translate("Form", u"Note Timing", None))
         self.previousDataCheckBox.setText(QCoreApplication.translate("Form", u"Load previous data on start", None))
+        self.streamingCheckBox.setText(QCoreApplication.translate("Form", u"Stream data files from disk", None))
+        self.adaptiveCheckBox.setText(QCoreApplication.translate("Form", u"Adapt batches to data density", None))
         self.tempoModeLabel.setText(QCoreApplication.translate("Form", u"Tempo", None))
         self.tempoNLabel.setText(QCoreApplication.translate("Form", u"Tempo-N Value", None))
         self.tempoDureeLabel.setText(QCoreApplication.translate("Form", u"Tempo-N pause duration", None))
@@ -265,6 +275,12 @@ class SettingsView(QMainWindow):
         self.tempoModeComboBox.setToolTip("Which tempo settings to use.\n"
                                           "{}".format("\n".join(TIME_SETTINGS_OPTIONS_TOOLTIP)))
         self.previousDataCheckBox.setToolTip("Automatically load previously loaded data and time column choice.")
+        self.streamingCheckBox.setToolTip("Read csv files by chunks instead of loading them in memory.\n"
+                                          "Use this for files larger than your memory. Data must already be sorted "
+                                          "by timestamp.\nApplies to the next loaded file.")
+        self.adaptiveCheckBox.setToolTip("Adjust batch size, batches planned and note timing during playback, "
+                                         "depending on how dense the data are.\n"
+                                         "Values entered here are used at start and restored when music stops.")
         self.noteTimingLineEdit.setToolTip("The number of ms that the manager will wait before planning a note.\n"
                                            "A shorter value will make the program more responsive to changes to encodings but "
                                            "it may results in rows being skipped if they are close too each others timing wise.")
@@ -288,6 +304,8 @@ class SettingsView(QMainWindow):
         self.bpmLineEdit.setText(str(self.model.get_bpm()))
         self.noteTimingLineEdit.setText(str(self.model.timeBuffer))
         self.previousDataCheckBox.setChecked(self.model.autoload)
+        self.streamingCheckBox.setChecked(self.model.streaming)
+        self.adaptiveCheckBox.setChecked(self.model.adaptive)
         self.graphicalPercentageLineedit.setText(str(int(self.model.graphicalBarPercentage * 100)))
         self.graphicalLengthLineedit.setText(str(int(self.model.graphicalLength / 1000)))
 
@@ -328,7 +346,8 @@ class SettingsView(QMainWindow):
                                  self.tempoModeComboBox.currentIndex(), self.tempoNLineedit.text(),
                                  self.tempoDureeLineedit.text(), self.tempoOffsetLineedit.text(),
                                  self.previousDataCheckBox.isChecked(),
-                                 self.graphicalLengthLineedit.text(), self.graphicalPercentageLineedit.text())
+                                 self.graphicalLengthLineedit.text(), self.graphicalPercentageLineedit.text(),
+                                 self.streamingCheckBox.isChecked(), self.adaptiveCheckBox.isChecked())
 
         self.cancel()
 
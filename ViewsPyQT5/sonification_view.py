@@ -10,6 +10,7 @@ from ViewsPyQT5.ViewsUtils.graphical_view import GraphView
 from ViewsPyQT5.ViewsUtils.table_view import TableView
 from ViewsPyQT5.ViewsUtils.top_bar import TopSettingsBar
 from ViewsPyQT5.ViewsUtils.track_view import TrackView
+from ViewsPyQT5.ViewsUtils.ui_scheduler import UiScheduler
 from ViewsPyQT5.settings_view import SettingsView
 
 
@@ -18,13 +19,15 @@ class SonificationView(QWidget):
     Main view for the sonification process, handling both configuration and representation of the loaded data.
     """
     messageChanged = pyqtSignal(str)
+    exportRunning = pyqtSignal(bool)  # emitted by the export thread when it starts and ends
 
-    # TODO: Add fast forward and backward +x/-x seconds
     def __init__(self, parent, **kwargs):
         super().__init__(parent, **kwargs)
         self.parent = parent
         self.model = Music.getInstance()
         self.model.sonification_view = self
+        # Every update of table, graph and progress bar is run on the GUI thread by this scheduler
+        self.uiScheduler = UiScheduler(self.model.ctrl.view.sequencer.get_tick, self)
 
         self.setGeometry(0, 0, 1980, 1020)
         self.windowLayout = QVBoxLayout(self)
@@ -59,6 +62,7 @@ class SonificationView(QWidget):
         self.visualisationView.GraphFrame.hide()
 
         self.messageChanged.connect(self.show_message)
+        self.exportRunning.connect(self.show_export_running)
 
     def show_message(self, msg):
         self.parent.statusbar.showMessage(msg, 5000)
@@ -69,14 +73,34 @@ class SonificationView(QWidget):
     def open_settings(self):
         self.model.settings.ctrl.open_settings(self.settingsView)
 
-    def export_music(self):
-        file, check = QFileDialog.getSaveFileName(None, "Export music",
+    def export_music(self, stems: bool = False):
+        file, check = QFileDialog.getSaveFileName(None, "Export stems" if stems else "Export music",
                                                   "saved_music", "Wav file (*.wav)")
         if check:
+            self.topBarView.press_stop_button()  # export reads data from the start, as the music producer does
             self.set_status_text("writing {}".format(file))
-            threading.Thread(target=self.model.ctrl.export_music, args=[file], daemon=True,
+            threading.Thread(target=self.model.ctrl.export_music, args=[file, stems], daemon=True,
                              name="export_music_thread").start()
 
+    def export_midi(self):
+        file, check = QFileDialog.getSaveFileName(None, "Export midi", "saved_music", "Midi file (*.mid)")
+        if check:
+            self.topBarView.press_stop_button()
+            self.set_status_text("writing {}".format(file))
+            threading.Thread(target=self.model.ctrl.export_midi, args=[file], daemon=True,
+                             name="export_midi_thread").start()
+
+    def show_export_running(self, running: bool):
+        self.parent.exportAction.setEnabled(not running)
+        self.parent.exportStemsAction.setEnabled(not running)
+        self.parent.exportMidiAction.setEnabled(not running)
+        self.topBarView.PPButton.setEnabled(not running and len(self.model.tracks) > 0)
+        self.parent.cancelExportButton.setVisible(running)
+
+    def cancel_export(self):
+        self.set_status_text("Cancelling export...")
+        self.model.ctrl.cancel_export()
+
     def export_all_tracks(self):
         file, check = QFileDialog.getSaveFileName(None, "Save project",
                                                   "project with {} tracks".format(len(self.model.tracks)),
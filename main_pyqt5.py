@@ -1,5 +1,6 @@
 import datetime
 import logging
+import multiprocessing
 import sys
 
 from PyQt5.QtCore import QFile, QTextStream
@@ -8,9 +9,9 @@ from PyQt5.QtWidgets import QApplication
 
 from ViewsPyQT5.main_view import MainWindow
 
-logging.basicConfig(filename="soda.log", filemode="w", level=logging.INFO)
-
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # music export starts processes, also from the executable
+    logging.basicConfig(filename="soda.log", filemode="w", level=logging.INFO)  # not from export processes
     logging.log(logging.INFO, "Starting SODA at {}".format(datetime.datetime.now()))
 
     app = QApplication(sys.argv)
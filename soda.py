@@ -0,0 +1,121 @@
+"""
+Headless entry point of Soda, rendering saved projects without the user interface:
+
+    python -m soda render project.soda data.csv --out music.wav --out music.mid
+
+Neither PyQt5 nor matplotlib are imported, nor is an audio driver started, so that it runs on servers without display
+or sound card.
+"""
+import argparse
+import logging
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+from Models.data_model import Data
+from Models.music_model import Music
+from Utils.error_manager import ErrorManager
+
+OUTPUT_FORMATS = [".wav", ".mid"]
+
+
+def load_data(data: Data, path: str, date_column: str, additional_format: str) -> None:
+    """
+    Load the primary data, with the first column looking like a timestamp if date_column is not given, as the user
+    interface proposes.
+    """
+    if date_column is not None:
+        data.load_primary_data(path, date_column, additional_format)
+        return
+    data.read_primary_data(path)
+    candidates = data.get_candidates_timestamp_columns()
+    if len(candidates) == 0:
+        ErrorManager.getInstance().timestamp_warning()
+        raise ValueError("No timestamp column found in {}, use --date-column".format(path))
+    data.date_column = candidates[0]
+    data.assign_timestamps(additional_format)
+
+
+def log_progress(out: Path):
+    """
+    :return: progress function for the renderers, logging every tenth of the music rendered
+    """
+    reported = [-1]
+
+    def progress(p: float) -> None:
+        if int(10 * p) > reported[0]:
+            reported[0] = int(10 * p)
+            logging.log(logging.INFO, "Writing {}: {}%".format(out, 10 * reported[0]))
+    return progress
+
+
+def render(args: argparse.Namespace) -> int:
+    """
+    Load data then the project, as done from the user interface, and write the music to each output file.
+    :return: exit code of the command
+    """
+    outputs = [Path(out) for out in args.out]
+    for out in outputs:
+        if out.suffix not in OUTPUT_FORMATS:
+            logging.log(logging.ERROR, "Unknown output format {}, expected one of {}".format(out, OUTPUT_FORMATS))
+            return 2
+    ErrorManager.getInstance().headless = True
+    music = Music(headless=True)
+    data = Data.getInstance()
+    if args.stream:
+        music.settings.streaming = True
+    t = time.perf_counter()
+    try:
+        load_data(data, args.data, args.date_column, args.format)
+        music.ctrl.import_all_tracks(args.project)
+    except Exception as e:
+        logging.log(logging.ERROR, "Could not load {} with {}: {}".format(args.project, args.data, e))
+        return 1
+    if len(music.tracks) == 0:
+        logging.log(logging.ERROR, "Project {} has no track".format(args.project))
+        return 1
+    logging.log(logging.INFO, "Loaded {} rows and {} tracks in {:.1f} s".format(
+        data.get_size(), len(music.tracks), time.perf_counter() - t))
+    music.ctrl.setup_general_attribute()
+    music.generate_dataframe()
+    for out in outputs:
+        t = time.perf_counter()
+        try:
+            if out.suffix == ".mid":
+                music.generate_midi(str(out.with_suffix("")))
+            else:
+                music.generate_audio(str(out), args.stems, log_progress(out))
+        except KeyboardInterrupt:
+            out.unlink(missing_ok=True)
+            logging.log(logging.WARNING, "Rendering of {} interrupted".format(out))
+            return 130
+        except Exception as e:
+            logging.log(logging.ERROR, "Error while saving {}: {}".format(out, e))
+            return 1
+        logging.log(logging.INFO, "Music {} rendered in {:.1f} s".format(out, time.perf_counter() - t))
+    return 0
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="soda", description="Sonification of data, without user interface.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress, not only warnings and errors")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render_parser = commands.add_parser("render", help="render a saved project with a dataset to wav or midi files")
+    render_parser.add_argument("project", help="project saved from Soda (.soda)")
+    render_parser.add_argument("data", help="primary data file (.csv)")
+    render_parser.add_argument("--out", action="append", required=True,
+                               help="output file, .wav or .mid, can be given several times")
+    render_parser.add_argument("--date-column", default=None,
+                               help="timestamp column, by default the first column looking like one")
+    render_parser.add_argument("--format", default="", help="additional timestamp format, e.g. %%d/%%m/%%Y %%H:%%M")
+    render_parser.add_argument("--stems", action="store_true", help="also write the music of each track to a wav file")
+    render_parser.add_argument("--stream", action="store_true", help="stream the data from disk by chunks")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s %(message)s")
+    return render(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # music export starts processes
+    sys.exit(main())